@@ -0,0 +1,175 @@
+"""
+Incremental per-class rating aggregates.
+
+RatingAggregates keeps a RatingSketch (per-question counts, sums, sums of
+squares and score histograms) for every (department, semester, staff,
+subject) seen in RATING_FILE. New ratings are
+applied as deltas, either fed straight from the ratings sink or tailed from
+the file, and the state is checkpointed to MAINRATING_CHECKPOINT_FILE together
+with the file offset it covers, so a restart only reads the rows appended
+since the last checkpoint.
+"""
+import atexit
+import base64
+import json
+import os
+import time
+from config import RATING_FILE, MAINRATING_CHECKPOINT_FILE
+from indexes import TailingCsvIndex, file_signature
+from rating_sketch import RatingSketch
+from utils import normalize_semester
+
+# Minimum seconds between automatic checkpoint writes
+CHECKPOINT_INTERVAL = 30
+
+# Bumped when the checkpointed group state changes shape; an older
+# checkpoint is ignored and the aggregates are rebuilt from the file
+CHECKPOINT_VERSION = 2
+
+
+class RatingAggregates(TailingCsvIndex):
+    """Running RatingSketch per (department, semester, staff, subject)."""
+
+    COLUMNS = (('department', 'semester', 'staff', 'subject')
+               + tuple(f'q{i}' for i in range(1, 11)) + ('average',))
+
+    def __init__(self, path, checkpoint_path):
+        self.checkpoint_path = checkpoint_path
+        self._last_checkpoint = 0.0
+        super().__init__(path)
+        self._load_checkpoint()
+
+    def _reset(self):
+        # key -> RatingSketch
+        self._groups = {}
+        # (department, normalized semester) -> [key, ...] in first-seen order
+        self._by_class = {}
+        self._dirty = False
+
+    def _add_values(self, values):
+        key = tuple((value or '').strip() for value in values[:4])
+        dep, sem = key[0], key[1]
+
+        sketch = self._groups.get(key)
+        if sketch is None:
+            sketch = self._groups[key] = RatingSketch()
+            self._by_class.setdefault((dep, normalize_semester(sem)), []).append(key)
+
+        # Empty, bad or missing scores are skipped; a missing average counts
+        # the row with 0, as the DictReader loop's row.get('average', 0) did
+        sketch.add_scores(values[4:14])
+        average = values[14]
+        try:
+            sketch.add_average(float(average if average is not None else 0))
+        except ValueError:
+            pass
+        self._dirty = True
+
+    def refresh(self):
+        with self._lock:
+            super().refresh()
+            self._maybe_checkpoint()
+
+    def feed(self, start_offset, data):
+        with self._lock:
+            super().feed(start_offset, data)
+            self._maybe_checkpoint()
+
+    def _maybe_checkpoint(self):
+        if self._dirty and time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self._save_checkpoint()
+
+    def invalidate(self):
+        with self._lock:
+            super().invalidate()
+            try:
+                os.remove(self.checkpoint_path)
+            except OSError:
+                pass
+
+    def summary(self, department=None, semester=None, sketches=False):
+        """
+        Return aggregates in the StorageBackend.aggregate_ratings format,
+        for every class or only the given department/semester. With
+        sketches=True each item also carries a copy of its 'sketch', as
+        StorageBackend.rating_statistics returns them.
+        """
+        self.refresh()
+        with self._lock:
+            if department is None:
+                keys = list(self._groups)
+            else:
+                keys = self._by_class.get((department.strip(), normalize_semester(semester)), [])
+            results = []
+            for key in keys:
+                sketch = self._groups[key]
+                if sketch.count > 0:
+                    dep, sem, staff, subject = key
+                    row = {
+                        'department': dep,
+                        'semester': sem,
+                        'staff': staff,
+                        'subject': subject,
+                        'count': sketch.count,
+                        'q_avgs': sketch.q_avgs(),
+                        'overall_average': sketch.overall_average(),
+                    }
+                    if sketches:
+                        row['sketch'] = sketch.copy()
+                    results.append(row)
+            return results
+
+    def checkpoint(self):
+        """Write the current state to the checkpoint file if it changed."""
+        self.refresh()
+        with self._lock:
+            if self._dirty:
+                self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        if self._signature is None:
+            return
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'inode': self._signature[0],
+            'offset': self._offset,
+            'guard': base64.b64encode(self._guard).decode('ascii'),
+            'header': self._header,
+            'groups': [list(key) + [sketch.to_state()]
+                       for key, sketch in self._groups.items()],
+        }
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get('version') != CHECKPOINT_VERSION:
+            return
+        signature = file_signature(self.path)
+        if signature is None or signature[0] != state['inode'] or signature[1] < state['offset']:
+            return
+        with self._lock:
+            for dep, sem, staff, subject, sketch_state in state['groups']:
+                key = (dep, sem, staff, subject)
+                self._groups[key] = RatingSketch.from_state(sketch_state)
+                self._by_class.setdefault((dep, normalize_semester(sem)), []).append(key)
+            self._offset = state['offset']
+            self._guard = base64.b64decode(state['guard'])
+            self._header = state['header']
+            # Same file as the checkpoint; refresh() verifies the guard bytes
+            # and tails whatever was appended after the checkpoint.
+            self._signature = (signature[0], self._offset, None)
+            self._last_checkpoint = time.monotonic()
+
+
+rating_aggregates = RatingAggregates(RATING_FILE, MAINRATING_CHECKPOINT_FILE)
+# Persist whatever was applied since the last periodic checkpoint
+atexit.register(rating_aggregates.checkpoint)
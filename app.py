@@ -1,3 +1,5 @@
+import asyncio
+import contextvars
 import os
 import csv
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
@@ -5,50 +7,69 @@ import matplotlib
 matplotlib.use("Agg")
 from routes.hod_routes import hod_bp
 from routes.admin_routes import admin_bp
+from routes.job_routes import jobs_bp
+import tasks  # registers the background job handlers
 
 from utils import (
-    read_csv_as_list,
+    get_departments,
+    get_semesters,
+    get_staffs,
+    get_subjects,
+    add_staff as store_staff,
+    add_subject as store_subject,
     load_admin_mapping,
+    get_mapping_version,
     update_admin_mappings,
-    append_ratings,
+    submit_feedback,
     get_student_info,
+    get_batch_summary,
     has_submitted_feedback,
     encrypt_regno,
     is_encrypted,
 )
 from config import (
-    DEPARTMENTS_FILE,
-    SEMESTERS_FILE,
-    STAFFS_FILE,
-    SUBJECTS_FILE,
     REQUIRED_FILES,
     FEEDBACK_QUESTIONS,
-    STUDENT_FILE,
+    SERVER_MODE,
 )
+from storage import get_storage
+from jobs import job_queue
 from asgiref.wsgi import WsgiToAsgi
+from logs import RequestTimingMiddleware
 
 app = Flask(__name__)
 app.secret_key = "your_secret_key"  # Replace with a secure key in production
 app.register_blueprint(hod_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(jobs_bp)
 
 
-asgi_app = WsgiToAsgi(app)
+class FlaskBridge(WsgiToAsgi):
+    """
+    WsgiToAsgi that runs each request in a fresh context.
+
+    uvicorn starts the next request on a keep-alive connection from inside
+    the previous response's send, which asgiref runs with that request's
+    worker-thread executor in a context variable. The new request inherits
+    it, finds the executor shut down and fails with "CurrentThreadExecutor
+    already quit or is broken".
+    """
+
+    async def __call__(self, scope, receive, send):
+        await asyncio.create_task(super().__call__(scope, receive, send),
+                                  context=contextvars.Context())
+
+
+asgi_app = RequestTimingMiddleware(FlaskBridge(app))
 
 
 @app.route("/add_staff", methods=["POST"])
 def add_staff():
     staff_name = request.form.get("staff_name", "").strip()
     if staff_name:
-        with open("staffs.csv", "r", newline="") as csvfile:
-            reader = csv.reader(csvfile)
-            staff_list = [row[0] for row in reader if row]
-        if staff_name in staff_list:
+        if not store_staff(staff_name):
             flash("Staff already exists", "danger")
         else:
-            with open("staffs.csv", "a", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([staff_name])
             flash("Staff added successfully!", "success")
             return {"success": True, "message": "Staff added successfully!"}
     return {"success": False, "message": "Staff name is required"}
@@ -57,15 +78,9 @@ def add_staff():
 def add_subject():
     subject_name = request.form.get("subject_name", "").strip()
     if subject_name:
-        with open("subjects.csv", "r", newline="") as csvfile:
-            reader = csv.reader(csvfile)
-            subject_list = [row[0] for row in reader if row]
-        if subject_name in subject_list:
+        if not store_subject(subject_name):
             flash("Subject already exists", "danger")
         else:
-            with open("subjects.csv", "a", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([subject_name])
             flash("Subject added successfully!", "success")
             return {"success": True, "message": "Subject added successfully!"}
     return {"success": False, "message": "Subject name is required"}
@@ -112,19 +127,12 @@ def validate_regno():
         # Check registration number range
         department = student_info.get("department")
         semester = student_info.get("semester")
-        with open(STUDENT_FILE, "r") as f:
-            reader = csv.DictReader(f)
-            reg_nums = [int(row["registerno"]) for row in reader 
-                      if row["department"] == department and row["semester"] == semester]
-
-        if reg_nums:
-            min_reg = min(reg_nums)
-            max_reg = max(reg_nums)
-            if max_reg - min_reg > 120:
-                return jsonify({
-                    "valid": False,
-                    "message": "Registration number range exceeds 120 for your batch"
-                })
+        batch = get_batch_summary(department, semester)
+        if batch and batch.span > 120:
+            return jsonify({
+                "valid": False,
+                "message": "Registration number range exceeds 120 for your batch"
+            })
 
         return jsonify({
             "valid": True,
@@ -163,21 +171,15 @@ def student_login():
                 flash("Registration number not found. Please try again.", "danger")
                 return render_template("student_login.html")
             
-            # Get all registration numbers from the same department and semester
+            # Registration number span of the same department and semester
             department = student_info.get("department")
             semester = student_info.get("semester")
-            with open(STUDENT_FILE, "r") as f:
-                reader = csv.DictReader(f)
-                reg_nums = [int(row["registerno"]) for row in reader
-                          if row["department"] == department and row["semester"] == semester]
+            batch = get_batch_summary(department, semester)
             
             # Check if the difference between min and max is <= 120
-            if reg_nums:
-                min_reg = min(reg_nums)
-                max_reg = max(reg_nums)
-                if max_reg - min_reg > 120:
-                    flash("Registration number range exceeds 120 for your batch.", "danger")
-                    return render_template("student_login.html")
+            if batch and batch.span > 120:
+                flash("Registration number range exceeds 120 for your batch.", "danger")
+                return render_template("student_login.html")
             
             if has_submitted_feedback(registerno):
                 flash("Feedback already submitted for this registration number.", "info")
@@ -219,8 +221,8 @@ def admin_dashboard():
 
 @app.route("/admin_students")
 def admin_students():
-    departments = read_csv_as_list(DEPARTMENTS_FILE)
-    semesters = read_csv_as_list(SEMESTERS_FILE)
+    departments = get_departments()
+    semesters = get_semesters()
     return render_template(
         "admin_students.html", departments=departments, semesters=semesters
     )
@@ -228,10 +230,10 @@ def admin_students():
 
 @app.route("/admin", methods=["GET", "POST"])
 def admin():
-    departments = read_csv_as_list(DEPARTMENTS_FILE)
-    semesters = read_csv_as_list(SEMESTERS_FILE)
-    staffs = read_csv_as_list(STAFFS_FILE)
-    subjects = read_csv_as_list(SUBJECTS_FILE)
+    departments = get_departments()
+    semesters = get_semesters()
+    staffs = get_staffs()
+    subjects = get_subjects()
 
     if request.method == "POST":
         department = request.form.get("department")
@@ -265,6 +267,49 @@ def admin():
     )
 
 
+def build_rating_rows(form, mappings, department, semester, registerno, mapping_version):
+    """
+    Turn the submitted rating form into rows for RATING_FILE, one per mapping.
+    mapping_version is the class's version, read before mappings were loaded.
+    Return (rating_rows, error), where error is a message for the first
+    missing or invalid rating, or None.
+    """
+    # Ratings are matched to mappings by position, so a form rendered
+    # before the class's mappings changed cannot be accepted
+    form_version = form.get("mapping_version")
+    if form_version and form_version != str(mapping_version):
+        return [], "The staff list for your class was updated. Please fill the form again."
+
+    rating_rows = []
+    for idx, mapping in enumerate(mappings):
+        ratings_dict = {}
+        ratings = []
+        for q in range(1, 11):
+            key = f"rating-{idx}-{q}"
+            value = form.get(key)
+            if not value:
+                return rating_rows, f"Please fill all rating boxes for {mapping['staff']}."
+            try:
+                score = float(value)
+            except ValueError:
+                return rating_rows, f"Invalid rating value for {mapping['staff']}."
+            ratings.append(score)
+            ratings_dict[f"q{q}"] = f"{score:.2f}"
+
+        average = sum(ratings) / len(ratings)
+        row_data = {
+            "registerno": encrypt_regno(registerno) if not is_encrypted(registerno) else registerno,
+            "department": department,
+            "semester": semester,
+            "staff": mapping["staff"],
+            "subject": mapping["subject"],
+            "average": f"{average:.2f}",
+        }
+        row_data.update(ratings_dict)  # Add individual question ratings
+        rating_rows.append(row_data)
+    return rating_rows, None
+
+
 @app.route("/feedback", methods=["GET", "POST"])
 def feedback():
     department = request.args.get("department")
@@ -279,6 +324,9 @@ def feedback():
         flash("Feedback already submitted. You have already registered.", "info")
         return redirect(url_for("student_login"))
 
+    # Read before the mappings so the form never carries a newer version
+    # than the rows it shows
+    mapping_version = get_mapping_version(department, semester)
     mappings = load_admin_mapping(department, semester)
     if not mappings:
         return (
@@ -290,47 +338,11 @@ def feedback():
             flash("Feedback already submitted. You have already registered.", "info")
             return redirect(url_for("student_login"))
 
-        rating_rows = []
-        error_flag = False
-
-        for idx, mapping in enumerate(mappings):
-            ratings_dict = {}
-            ratings = []
-            for q in range(1, 11):
-                key = f"rating-{idx}-{q}"
-                value = request.form.get(key)
-                if not value:
-                    flash(
-                        f"Please fill all rating boxes for {mapping['staff']}.",
-                        "danger",
-                    )
-                    error_flag = True
-                    break
-                try:
-                    score = float(value)
-                except ValueError:
-                    flash(f"Invalid rating value for {mapping['staff']}.", "danger")
-                    error_flag = True
-                    break
-                ratings.append(score)
-                ratings_dict[f"q{q}"] = f"{score:.2f}"
-
-            if error_flag:
-                break
-
-            average = sum(ratings) / len(ratings)
-            row_data = {
-                "registerno": encrypt_regno(registerno) if not is_encrypted(registerno) else registerno,
-                "department": department,
-                "semester": semester,
-                "staff": mapping["staff"],
-                "subject": mapping["subject"],
-                "average": f"{average:.2f}",
-            }
-            row_data.update(ratings_dict)  # Add individual question ratings
-            rating_rows.append(row_data)
+        rating_rows, error = build_rating_rows(request.form, mappings, department, semester,
+                                               registerno, mapping_version)
 
-        if error_flag:
+        if error is not None:
+            flash(error, "danger")
             return redirect(
                 url_for(
                     "feedback",
@@ -339,8 +351,10 @@ def feedback():
                     registerno=registerno,
                 )
             )
+        elif not submit_feedback(registerno, rating_rows):
+            flash("Feedback already submitted. You have already registered.", "info")
+            return redirect(url_for("student_login"))
         else:
-            append_ratings(rating_rows)
             flash("Feedback submitted successfully. Thank you!", "success")
             return redirect(url_for("student_login"))
 
@@ -349,6 +363,7 @@ def feedback():
         department=department,
         semester=semester,
         mappings=mappings,
+        mapping_version=mapping_version,
         questions=FEEDBACK_QUESTIONS,
     )
 
@@ -376,8 +391,13 @@ if __name__ == "__main__":
                 f"Error: No write permission for {file}. Please check file permissions."
             )
             exit(1)
+    get_storage().initialize()
+    job_queue.start()
 
     import uvicorn
     import socket
     host_ip = socket.gethostbyname(socket.gethostname())
-    uvicorn.run(asgi_app, host=host_ip, port=80)
+    if SERVER_MODE == 'native':
+        uvicorn.run("native_app:asgi_app", host=host_ip, port=80)
+    else:
+        uvicorn.run(asgi_app, host=host_ip, port=80)
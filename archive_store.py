@@ -0,0 +1,324 @@
+"""
+Compressed, deduplicated storage for archived terms.
+
+Archiving used to leave full plaintext copies of the CSV files in every
+history/<timestamp>/ directory. A packed archive keeps only a
+manifest.json in its directory. The manifest lists, per file, its size,
+its SHA-256 and the chunks it is made of. Each chunk is stored once under
+HISTORY_DIR/chunks/, zstandard-compressed and named by the SHA-256 of its
+uncompressed bytes. A file that did not change between terms therefore
+costs nothing but its manifest entry.
+
+Files are cut into chunks of about ARCHIVE_CHUNK_BYTES, always just after
+a newline. Cuts fall at the same offsets for the same leading bytes, so a
+file that only grew shares every chunk but the last with its previous
+version.
+
+Readers go through open_file(), which streams a file back one chunk at a
+time, checking each chunk's hash. It also reads unpacked (legacy) archive
+directories, so callers never need to know which kind they have.
+
+    python -m archive_store pack [dirs...]    pack archives (default: all unpacked)
+    python -m archive_store restore DIR [--to TARGET]
+    python -m archive_store verify            check every chunk of every archive
+    python -m archive_store gc                remove chunks no manifest uses
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+from datetime import datetime
+import zstandard
+from config import HISTORY_DIR, ARCHIVE_CHUNK_BYTES, ARCHIVE_ZSTD_LEVEL
+from locking import file_lock
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+CHUNK_DIR = os.path.join(HISTORY_DIR, 'chunks')
+
+
+class ArchiveError(ValueError):
+    """An archive or chunk is missing or does not match its manifest."""
+
+
+def _chunk_path(digest, chunk_dir=CHUNK_DIR):
+    return os.path.join(chunk_dir, digest[:2], f"{digest}.zst")
+
+
+def iter_chunks(f, chunk_bytes=ARCHIVE_CHUNK_BYTES):
+    """Yield successive chunks of a binary file, each ending just after a newline."""
+    pending = b''
+    while True:
+        data = f.read(chunk_bytes)
+        if not data:
+            break
+        pending += data
+        while len(pending) >= chunk_bytes:
+            cut = pending.find(b'\n', chunk_bytes - 1) + 1
+            if not cut:
+                break
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def store_file(path, chunk_dir=CHUNK_DIR):
+    """
+    Store the chunks of path that are not stored yet and return its manifest
+    entry: {'size', 'sha256', 'chunks': [[chunk sha256, size], ...]}.
+    """
+    compressor = zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL)
+    whole = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter_chunks(f):
+            whole.update(chunk)
+            size += len(chunk)
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append([digest, len(chunk)])
+            chunk_path = _chunk_path(digest, chunk_dir)
+            if os.path.exists(chunk_path):
+                continue
+            os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+            temp_path = f"{chunk_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as out:
+                out.write(compressor.compress(chunk))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, chunk_path)
+    return {'size': size, 'sha256': whole.hexdigest(), 'chunks': chunks}
+
+
+def is_packed(archive_dir):
+    return os.path.exists(os.path.join(archive_dir, MANIFEST))
+
+
+def read_manifest(archive_dir):
+    """Return the manifest of a packed archive."""
+    try:
+        with open(os.path.join(archive_dir, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArchiveError(f"{archive_dir} has no readable manifest: {e}")
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ArchiveError(f"{archive_dir} has an unsupported manifest version")
+    return manifest
+
+
+def pack(archive_dir, chunk_dir=CHUNK_DIR, source_dir=None):
+    """
+    Move the files of an unpacked archive directory into the chunk store and
+    write its manifest. The plaintext files are removed only after the
+    manifest is safely written. Return the manifest.
+
+    With source_dir, the files of source_dir are packed instead and their
+    manifest atomically replaces archive_dir's, which may already be
+    packed. Chunks only the old manifest used are left for gc().
+    """
+    if source_dir is None:
+        if is_packed(archive_dir):
+            raise ArchiveError(f"{archive_dir} is already packed")
+        source_dir = archive_dir
+    names = sorted(name for name in os.listdir(source_dir)
+                   if os.path.isfile(os.path.join(source_dir, name)) and name != MANIFEST)
+    # gc() holds this lock too, so it never removes a chunk we just reused
+    with file_lock(chunk_dir):
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'packed_at': datetime.now().isoformat(timespec='seconds'),
+            'files': {name: store_file(os.path.join(source_dir, name), chunk_dir) for name in names},
+        }
+        temp_path = os.path.join(archive_dir, f"{MANIFEST}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(archive_dir, MANIFEST))
+    for name in names:
+        os.remove(os.path.join(source_dir, name))
+    return manifest
+
+
+class ChunkReader(io.RawIOBase):
+    """Raw binary stream over a list of chunks, decompressed one at a time."""
+
+    def __init__(self, chunks, chunk_dir=CHUNK_DIR):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._chunk_dir = chunk_dir
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._buffer = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def _next_chunk(self):
+        entry = next(self._chunks, None)
+        if entry is None:
+            return False
+        digest, size = entry
+        try:
+            with open(_chunk_path(digest, self._chunk_dir), 'rb') as f:
+                data = self._decompressor.decompress(f.read(), max_output_size=size)
+        except (OSError, zstandard.ZstdError) as e:
+            raise ArchiveError(f"Chunk {digest} is unreadable: {e}")
+        if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+            raise ArchiveError(f"Chunk {digest} does not match its hash")
+        self._buffer = memoryview(data)
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            if not self._next_chunk():
+                return 0
+        count = min(len(b), len(self._buffer))
+        b[:count] = self._buffer[:count]
+        self._buffer = self._buffer[count:]
+        return count
+
+
+def file_signature(archive_dir, name):
+    """
+    Return a value that changes whenever the named archive file does:
+    [size, sha256] for a packed archive, [size, mtime_ns] for an unpacked
+    one, or None if the archive has no such file.
+    """
+    if is_packed(archive_dir):
+        entry = read_manifest(archive_dir)['files'].get(name)
+        return None if entry is None else [entry['size'], entry['sha256']]
+    try:
+        st = os.stat(os.path.join(archive_dir, name))
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def list_files(archive_dir):
+    """Return the names of the files in an archive, packed or not."""
+    if is_packed(archive_dir):
+        return sorted(read_manifest(archive_dir)['files'])
+    return sorted(name for name in os.listdir(archive_dir)
+                  if os.path.isfile(os.path.join(archive_dir, name)))
+
+
+def open_file(archive_dir, name, chunk_dir=CHUNK_DIR):
+    """
+    Open a file of an archive, packed or not, as a buffered binary stream.
+    Packed files are decompressed chunk by chunk as the stream is read.
+    """
+    if not is_packed(archive_dir):
+        return open(os.path.join(archive_dir, name), 'rb')
+    entry = read_manifest(archive_dir)['files'].get(name)
+    if entry is None:
+        raise FileNotFoundError(os.path.join(archive_dir, name))
+    return io.BufferedReader(ChunkReader(entry['chunks'], chunk_dir), buffer_size=ARCHIVE_CHUNK_BYTES)
+
+
+def open_text(archive_dir, name, chunk_dir=CHUNK_DIR):
+    """open_file() wrapped for reading CSV text."""
+    return io.TextIOWrapper(open_file(archive_dir, name, chunk_dir), encoding='utf-8', newline='')
+
+
+def restore(archive_dir, target_dir=None, chunk_dir=CHUNK_DIR):
+    """
+    Write the files of a packed archive into target_dir (default: the
+    archive directory itself), checking each file's hash. Return the
+    restored paths.
+    """
+    target_dir = target_dir or archive_dir
+    os.makedirs(target_dir, exist_ok=True)
+    restored = []
+    for name, entry in read_manifest(archive_dir)['files'].items():
+        path = os.path.join(target_dir, name)
+        whole = hashlib.sha256()
+        with open_file(archive_dir, name, chunk_dir) as src, open(f"{path}.tmp", 'wb') as out:
+            for data in iter(lambda: src.read(ARCHIVE_CHUNK_BYTES), b''):
+                whole.update(data)
+                out.write(data)
+        if whole.hexdigest() != entry['sha256']:
+            os.remove(f"{path}.tmp")
+            raise ArchiveError(f"{name} in {archive_dir} does not match its manifest")
+        os.replace(f"{path}.tmp", path)
+        restored.append(path)
+    return restored
+
+
+def archive_dirs(history_dir=HISTORY_DIR):
+    """
+    Return every archive directory under history_dir, packed or not.
+    Hidden directories are working space (see encrypt_existing_data), not
+    archives.
+    """
+    try:
+        entries = list(os.scandir(history_dir))
+    except OSError:
+        return []
+    return sorted(entry.path for entry in entries
+                  if entry.is_dir() and entry.name != os.path.basename(CHUNK_DIR)
+                  and not entry.name.startswith('.'))
+
+
+def verify(history_dir=HISTORY_DIR, chunk_dir=CHUNK_DIR):
+    """Read back every file of every packed archive; return the problems found."""
+    problems = []
+    for archive_dir in archive_dirs(history_dir):
+        if not is_packed(archive_dir):
+            continue
+        try:
+            for name, entry in read_manifest(archive_dir)['files'].items():
+                whole = hashlib.sha256()
+                with open_file(archive_dir, name, chunk_dir) as f:
+                    for data in iter(lambda: f.read(ARCHIVE_CHUNK_BYTES), b''):
+                        whole.update(data)
+                if whole.hexdigest() != entry['sha256']:
+                    problems.append(f"{archive_dir}/{name}: content does not match the manifest")
+        except ArchiveError as e:
+            problems.append(f"{archive_dir}: {e}")
+    return problems
+
+
+def gc(history_dir=HISTORY_DIR, chunk_dir=CHUNK_DIR):
+    """Remove chunks that no manifest references any more; return how many."""
+    removed = 0
+    with file_lock(chunk_dir):
+        used = set()
+        for archive_dir in archive_dirs(history_dir):
+            if is_packed(archive_dir):
+                for entry in read_manifest(archive_dir)['files'].values():
+                    used.update(digest for digest, _ in entry['chunks'])
+        for root, _, files in os.walk(chunk_dir):
+            for name in files:
+                if name.endswith('.zst') and name[:-len('.zst')] not in used:
+                    os.remove(os.path.join(root, name))
+                    removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack, restore and check archived terms.")
+    parser.add_argument('command', choices=['pack', 'restore', 'verify', 'gc'])
+    parser.add_argument('dirs', nargs='*', help="archive directories (pack, restore)")
+    parser.add_argument('--to', default=None, help="restore into this directory instead")
+    args = parser.parse_args()
+
+    if args.command == 'pack':
+        dirs = args.dirs or [d for d in archive_dirs() if not is_packed(d)]
+        for archive_dir in dirs:
+            manifest = pack(archive_dir)
+            print(f"Packed {len(manifest['files'])} files of {archive_dir}", file=sys.stderr)
+    elif args.command == 'restore':
+        if len(args.dirs) != 1:
+            parser.error("restore takes one archive directory")
+        for path in restore(args.dirs[0], args.to):
+            print(f"Restored {path}", file=sys.stderr)
+    elif args.command == 'verify':
+        problems = verify()
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+    else:
+        print(f"Removed {gc()} unused chunks", file=sys.stderr)
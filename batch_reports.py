@@ -0,0 +1,274 @@
+"""
+Bulk feedback report generation for every department and semester.
+
+All rating aggregates are read in one pass and split per class. Reports that
+are not already in the report cache are rendered across a process pool, and
+the PDFs are written into a ZIP archive that is streamed out chunk by chunk
+as each report completes.
+
+Usage: python -m batch_reports [--output feedback_reports.zip] [--workers N]
+"""
+import argparse
+import multiprocessing
+import sys
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from config import BATCH_REPORT_WORKERS, REPORT_STATISTICS, REPORT_TREND_TERMS
+from history_analytics import history_index
+from rating_sketch import RatingSketch
+from report_generator import build_feedback_report, report_filename
+from report_cache import report_cache
+from utils import get_departments, get_semesters, normalize_semester, get_rating_statistics
+from storage import get_storage
+
+ReportJob = namedtuple('ReportJob', ['department', 'semester', 'filename',
+                                     'slice_id', 'content_id', 'report_args'])
+
+
+def feedback_data_from_summary(rows):
+    """Build generate_feedback_report's feedback_data from aggregate rows."""
+    feedback_data = {}
+    for staff_counter, row in enumerate(rows, 1):
+        staff_name = row['staff']
+        subject_name = row['subject']
+        feedback_data[f"{staff_name}_{subject_name}"] = {
+            'reference': f'S{staff_counter}',
+            'staff_name': staff_name,
+            'subject': subject_name,
+            'scores': [round(score, 2) for score in row['q_avgs']]
+        }
+    return feedback_data
+
+
+def _rounded(stats):
+    """ScoreStats as a plain dict, rounded so equal data hashes to the same cache entry."""
+    return {
+        'count': stats.count,
+        'mean': None if stats.mean is None else round(stats.mean, 2),
+        'std': None if stats.std is None else round(stats.std, 2),
+        'median': stats.median,
+    }
+
+
+def report_statistics(rows):
+    """
+    Build generate_feedback_report's statistics from aggregate rows that
+    carry sketches: pooled figures per staff, per question figures and the
+    score distribution of the whole class.
+    """
+    staff = []
+    for staff_counter, row in enumerate(rows, 1):
+        entry = _rounded(row['sketch'].pooled_stats())
+        entry.update(reference=f'S{staff_counter}', staff_name=row['staff'],
+                     subject=row['subject'], responses=row['sketch'].count)
+        staff.append(entry)
+    class_sketch = RatingSketch.merged(row['sketch'] for row in rows)
+    return {
+        'staff': staff,
+        'questions': [_rounded(stats) for stats in class_sketch.question_stats()],
+        'distribution': class_sketch.pooled_stats().histogram,
+    }
+
+
+def report_trend(department, rows, terms=REPORT_TREND_TERMS):
+    """
+    Build generate_feedback_report's trend: the total (out of 100, as in
+    the report table) of each staff/subject of rows in the last terms
+    archived terms where they were rated, or None if none were. Uses the
+    history index as last refreshed.
+    """
+    if terms <= 0:
+        return None
+    trends = [{point.term: point.sketch
+               for point in history_index.trend(department=department, staff=row['staff'],
+                                                subject=row['subject'])
+               if point.sketch.count}
+              for row in rows]
+    shown = [(name, archived) for name, archived in history_index.terms()
+             if any(name in trend for trend in trends)][-terms:]
+    if not shown:
+        return None
+    staff = []
+    for staff_counter, (row, trend) in enumerate(zip(rows, trends), 1):
+        totals = [round(sum(trend[name].q_avgs()), 2) if name in trend else None
+                  for name, _ in shown]
+        staff.append({'reference': f'S{staff_counter}', 'staff_name': row['staff'],
+                      'subject': row['subject'], 'totals': totals,
+                      'current': round(sum(round(score, 2) for score in row['q_avgs']), 2)})
+    return {'terms': [archived.strftime('%b %Y') for _, archived in shown], 'staff': staff}
+
+
+def report_rows(department=None, semester=None):
+    """
+    Aggregate rows for reports of one department/semester (every class when
+    department is None), with sketches when REPORT_STATISTICS is on.
+    """
+    if REPORT_STATISTICS:
+        return get_rating_statistics(department, semester)
+    return get_storage().aggregate_ratings(department, semester)
+
+
+def report_job(department, semester, rows, academic_year=None, refresh_history=True):
+    """
+    Return the ReportJob for one department/semester, or None without data.
+    Rows carrying a 'sketch' (see report_rows) add the statistics page.
+    refresh_history=False skips refreshing the history index, for callers
+    that already did.
+    """
+    feedback_data = feedback_data_from_summary(rows)
+    if not feedback_data:
+        return None
+    normalized_semester = normalize_semester(semester)
+    try:
+        year = str((int(normalized_semester) + 1) // 2)
+    except ValueError:
+        year = ''
+    report_args = dict(
+        academic_year=academic_year or str(datetime.now().year),
+        branch=department,
+        semester=semester,
+        year=year,
+        feedback_data=feedback_data
+    )
+    if all('sketch' in row for row in rows):
+        report_args['statistics'] = report_statistics(rows)
+    if refresh_history and REPORT_TREND_TERMS > 0:
+        # Picks up terms archived by other processes
+        history_index.refresh()
+    trend = report_trend(department, rows)
+    if trend:
+        report_args['trend'] = trend
+    return ReportJob(department, semester, report_filename(department, semester),
+                     report_cache.slice_id(department.strip(), normalized_semester),
+                     report_cache.content_id(report_args), report_args)
+
+
+def collect_report_jobs(academic_year=None):
+    """
+    Return a ReportJob for every department/semester that has ratings,
+    ordered like the department and semester lists.
+    """
+    by_class = {}
+    for row in report_rows():
+        key = (row['department'].strip(), normalize_semester(row['semester']))
+        by_class.setdefault(key, []).append(row)
+
+    departments = {dep.strip(): rank for rank, dep in enumerate(get_departments())}
+    semesters = {}
+    for rank, sem in enumerate(get_semesters()):
+        semesters.setdefault(normalize_semester(sem), (rank, sem))
+
+    def order(key):
+        return (departments.get(key[0], len(departments)),
+                semesters.get(key[1], (len(semesters),))[0], key)
+
+    if REPORT_TREND_TERMS > 0:
+        # Once for every report below
+        history_index.refresh()
+    jobs = []
+    for dep, sem in sorted(by_class, key=order):
+        # Label the semester as the HOD page does, so both share cache entries
+        label = semesters.get(sem, (None, sem))[1]
+        jobs.append(report_job(dep, label, by_class[(dep, sem)], academic_year,
+                               refresh_history=False))
+    return jobs
+
+
+def _render(report_args):
+    return build_feedback_report(**report_args)
+
+
+def render_reports(jobs, workers=BATCH_REPORT_WORKERS):
+    """
+    Yield (job, pdf_bytes) for every job, cached reports first and the rest
+    in completion order as the process pool renders them.
+    """
+    pending = []
+    for job in jobs:
+        pdf = report_cache.get(job.slice_id, job.content_id)
+        if pdf is None:
+            pending.append(job)
+        else:
+            yield job, pdf
+    if not pending:
+        return
+
+    if workers == 1:
+        for job in pending:
+            pdf = _render(job.report_args)
+            report_cache.put(job.slice_id, job.content_id, pdf)
+            yield job, pdf
+        return
+
+    # Spawned, not forked: the web server process has threads (the ratings
+    # writer, request handlers) whose locks a fork could copy mid-use.
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context('spawn'))
+    try:
+        futures = {pool.submit(_render, job.report_args): job for job in pending}
+        for future in as_completed(futures):
+            job = futures[future]
+            pdf = future.result()
+            report_cache.put(job.slice_id, job.content_id, pdf)
+            yield job, pdf
+    finally:
+        # Stop queued renders if the consumer went away early
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _ChunkBuffer:
+    """Unseekable write-only file that collects bytes for a streaming ZIP."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_reports_zip(jobs, workers=BATCH_REPORT_WORKERS, progress=None):
+    """
+    Yield a ZIP archive of the reports for jobs as byte chunks, one chunk
+    per finished report. progress(done, total, job) is called after each.
+    """
+    buffer = _ChunkBuffer()
+    # PDF streams are already compressed; deflating them again buys little
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for done, (job, pdf) in enumerate(render_reports(jobs, workers), 1):
+            archive.writestr(job.filename, pdf)
+            if progress is not None:
+                progress(done, len(jobs), job)
+            yield buffer.take()
+    yield buffer.take()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate every department/semester feedback report into a ZIP file.")
+    parser.add_argument('--output', default='feedback_reports.zip', help="ZIP file to write")
+    parser.add_argument('--workers', type=int, default=BATCH_REPORT_WORKERS,
+                        help="report processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    jobs = collect_report_jobs()
+    if not jobs:
+        print("No rating data found.", file=sys.stderr)
+        sys.exit(1)
+
+    def show_progress(done, total, job):
+        print(f"[{done}/{total}] {job.department} - {job.semester}", file=sys.stderr)
+
+    with open(args.output, 'wb') as out:
+        for chunk in iter_reports_zip(jobs, args.workers, show_progress):
+            out.write(chunk)
+    print(f"Wrote {len(jobs)} reports to {args.output}", file=sys.stderr)
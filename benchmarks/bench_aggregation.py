@@ -0,0 +1,94 @@
+"""
+Compare the row-by-row Python aggregation of ratings.csv with the vectorized
+NumPy/pandas engine in ratings_analytics.
+
+Usage: python -m benchmarks.bench_aggregation [--rows 200000] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import ratings_analytics
+from config import REQUIRED_FILES, RATING_FILE
+from utils import write_mainratings
+
+
+def generate_ratings(path, rows, seed=42):
+    """Write a synthetic ratings file with realistic key cardinality."""
+    rng = random.Random(seed)
+    departments = [f"Department {i}" for i in range(14)]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_FILES[RATING_FILE])
+        for i in range(rows):
+            dep = rng.choice(departments)
+            sem = str(rng.randint(1, 8))
+            slot = rng.randint(1, 8)
+            scores = [rng.randint(1, 10) for _ in range(10)]
+            writer.writerow([f"regno{i // 8}", dep, sem, f"Staff {dep[-2:]}-{sem}-{slot}",
+                             f"Subject {sem}-{slot}"]
+                            + [f"{s:.2f}" for s in scores] + [f"{sum(scores) / 10:.2f}"])
+
+
+def python_loop_mainratings(path, output):
+    """The per-row, per-question float() loop update_mainratings used to run."""
+    aggregated = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            key = (row.get('department', '').strip(), row.get('semester', '').strip(),
+                   row.get('staff', '').strip(), row.get('subject', '').strip())
+            if key not in aggregated:
+                aggregated[key] = {'q_sums': [0.0] * 10, 'count': 0, 'total_avg': 0.0}
+            for i in range(1, 11):
+                try:
+                    aggregated[key]['q_sums'][i-1] += float(row.get(f'q{i}', 0))
+                except (ValueError, TypeError):
+                    continue
+            try:
+                aggregated[key]['total_avg'] += float(row.get('average', 0))
+                aggregated[key]['count'] += 1
+            except (ValueError, TypeError):
+                continue
+    write_mainratings(
+        ({'department': key[0], 'semester': key[1], 'staff': key[2], 'subject': key[3],
+          'q_avgs': [s / data['count'] for s in data['q_sums']],
+          'overall_average': data['total_avg'] / data['count']}
+         for key, data in aggregated.items() if data['count']),
+        output)
+
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ratings = os.path.join(tmp, 'ratings.csv')
+        loop_out = os.path.join(tmp, 'mainrating_loop.csv')
+        vector_out = os.path.join(tmp, 'mainrating_vectorized.csv')
+        generate_ratings(ratings, args.rows)
+        size_mb = os.path.getsize(ratings) / 1e6
+
+        loop_time = best_of(args.repeat, python_loop_mainratings, ratings, loop_out)
+        vector_time = best_of(args.repeat, ratings_analytics.update_mainratings, ratings, vector_out)
+
+        with open(loop_out, encoding='utf-8') as a, open(vector_out, encoding='utf-8') as b:
+            identical = a.read() == b.read()
+
+    print(f"ratings rows:       {args.rows} ({size_mb:.1f} MB)")
+    print(f"python loop:        {loop_time * 1000:8.1f} ms")
+    print(f"vectorized:         {vector_time * 1000:8.1f} ms")
+    print(f"speedup:            {loop_time / vector_time:8.1f}x")
+    print(f"identical output:   {identical}")
@@ -0,0 +1,102 @@
+"""
+Compare per-report time and PDF size for the old pyplot chart (global state,
+300 DPI PNG) with the Figure-template raster engine and the ReportLab vector
+engine in charts.py.
+
+Usage: python -m benchmarks.bench_charts [--staff 8] [--repeat 10]
+"""
+import argparse
+import contextlib
+import functools
+import io
+import random
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from reportlab.platypus import Image
+import charts
+import report_generator
+
+
+def sample_feedback_data(staff, seed=42):
+    rng = random.Random(seed)
+    return {
+        f"staff{i}_subject{i}": {
+            'reference': f"S{i}",
+            'staff_name': f"Staff {i}",
+            'subject': f"Subject {i}",
+            'scores': [round(rng.uniform(5, 10), 2) for _ in range(10)],
+        }
+        for i in range(1, staff + 1)
+    }
+
+
+def pyplot_score_graph(feedback_data):
+    """The pyplot chart create_score_graph used to draw."""
+    references, totals = charts.score_totals(feedback_data)
+    plt.rcParams['figure.dpi'] = 300
+    fig, ax = plt.subplots(figsize=(10, 4))
+    bars = ax.bar(references, totals, color='#007bff')
+    ax.set_ylim(0, 100)
+    plt.xticks(fontsize=9)
+    plt.yticks(fontsize=9)
+    for bar, total in zip(bars, totals):
+        ax.text(bar.get_x() + bar.get_width()/2.0, bar.get_height(),
+                f'{total:.1f}', ha='center', va='bottom', fontsize=9)
+    ax.grid(True, axis='y', linestyle='--', alpha=0.7)
+    plt.tight_layout()
+    buf = io.BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight', dpi=300)
+    plt.close(fig)
+    buf.seek(0)
+    return buf
+
+
+def pyplot_chart(feedback_data, width, height):
+    img = Image(pyplot_score_graph(feedback_data))
+    img.drawWidth = width
+    img.drawHeight = height
+    return img
+
+
+ENGINES = {
+    'pyplot (old)': pyplot_chart,
+    'raster': functools.partial(charts.score_chart, engine='raster'),
+    'vector': functools.partial(charts.score_chart, engine='vector'),
+}
+
+
+def build_report(feedback_data):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return report_generator.build_feedback_report(
+            academic_year="2024-25", branch="Benchmark", semester="4", year="II",
+            feedback_data=feedback_data)
+
+
+def time_engine(chart_func, feedback_data, repeat):
+    original = report_generator.score_chart
+    report_generator.score_chart = chart_func
+    try:
+        pdf = build_report(feedback_data)  # warm-up
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pdf = build_report(feedback_data)
+            timings.append(time.perf_counter() - start)
+    finally:
+        report_generator.score_chart = original
+    return min(timings), len(pdf)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--staff', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    feedback_data = sample_feedback_data(args.staff)
+    print(f"{'engine':<14}{'ms/report':>12}{'PDF bytes':>12}")
+    for name, chart_func in ENGINES.items():
+        seconds, size = time_engine(chart_func, feedback_data, args.repeat)
+        print(f"{name:<14}{seconds * 1000:12.1f}{size:12d}")
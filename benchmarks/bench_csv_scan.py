@@ -0,0 +1,70 @@
+"""
+Compare building the ratings indexes (SubmissionIndex and RatingAggregates)
+from csv.DictReader rows with the mmap ColumnScanner path they use now.
+
+Usage: python -m benchmarks.bench_csv_scan [--rows 200000] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import tempfile
+from aggregates import RatingAggregates
+from benchmarks.bench_aggregation import best_of
+from benchmarks.bench_ratings_log import generate_ratings
+from indexes import SubmissionIndex
+
+
+def dictreader_indexes(path):
+    """The submission set and per-class sums as the DictReader loops built them."""
+    submitted = set()
+    groups = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            submitted.add(SubmissionIndex._key(row.get('registerno', '')))
+            key = (row.get('department', '').strip(), row.get('semester', '').strip(),
+                   row.get('staff', '').strip(), row.get('subject', '').strip())
+            group = groups.setdefault(key, {'q_sums': [0.0] * 10, 'count': 0, 'total_avg': 0.0})
+            for i in range(1, 11):
+                try:
+                    group['q_sums'][i-1] += float(row.get(f'q{i}', 0))
+                except (ValueError, TypeError):
+                    continue
+            try:
+                group['total_avg'] += float(row.get('average', 0))
+                group['count'] += 1
+            except (ValueError, TypeError):
+                continue
+    return submitted, groups
+
+
+def scanner_indexes(path, checkpoint_path):
+    submissions = SubmissionIndex(path)
+    submissions.refresh()
+    aggregates = RatingAggregates(path, checkpoint_path)
+    aggregates.invalidate()
+    aggregates.refresh()
+    return submissions._submitted, {
+        key: {'q_sums': sketch.q_sums, 'count': sketch.count, 'total_avg': sketch.total_average}
+        for key, sketch in aggregates._groups.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ratings = os.path.join(tmp, 'ratings.csv')
+        checkpoint = os.path.join(tmp, 'checkpoint.json')
+        generate_ratings(ratings, args.rows)
+
+        dict_time = best_of(args.repeat, dictreader_indexes, ratings)
+        scan_time = best_of(args.repeat, scanner_indexes, ratings, checkpoint)
+        identical = dictreader_indexes(ratings) == scanner_indexes(ratings, checkpoint)
+
+    print(f"ratings rows:       {args.rows}")
+    print(f"DictReader:         {dict_time * 1000:8.1f} ms ({args.rows / dict_time / 1e6:.2f} M rows/s)")
+    print(f"column scanner:     {scan_time * 1000:8.1f} ms ({args.rows / scan_time / 1e6:.2f} M rows/s)")
+    print(f"speedup:            {dict_time / scan_time:8.1f}x")
+    print(f"identical indexes:  {identical}")
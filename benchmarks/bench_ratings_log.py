@@ -0,0 +1,72 @@
+"""
+Compare ratings.csv with the binary ratings log (ratings_log.py): file size,
+time to load each into a RatingMatrix, and the full group statistics built
+from either.
+
+Usage: python -m benchmarks.bench_ratings_log [--rows 200000] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import ratings_analytics
+import ratings_log
+from benchmarks.bench_aggregation import best_of
+from config import REQUIRED_FILES, RATING_FILE
+from regno import encrypt_regno
+
+
+def generate_ratings(path, rows, seed=42):
+    """
+    Write a synthetic ratings file like bench_aggregation's, but with hashed
+    registration numbers as the app stores them.
+    """
+    rng = random.Random(seed)
+    departments = [f"Department {i}" for i in range(14)]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(REQUIRED_FILES[RATING_FILE])
+        for i in range(rows):
+            dep = rng.choice(departments)
+            sem = str(rng.randint(1, 8))
+            slot = rng.randint(1, 8)
+            scores = [rng.randint(1, 10) for _ in range(10)]
+            writer.writerow([encrypt_regno(str(922500000000 + i // 8)), dep, sem,
+                             f"Staff {dep[-2:]}-{sem}-{slot}", f"Subject {sem}-{slot}"]
+                            + [f"{s:.2f}" for s in scores] + [f"{sum(scores) / 10:.2f}"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ratings = os.path.join(tmp, 'ratings.csv')
+        log_path = os.path.join(tmp, 'ratings.log')
+        exported = os.path.join(tmp, 'exported.csv')
+        generate_ratings(ratings, args.rows)
+        ratings_log.build_from_csv(ratings, log_path)
+        log = ratings_log.RatingsLog(log_path)
+
+        csv_size = os.path.getsize(ratings)
+        log_size = os.path.getsize(log_path) + os.path.getsize(log.keys_path)
+        csv_time = best_of(args.repeat, ratings_analytics.load_ratings, ratings)
+        log_time = best_of(args.repeat, ratings_analytics.load_ratings_from_log, log)
+
+        csv_stats = list(ratings_analytics.group_statistics(ratings_analytics.load_ratings(ratings)).rows())
+        log_stats = list(ratings_analytics.group_statistics(ratings_analytics.load_ratings_from_log(log)).rows())
+        log.export_csv(exported)
+        with open(ratings, encoding='utf-8') as a, open(exported, encoding='utf-8') as b:
+            round_trip = a.read() == b.read()
+
+    print(f"ratings rows:       {args.rows}")
+    print(f"csv size:           {csv_size / 1e6:8.1f} MB ({csv_size / args.rows:.0f} bytes/row)")
+    print(f"log size:           {log_size / 1e6:8.1f} MB ({log_size / args.rows:.0f} bytes/row)")
+    print(f"csv load:           {csv_time * 1000:8.1f} ms ({args.rows / csv_time / 1e6:.2f} M rows/s)")
+    print(f"log scan:           {log_time * 1000:8.1f} ms ({args.rows / log_time / 1e6:.2f} M rows/s)")
+    print(f"speedup:            {csv_time / log_time:8.1f}x")
+    print(f"identical stats:    {csv_stats == log_stats}")
+    print(f"csv round trip:     {round_trip}")
@@ -0,0 +1,181 @@
+"""
+Load-test the student hot paths under the bridged (app:asgi_app, all of
+Flask through WsgiToAsgi) and native (native_app:asgi_app) ASGI apps.
+
+Each mode gets its own uvicorn server over a fresh, seeded data directory.
+Every virtual student validates a registration number, opens the feedback
+form and submits it. Reports requests/sec and latency percentiles.
+
+Usage: python -m benchmarks.load_test [--students 5000] [--concurrency 50] [--duration 10]
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+import httpx
+from config import (
+    REQUIRED_FILES, DEPARTMENTS_FILE, SEMESTERS_FILE, ADMIN_MAPPING_FILE, STUDENT_FILE
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = {
+    'bridged': 'app:asgi_app',
+    'native': 'native_app:asgi_app',
+}
+BATCH_SIZE = 60  # Students per department, well within the 120 span check
+FIRST_REGNO = 922500000001
+
+
+def seed_data(directory, students):
+    """Write the CSV files for a fresh deployment with students registered."""
+    departments = [f"Department {i}" for i in range((students + BATCH_SIZE - 1) // BATCH_SIZE)]
+    rows = {
+        DEPARTMENTS_FILE: [[dep] for dep in departments],
+        SEMESTERS_FILE: [['4']],
+        ADMIN_MAPPING_FILE: [[dep, '4', f"Staff {i}", f"Subject {i}"]
+                             for dep in departments for i in range(5)],
+        STUDENT_FILE: [[str(FIRST_REGNO + i), departments[i // BATCH_SIZE], '4']
+                       for i in range(students)],
+    }
+    for filename, headers in REQUIRED_FILES.items():
+        with open(os.path.join(directory, filename), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows.get(filename, []))
+    return departments
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_path, directory, port):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', app_path, '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning', '--no-access-log'],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"{app_path} did not start")
+
+
+class Connection:
+    """
+    A bare keep-alive HTTP/1.1 connection. The server and the load share
+    the machine, so the client does as little as possible per request:
+    requests are prebuilt bytes and only the status and body are parsed.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=b''):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if method == 'POST':
+            head += ("Content-Type: application/x-www-form-urlencoded\r\n"
+                     f"Content-Length: {len(body)}\r\n")
+        self.writer.write(head.encode('latin-1') + b"\r\n" + body)
+        headers = (await self.reader.readuntil(b"\r\n\r\n")).decode('latin-1').lower()
+        status = int(headers.split(' ', 2)[1])
+        if 'transfer-encoding: chunked' in headers:
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            length = headers.partition('content-length:')[2].split('\r\n', 1)[0]
+            await self.reader.readexactly(int(length or 0))
+        if 'connection: close' in headers:
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def run_load(port, students, departments, concurrency, duration):
+    latencies = []
+    errors = 0
+    regnos = itertools.count()
+    form = urlencode({f'rating-{i}-{q}': str(q) for i in range(5) for q in range(1, 11)}).encode()
+    deadline = time.monotonic() + duration
+
+    async def timed(connection, method, path, body=b''):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            if await connection.request(method, path, body) >= 400:
+                errors += 1
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors += 1
+            connection.close()
+        latencies.append(time.perf_counter() - start)
+
+    async def student():
+        connection = Connection('127.0.0.1', port)
+        while time.monotonic() < deadline:
+            i = next(regnos) % students
+            regno = str(FIRST_REGNO + i)
+            query = urlencode({'department': departments[i // BATCH_SIZE], 'semester': '4',
+                               'registerno': regno})
+            await timed(connection, 'POST', '/validate_regno', f"registerno={regno}".encode())
+            await timed(connection, 'GET', f"/feedback?{query}")
+            await timed(connection, 'POST', f"/feedback?{query}", form)
+        connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(student() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode, app_path in MODES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            departments = seed_data(directory, args.students)
+            port = free_port()
+            server = start_server(app_path, directory, port)
+            try:
+                latencies, errors, elapsed = asyncio.run(run_load(
+                    port, args.students, departments, args.concurrency, args.duration))
+            finally:
+                server.terminate()
+                server.wait()
+        latencies.sort()
+        print(f"{mode:<10}{len(latencies):>10}{len(latencies) / elapsed:>10.0f}"
+              f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+              f"{errors:>8}")
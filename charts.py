@@ -0,0 +1,157 @@
+"""
+Score charts for the feedback report.
+
+Two engines draw the per-staff total bar chart and the score distribution
+chart of the statistics page:
+
+- 'vector' builds a ReportLab Drawing, which goes into the PDF as native
+  vector graphics: no rasterizing, a much smaller PDF and no matplotlib.
+- 'raster' renders a PNG through matplotlib's object-oriented Figure API.
+  Each thread reuses its own pre-configured figure template, and no pyplot
+  global state is touched, so concurrent report builds do not interfere.
+"""
+import io
+import threading
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.platypus import Image
+from config import CHART_ENGINE, CHART_RASTER_DPI
+
+BAR_COLOR = '#007bff'
+
+
+def score_totals(feedback_data):
+    """Return (references, totals) with each total out of 100."""
+    references = []
+    totals = []
+    for data in feedback_data.values():
+        references.append(data.get('reference', data.get('staff_name', '')))
+        totals.append((sum(data['scores']) / 10) * 10)
+    return references, totals
+
+
+def score_distribution(histogram):
+    """Return (score labels, percentage of scores in each bucket) for a 1..10 histogram."""
+    total = sum(histogram)
+    return ([str(score) for score in range(1, len(histogram) + 1)],
+            [count * 100 / total if total else 0.0 for count in histogram])
+
+
+def bar_chart_drawing(labels, values, width, height):
+    """Return a 0-100 bar chart as a ReportLab Drawing of width x height points."""
+    drawing = Drawing(width, height)
+    if not values:
+        return drawing
+
+    chart = VerticalBarChart()
+    chart.x = 25
+    chart.y = 15
+    chart.width = width - 35
+    chart.height = height - 30
+    chart.data = [values]
+    chart.barSpacing = 2
+    chart.groupSpacing = 10
+    chart.bars[0].fillColor = colors.HexColor(BAR_COLOR)
+    chart.bars[0].strokeColor = None
+
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = 100
+    chart.valueAxis.valueStep = 20
+    chart.valueAxis.labels.fontSize = 7
+    chart.valueAxis.visibleGrid = True
+    chart.valueAxis.gridStrokeColor = colors.lightgrey
+    chart.valueAxis.gridStrokeDashArray = (2, 2)
+
+    chart.categoryAxis.categoryNames = labels
+    chart.categoryAxis.labels.fontSize = 7
+    chart.categoryAxis.labels.dy = -2
+
+    # Value label on top of each bar
+    chart.barLabelFormat = '%.1f'
+    chart.barLabels.fontSize = 7
+    chart.barLabels.nudge = 6
+
+    drawing.add(chart)
+    return drawing
+
+
+def score_chart_drawing(feedback_data, width, height):
+    """Return the score chart as a ReportLab Drawing of width x height points."""
+    return bar_chart_drawing(*score_totals(feedback_data), width, height)
+
+
+class FigureChartRenderer:
+    """Render 0-100 bar charts to PNG with a per-thread matplotlib Figure."""
+
+    def __init__(self, figsize=(10, 4), dpi=CHART_RASTER_DPI):
+        self.figsize = figsize
+        self.dpi = dpi
+        self._local = threading.local()
+
+    def _template(self):
+        template = getattr(self._local, 'template', None)
+        if template is None:
+            # Imported here so the vector engine never loads matplotlib
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+            fig = Figure(figsize=self.figsize, dpi=self.dpi)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            ax.set_ylim(0, 100)
+            ax.tick_params(labelsize=9)
+            ax.grid(True, axis='y', linestyle='--', alpha=0.7)
+            ax.set_axisbelow(True)
+            fig.subplots_adjust(left=0.05, right=0.99, top=0.97, bottom=0.1)
+            template = self._local.template = (fig, ax)
+        return template
+
+    def render(self, feedback_data):
+        """Return a BytesIO holding the score chart as a PNG."""
+        return self.render_bars(*score_totals(feedback_data))
+
+    def render_bars(self, names, values):
+        """Return a BytesIO holding a bar per value, labelled with names, as a PNG."""
+        fig, ax = self._template()
+        positions = range(len(values))
+        bars = ax.bar(positions, values, color=BAR_COLOR)
+        ax.set_xticks(positions, names)
+        ax.set_xlim(-0.5, max(len(values), 1) - 0.5)
+        labels = [ax.text(bar.get_x() + bar.get_width() / 2.0, bar.get_height(),
+                          f'{value:.1f}', ha='center', va='bottom', fontsize=9)
+                  for bar, value in zip(bars, values)]
+        try:
+            buf = io.BytesIO()
+            fig.savefig(buf, format='png', dpi=self.dpi)
+        finally:
+            # Strip this report's artists so the template can be reused
+            bars.remove()
+            for label in labels:
+                label.remove()
+        buf.seek(0)
+        return buf
+
+
+figure_renderer = FigureChartRenderer()
+
+
+def _bar_chart(labels, values, width, height, engine):
+    if engine == 'vector':
+        return bar_chart_drawing(labels, values, width, height)
+    if engine == 'raster':
+        img = Image(figure_renderer.render_bars(labels, values))
+        img.drawWidth = width
+        img.drawHeight = height
+        return img
+    raise ValueError(f"Unknown chart engine: {engine}")
+
+
+def score_chart(feedback_data, width, height, engine=CHART_ENGINE):
+    """Return the score chart as a flowable sized width x height points."""
+    return _bar_chart(*score_totals(feedback_data), width, height, engine)
+
+
+def distribution_chart(histogram, width, height, engine=CHART_ENGINE):
+    """Return the percentage of scores at each value 1..10 as a flowable."""
+    return _bar_chart(*score_distribution(histogram), width, height, engine)
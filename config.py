@@ -7,6 +7,79 @@ ADMIN_MAPPING_FILE = 'admin_mapping.csv'
 RATING_FILE = 'ratings.csv'
 STUDENT_FILE = 'students.csv'  # Contains: registerno,department,semester
 MAINRATING_FILE = 'mainrating.csv'  # New aggregated ratings file
+MAINRATING_CHECKPOINT_FILE = 'mainrating_state.json'  # Incremental aggregate state + ratings offset
+ADMIN_MAPPING_VERSION_FILE = 'admin_mapping_version.json'  # Version counters of admin_mapping.csv
+RATINGS_LOG_FILE = 'ratings.log'  # Offline binary snapshot of ratings.csv, built by ratings_log.py
+
+# Archived terms: one directory per archive, named with ARCHIVE_NAME_FORMAT,
+# indexed into HISTORY_INDEX_FILE for trend queries (see history_analytics.py)
+HISTORY_DIR = 'history'
+ARCHIVE_NAME_FORMAT = '%d-%b-%Y--%H-%M-%S'
+HISTORY_INDEX_FILE = 'history_index.npz'
+
+# 'packed' stores each archive as a manifest over zstandard-compressed,
+# content-addressed chunks shared by all archives (see archive_store.py);
+# 'copy' leaves plain CSV copies in the archive directory
+ARCHIVE_FORMAT = 'packed'
+ARCHIVE_CHUNK_BYTES = 1024 * 1024
+ARCHIVE_ZSTD_LEVEL = 10
+
+# Storage backend: 'csv' uses the files above, 'sqlite' uses SQLITE_DB_FILE
+# (import existing CSV data with: python -m storage.migrate)
+STORAGE_BACKEND = 'csv'
+SQLITE_DB_FILE = 'feedback.db'
+
+# How update_mainratings aggregates: 'storage' asks the storage backend
+# (incremental store for CSV, GROUP BY for SQLite), 'vectorized' recomputes
+# everything with NumPy/pandas (see ratings_analytics.py)
+AGGREGATION_ENGINE = 'storage'
+
+# Generated HOD reports are cached here, least recently used evicted first
+REPORT_CACHE_DIR = 'report_cache'
+REPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Report bar chart: 'vector' draws it with ReportLab graphics, 'raster'
+# embeds a matplotlib PNG rendered at CHART_RASTER_DPI (see charts.py)
+CHART_ENGINE = 'vector'
+CHART_RASTER_DPI = 300
+
+# Add a second page to HOD reports with response counts, standard
+# deviations, medians and the score distribution (see rating_sketch.py)
+REPORT_STATISTICS = True
+
+# Archived terms shown in the trend table of HOD reports (0 leaves it out)
+REPORT_TREND_TERMS = 4
+
+# Processes rendering reports for the all-departments ZIP (None: one per CPU)
+BATCH_REPORT_WORKERS = None
+
+# Most processes encrypt_existing_data.py hashes with by default; the app keeps
+# serving reads meanwhile, so the migration does not take every CPU
+ENCRYPT_WORKERS = 4
+
+# Background jobs (report generation, archiving, student imports), queued in
+# SQLite and run by JOB_WORKERS threads in each server process (see jobs.py)
+JOB_DB_FILE = 'jobs.db'
+JOB_WORKERS = 2
+JOB_LEASE_SECONDS = 600  # A job silent this long is assumed crashed and retried
+JOB_RETENTION_SECONDS = 24 * 60 * 60  # Finished jobs and their results are kept this long
+
+# How app.py serves: 'bridged' runs all of Flask through WsgiToAsgi; 'native'
+# runs the student pages as async handlers and bridges the rest to Flask
+# (native_app.py). Compare them with benchmarks/load_test.py before switching.
+SERVER_MODE = 'bridged'
+
+# Structured logs on stderr (see logs.py): level, 'logfmt' or 'json', and the
+# fraction of HTTP requests whose timing is logged
+LOG_LEVEL = 'INFO'
+LOG_FORMAT = 'logfmt'
+LOG_REQUEST_SAMPLE = 1.0
+
+# Registration number hashing (see regno.py). With REGNO_HMAC_KEY set, new
+# hashes are HMAC-SHA256 under that key and no longer match hashes already
+# stored with the default salted SHA-256, so set it before encrypting data.
+REGNO_HMAC_KEY = None
+REGNO_HASH_CACHE_SIZE = 65536
 
 # Required CSV files and their headers
 REQUIRED_FILES = {
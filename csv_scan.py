@@ -0,0 +1,84 @@
+"""
+Column scanner for the append-only CSV data files.
+
+The indexes over RATING_FILE need only a few columns of each row, but
+csv.reader builds a list of every field and the indexes then built a dict
+per row on top of it. ColumnScanner reads whole lines from a bytes-like
+buffer, usually an mmap of the file. It works in windows of WINDOW_BYTES
+and decodes each window once. Each line is split on commas only as far as
+the last column it needs, and only those fields are returned, as a tuple.
+
+The app never writes quotes or bare carriage returns into its rows. A
+window that contains either (a spreadsheet export, for example) is handed
+to the csv module instead, so quoted commas and newlines still parse the
+same way they always have.
+"""
+import csv
+import io
+from operator import itemgetter
+
+# Bytes decoded and split at a time; always cut at a line boundary
+WINDOW_BYTES = 4 * 1024 * 1024
+
+
+def parse_header(line):
+    """Return the stripped column names of a header line given as bytes."""
+    text = line.decode('utf-8-sig')
+    return [name.strip() for name in next(csv.reader([text]), [])]
+
+
+class ColumnScanner:
+    """Yields the requested columns of each row as a tuple of strings."""
+
+    def __init__(self, header, columns):
+        self.header = header
+        self.columns = tuple(columns)
+        self._indexes = [header.index(column) if column in header else None
+                         for column in self.columns]
+        present = [index for index in self._indexes if index is not None]
+        self._maxsplit = max(present) + 1 if present else 0
+        # Rows long enough to hold every column take the itemgetter path
+        self._getter = None
+        if present and len(present) == len(self._indexes):
+            getter = itemgetter(*present)
+            self._getter = (lambda fields: (getter(fields),)) if len(present) == 1 else getter
+
+    def _pick(self, fields):
+        count = len(fields)
+        return tuple(fields[index] if index is not None and index < count else None
+                     for index in self._indexes)
+
+    def _window_end(self, buf, start, end):
+        """End of the next window from start: past a newline, outside quotes."""
+        stop = start + WINDOW_BYTES
+        if stop >= end:
+            return end
+        stop = buf.rfind(b'\n', start, stop) + 1 or buf.find(b'\n', stop, end) + 1 or end
+        # An odd number of quotes means a quoted field runs past the cut
+        while stop < end and buf[start:stop].count(b'"') % 2:
+            stop = buf.find(b'\n', stop, end) + 1 or end
+        return stop
+
+    def rows(self, buf, start=0, end=None):
+        """
+        Yield one tuple per non-blank row in buf[start:end], which must hold
+        whole lines and no header. A column missing from the header, or from
+        a short row, comes back as None.
+        """
+        end = len(buf) if end is None else end
+        pick = self._pick
+        getter = self._getter or pick
+        maxsplit = self._maxsplit
+        while start < end:
+            stop = self._window_end(buf, start, end)
+            text = buf[start:stop].decode('utf-8').replace('\r\n', '\n')
+            start = stop
+            if '"' in text or '\r' in text:
+                for fields in csv.reader(io.StringIO(text, newline='')):
+                    if fields:
+                        yield pick(fields)
+                continue
+            for line in text.split('\n'):
+                if line:
+                    fields = line.split(',', maxsplit)
+                    yield getter(fields) if len(fields) >= maxsplit else pick(fields)
@@ -1,16 +1,157 @@
+"""
+Hash the plain registration numbers stored in the CSV data files.
+
+Files are migrated as a stream: the source is read in blocks of whole
+records (a quoted field may hold a newline, so blocks are only cut at a
+newline outside quotes), the blocks are hashed by a pool of worker processes, and the results are
+written in order to '<file>.encrypting', which replaces the source with an
+atomic rename once complete. After every block the progress is saved to
+'<file>.encrypting.json', so an interrupted run picks up where it stopped
+when started again. Memory use does not depend on the file size.
+
+Archived terms (--history) are migrated through archive_store. An unpacked
+archive's files are migrated in place. A packed archive is content-addressed,
+so its chunks cannot be rewritten in place: the term is restored into a
+hidden staging directory, migrated there and packed again, and the new
+manifest replaces the old one. Chunks are shared between terms, so a chunk
+holding plain numbers stays until no term uses it. gc() runs after all
+terms are done and removes those chunks.
+
+Usage: python encrypt_existing_data.py [files...] [--history] [--workers N]
+With no files, ratings.csv and students.csv are migrated.
+"""
+import argparse
 import csv
+import io
+import json
+import multiprocessing
 import os
+import shutil
 import sys
-from utils import normalize_regno, encrypt_regno, is_encrypted
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import archive_store
+from config import ENCRYPT_WORKERS
+from locking import file_lock
+from regno import encrypt_regno, is_encrypted
+
+# Bytes of source read per block handed to a worker
+BLOCK_BYTES = 1024 * 1024
+
+
+class _InProcessExecutor:
+    """Runs submitted work immediately, for workers=1."""
+
+    class _Done:
+        def __init__(self, value):
+            self._value = value
+
+        def result(self):
+            return self._value
 
-def encrypt_csv_file(file_path, regno_field='registerno'):
+    def submit(self, fn, *args):
+        return self._Done(fn(*args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _encrypt_block(text, column):
+    """
+    Hash column of every row in text (CSV without its header). Return the
+    rewritten rows as bytes and how many values were hashed.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out)
+    count = 0
+    for row in csv.reader(io.StringIO(text, newline='')):
+        if len(row) > column and row[column] and not is_encrypted(row[column]):
+            row[column] = encrypt_regno(row[column])
+            count += 1
+        writer.writerow(row)
+    return out.getvalue().encode('utf-8'), count
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return [st.st_ino, st.st_size, st.st_mtime_ns]
+
+
+def _read_header(path):
+    """Return (header cells, byte offset of the first data row)."""
+    with open(path, 'rb') as f:
+        line = f.readline()
+    text = line.decode('utf-8-sig')
+    return next(csv.reader([text]), []), len(line)
+
+
+def _record_end(data):
+    """
+    Return the offset just past the last newline in data that ends a record,
+    or 0 if there is none. data starts at a record boundary, so a newline ends
+    a record when an even number of quote characters precede it ("" escapes
+    count twice, and b'"' never occurs inside a multibyte UTF-8 character).
+    """
+    end = data.rfind(b'\n') + 1
+    odd = data.count(b'"', 0, end) % 2
+    while end and odd:
+        start = data.rfind(b'\n', 0, end - 1) + 1
+        odd ^= data.count(b'"', start, end) % 2
+        end = start
+    return end
+
+
+def _iter_blocks(f, offset):
+    """Yield (text, end offset) for successive runs of whole records from offset."""
+    f.seek(offset)
+    pending = b''
+    while True:
+        data = f.read(BLOCK_BYTES)
+        if not data:
+            break
+        data = pending + data
+        end = _record_end(data)
+        if not end:
+            pending = data
+            continue
+        offset += end
+        pending = data[end:]
+        yield data[:end].decode('utf-8'), offset
+    if pending:
+        # Last record without a trailing newline
+        yield pending.decode('utf-8'), offset + len(pending)
+
+
+def _save_checkpoint(path, state):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def _load_checkpoint(checkpoint_path, temp_path, signature):
+    """Return the saved progress if it belongs to this exact source file."""
+    try:
+        with open(checkpoint_path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (state.get('source') != signature or not os.path.exists(temp_path)
+            or os.path.getsize(temp_path) < state.get('written', 0)):
+        return None
+    return state
+
+
+def encrypt_csv_file(file_path, regno_field='registerno', workers=None):
     """
     Encrypt registration numbers in a CSV file.
-    
+
     Args:
         file_path: Path to the CSV file
         regno_field: Name of the field containing registration numbers
-        
+        workers: Hashing processes (default: one per CPU, at most
+            ENCRYPT_WORKERS; 1 to hash in-process)
+
     Returns:
         bool: True if successful, False otherwise
     """
@@ -18,68 +159,169 @@ def encrypt_csv_file(file_path, regno_field='registerno'):
     if not os.path.exists(file_path):
         print(f"Error: {file_path} not found.")
         return False
-    
-    # Read all records
+
+    temp_path = f"{file_path}.encrypting"
+    checkpoint_path = f"{temp_path}.json"
+    workers = workers or min(os.cpu_count() or 1, ENCRYPT_WORKERS)
+
     try:
-        with open(file_path, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            records = list(reader)
-        
-        # Encrypt registration numbers
-        encrypted_count = 0
-        for record in records:
-            regno = record.get(regno_field, '')
-            if regno:
-                try:
-                    # Check if already encrypted
-                    if is_encrypted(regno):
-                        print(f"Register number {regno} is already encrypted.")
-                        continue
-                        
-                    # Encrypt the registration number
-                    encrypted_regno = encrypt_regno(regno)
-                    record[regno_field] = encrypted_regno
-                    encrypted_count += 1
-                    print(f"Encrypted {regno} to {encrypted_regno}")
-                except Exception as e:
-                    print(f"Could not encrypt {regno}: {str(e)}")
-                    print(f"Error details: {sys.exc_info()}")
-        
-        # Write back the encrypted records
-        with open(file_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(records)
-        
-        print(f"Successfully encrypted {encrypted_count} registration numbers in {file_path}")
+        # Keeps the app from appending to the file while it is rewritten
+        with file_lock(file_path):
+            header, data_offset = _read_header(file_path)
+            if regno_field not in header:
+                print(f"Error: {file_path} has no '{regno_field}' column.")
+                return False
+            column = header.index(regno_field)
+            signature = _file_signature(file_path)
+
+            state = _load_checkpoint(checkpoint_path, temp_path, signature)
+            if state is None:
+                state = {'source': signature, 'offset': data_offset, 'written': 0, 'encrypted': 0}
+                out = open(temp_path, 'wb')
+                header_line = io.StringIO()
+                csv.writer(header_line).writerow(header)
+                out.write(header_line.getvalue().encode('utf-8'))
+            else:
+                print(f"Resuming {file_path} at byte {state['offset']} of {signature[1]}")
+                out = open(temp_path, 'r+b')
+                out.truncate(state['written'])
+                out.seek(state['written'])
+
+            if workers == 1:
+                pool = _InProcessExecutor()
+            else:
+                # Spawned like the report pool, see batch_reports.py
+                pool = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context('spawn'))
+            try:
+                with out, open(file_path, 'rb') as source:
+                    # Keep a bounded number of blocks in flight so memory stays flat
+                    in_flight = deque()
+                    blocks = _iter_blocks(source, state['offset'])
+                    while True:
+                        while len(in_flight) < workers * 2:
+                            block = next(blocks, None)
+                            if block is None:
+                                break
+                            text, end = block
+                            in_flight.append((pool.submit(_encrypt_block, text, column), end))
+                        if not in_flight:
+                            break
+                        future, end = in_flight.popleft()
+                        data, count = future.result()
+                        out.write(data)
+                        out.flush()
+                        os.fsync(out.fileno())
+                        state.update(offset=end, written=out.tell(),
+                                     encrypted=state['encrypted'] + count)
+                        _save_checkpoint(checkpoint_path, state)
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+            os.replace(temp_path, file_path)
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+
+        print(f"Successfully encrypted {state['encrypted']} registration numbers in {file_path}")
         return True
-    
+
     except Exception as e:
         print(f"Error encrypting data in {file_path}: {str(e)}")
+        if os.path.exists(temp_path):
+            print(f"Progress is saved; run again to resume {file_path}")
         return False
 
-def encrypt_ratings_csv():
+def encrypt_ratings_csv(workers=None):
     """
     Encrypt registration numbers in the ratings.csv file.
     """
-    return encrypt_csv_file('ratings.csv')
+    return encrypt_csv_file('ratings.csv', workers=workers)
 
-def encrypt_students_csv():
+def encrypt_students_csv(workers=None):
     """
     Encrypt registration numbers in the students.csv file.
     """
-    return encrypt_csv_file('students.csv')
+    return encrypt_csv_file('students.csv', workers=workers)
+
+# Files of an archived term that hold registration numbers
+HISTORY_FILES = ('ratings.csv', 'students.csv')
+
+def _has_plain_regnos(archive_dir, name, regno_field='registerno'):
+    """Return True if an archive file has a registration number not yet hashed."""
+    with archive_store.open_text(archive_dir, name) as f:
+        reader = csv.reader(f)
+        header = [cell.lstrip('\ufeff') for cell in next(reader, [])]
+        if regno_field not in header:
+            return False
+        column = header.index(regno_field)
+        return any(len(row) > column and row[column] and not is_encrypted(row[column])
+                   for row in reader)
+
+def encrypt_archive(archive_dir, workers=None):
+    """
+    Encrypt registration numbers in one archived term, packed or not.
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    if not archive_store.is_packed(archive_dir):
+        paths = [os.path.join(archive_dir, name) for name in HISTORY_FILES]
+        return all([encrypt_csv_file(path, workers=workers) for path in paths if os.path.exists(path)])
+
+    # Hidden, so archive_store and the history index do not take it for a term
+    parent, term = os.path.split(os.path.normpath(archive_dir))
+    staging = os.path.join(parent, f".encrypting-{term}")
+    try:
+        files = archive_store.list_files(archive_dir)
+        names = [name for name in HISTORY_FILES
+                 if name in files and _has_plain_regnos(archive_dir, name)]
+    except archive_store.ArchiveError as e:
+        print(f"Error reading archive {archive_dir}: {e}")
+        return False
+    if not names:
+        # Left behind if a run stopped right after repacking
+        shutil.rmtree(staging, ignore_errors=True)
+        print(f"{archive_dir} holds no plain registration numbers")
+        return True
+
+    try:
+        # Kept by an interrupted run, whose per-file progress resumes
+        if not all(os.path.exists(os.path.join(staging, name)) for name in files):
+            archive_store.restore(archive_dir, staging)
+        for name in names:
+            if not encrypt_csv_file(os.path.join(staging, name), workers=workers):
+                return False
+        for name in os.listdir(staging):
+            if name.endswith('.lock'):
+                os.remove(os.path.join(staging, name))
+        archive_store.pack(archive_dir, source_dir=staging)
+        shutil.rmtree(staging)
+    except (archive_store.ArchiveError, OSError) as e:
+        print(f"Error repacking archive {archive_dir}: {e}")
+        return False
+    print(f"Repacked {archive_dir}")
+    return True
+
+def encrypt_history(workers=None):
+    """Encrypt every archived term; return the archive directories that failed."""
+    failed = [archive_dir for archive_dir in archive_store.archive_dirs()
+              if not encrypt_archive(archive_dir, workers=workers)]
+    # Drops the chunks of the plaintext versions no manifest refers to now
+    print(f"Removed {archive_store.gc()} unused archive chunks")
+    return failed
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hash the plain registration numbers in CSV data files.")
+    parser.add_argument('files', nargs='*', help="CSV files to migrate (default: ratings.csv and students.csv)")
+    parser.add_argument('--history', action='store_true', help="also migrate every archive under history/")
+    parser.add_argument('--workers', type=int, default=None, help=f"hashing processes (default: one per CPU, at most {ENCRYPT_WORKERS})")
+    args = parser.parse_args()
+
+    files = args.files or ['ratings.csv', 'students.csv']
+
     print("Starting encryption of registration numbers...")
-    
-    # Encrypt ratings.csv
-    ratings_result = encrypt_ratings_csv()
-    print(f"Ratings encryption {'completed successfully' if ratings_result else 'failed'}")
-    
-    # Encrypt students.csv
-    students_result = encrypt_students_csv()
-    print(f"Students encryption {'completed successfully' if students_result else 'failed'}")
-    
-    print("Encryption process complete.")
+    failed = [path for path in files if not encrypt_csv_file(path, workers=args.workers)]
+    if args.history:
+        failed += encrypt_history(workers=args.workers)
+    print("Encryption process complete." if not failed else f"Encryption failed for: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
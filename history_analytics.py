@@ -0,0 +1,266 @@
+"""
+Trend analytics over the archived terms in HISTORY_DIR.
+
+Every archive directory (one per use of the HOD 'archive' action) is
+aggregated once with ratings_analytics.group_statistics. One row per
+(term, department, semester, staff, subject) goes into a columnar store:
+NumPy arrays of key ids, counts, sums, sums of squares and score
+histograms, saved together in HISTORY_INDEX_FILE. Each refresh lists
+HISTORY_DIR and reads every archive's manifest, so callers refresh once
+per report (see batch_reports) rather than once per query. New archives
+are indexed and appended. An archive whose
+ratings file changed, or that has gone, is dropped and indexed again if
+it is still there. The other terms are never reread. Packed archives are
+read by streaming their chunks through archive_store and are never
+unpacked to disk.
+
+A trend query masks the key columns and sums the matching rows per term
+with np.add.at, returning one RatingSketch per term. Queries answer from
+the index as last refreshed (or as saved, in a new process) and never
+touch HISTORY_DIR.
+
+Rebuild the index from scratch with: python -m history_analytics
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+import archive_store
+from config import HISTORY_DIR, HISTORY_INDEX_FILE, ARCHIVE_NAME_FORMAT, RATING_FILE
+from locking import file_lock
+from logs import get_logger
+from rating_sketch import RatingSketch, QUESTIONS, SCORE_BUCKETS
+
+log = get_logger('history')
+
+KEY_COLUMNS = ['department', 'semester', 'staff', 'subject']
+
+# Bumped when the saved columns change; an older index is rebuilt
+INDEX_VERSION = 1
+
+# One archived term of a trend; sketch holds the matching ratings merged
+TrendPoint = namedtuple('TrendPoint', ['term', 'archived_at', 'sketch'])
+
+
+def _empty_columns():
+    return {
+        'term': np.zeros(0, dtype=np.int32),
+        'keys': np.zeros((0, len(KEY_COLUMNS)), dtype=np.int32),
+        'count': np.zeros(0, dtype=np.int64),
+        'total_average': np.zeros(0),
+        'q_sums': np.zeros((0, QUESTIONS)),
+        'q_counts': np.zeros((0, QUESTIONS), dtype=np.int64),
+        'q_sumsq': np.zeros((0, QUESTIONS)),
+        'histogram': np.zeros((0, QUESTIONS, SCORE_BUCKETS), dtype=np.int64),
+    }
+
+
+def archived_at(name, path):
+    """When an archive was taken, from its directory name or else its mtime."""
+    try:
+        return datetime.strptime(name, ARCHIVE_NAME_FORMAT)
+    except ValueError:
+        return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+class HistoryIndex:
+    """Columnar per-term group statistics of every archive in history_dir."""
+
+    def __init__(self, history_dir=HISTORY_DIR, path=HISTORY_INDEX_FILE):
+        self.history_dir = history_dir
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._columns = _empty_columns()
+        # [{'name', 'archived_at' (ISO), 'signature'}], indexed by term id
+        self._terms = []
+        self._keys = []
+        self._key_ids = {}
+
+    # Building
+
+    def _archives(self):
+        """Return {directory name: ratings file signature} of the archives on disk."""
+        archives = {}
+        for path in archive_store.archive_dirs(self.history_dir):
+            try:
+                signature = archive_store.file_signature(path, os.path.basename(RATING_FILE))
+            except archive_store.ArchiveError:
+                # Manifest still being written, or damaged; see archive_store verify
+                continue
+            if signature is not None:
+                archives[os.path.basename(path)] = signature
+        return archives
+
+    def _intern(self, value):
+        key_id = self._key_ids.get(value)
+        if key_id is None:
+            key_id = self._key_ids[value] = len(self._keys)
+            self._keys.append(value)
+        return key_id
+
+    def _index_term(self, name, signature):
+        """Aggregate one archive and return its columns."""
+        # Imported here so the app does not load pandas until it needs to
+        import ratings_analytics
+        path = os.path.join(self.history_dir, name)
+        with archive_store.open_file(path, os.path.basename(RATING_FILE)) as f:
+            stats = ratings_analytics.group_statistics(ratings_analytics.load_ratings(f))
+        term_id = len(self._terms)
+        self._terms.append({'name': name, 'archived_at': archived_at(name, path).isoformat(),
+                            'signature': signature})
+        keys = np.array([[self._intern(value) for value in key] for key in stats.keys],
+                        dtype=np.int32).reshape(-1, len(KEY_COLUMNS))
+        return {
+            'term': np.full(len(stats), term_id, dtype=np.int32),
+            'keys': keys,
+            'count': stats.count.astype(np.int64),
+            'total_average': stats.total_average.astype(np.float64),
+            'q_sums': stats.q_sums.astype(np.float64),
+            'q_counts': stats.q_counts.astype(np.int64),
+            'q_sumsq': stats.q_sumsq.astype(np.float64),
+            'histogram': stats.distribution.astype(np.int64),
+        }
+
+    def _drop_terms(self, names):
+        """Remove the rows of the named terms and renumber the rest."""
+        keep = [term_id for term_id, term in enumerate(self._terms) if term['name'] not in names]
+        remap = np.full(len(self._terms), -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        mask = remap[self._columns['term']] >= 0
+        self._columns = {column: values[mask] for column, values in self._columns.items()}
+        self._columns['term'] = remap[self._columns['term']]
+        self._terms = [self._terms[term_id] for term_id in keep]
+
+    def _load(self):
+        self._loaded = True
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('version') != INDEX_VERSION:
+                    return
+                columns = {column: data[column] for column in _empty_columns()}
+        except (OSError, KeyError, ValueError):
+            return
+        self._columns = columns
+        self._terms = meta['terms']
+        self._keys = meta['keys']
+        self._key_ids = {value: key_id for key_id, value in enumerate(self._keys)}
+
+    def _save(self):
+        meta = json.dumps({'version': INDEX_VERSION, 'terms': self._terms, 'keys': self._keys})
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, meta=np.array(meta), **self._columns)
+        os.replace(temp_path, self.path)
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._load()
+
+    def _indexed(self):
+        return {term['name']: term['signature'] for term in self._terms}
+
+    def refresh(self):
+        """Index archives added or changed since the last call; return how many."""
+        archives = self._archives()
+        with self._lock:
+            self._ensure_loaded()
+            if self._indexed() == archives:
+                return 0
+            # Other processes build the same index; one at a time
+            with file_lock(self.path):
+                # One of them may have indexed these terms while we waited
+                self._load()
+                indexed = self._indexed()
+                changed = {name for name, signature in indexed.items()
+                           if archives.get(name) != signature}
+                pending = sorted((name for name in archives if name not in indexed or name in changed),
+                                 key=lambda name: archived_at(name, os.path.join(self.history_dir, name)))
+                if not changed and not pending:
+                    return 0
+                if changed:
+                    self._drop_terms(changed)
+                parts = [self._columns]
+                for name in pending:
+                    parts.append(self._index_term(name, archives[name]))
+                    log.info('history_term_indexed', term=name, groups=len(parts[-1]['term']))
+                self._columns = {column: np.concatenate([part[column] for part in parts])
+                                 for column in self._columns}
+                self._save()
+            return len(pending)
+
+    def rebuild(self):
+        """Drop the index and build it again from every archive."""
+        with self._lock:
+            with file_lock(self.path):
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+            self._loaded = True
+            self._columns = _empty_columns()
+            self._terms, self._keys, self._key_ids = [], [], {}
+        return self.refresh()
+
+    # Queries
+
+    def terms(self):
+        """Return (name, archived_at datetime) of every indexed term, oldest first."""
+        with self._lock:
+            self._ensure_loaded()
+            terms = [(term['name'], datetime.fromisoformat(term['archived_at'])) for term in self._terms]
+        return sorted(terms, key=lambda term: term[1])
+
+    def trend(self, department=None, semester=None, staff=None, subject=None):
+        """
+        Return a TrendPoint per archived term with ratings matching every
+        given key (compared after stripping), oldest first. Archives added
+        since the last refresh() are not included.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            columns = self._columns
+            mask = np.ones(len(columns['term']), dtype=bool)
+            for column, value in enumerate((department, semester, staff, subject)):
+                if value is None:
+                    continue
+                key_id = self._key_ids.get(str(value).strip())
+                if key_id is None:
+                    return []
+                mask &= columns['keys'][:, column] == key_id
+            terms = columns['term'][mask]
+            totals = {}
+            for column in ('count', 'total_average', 'q_sums', 'q_counts', 'q_sumsq', 'histogram'):
+                values = columns[column]
+                total = np.zeros((len(self._terms),) + values.shape[1:], dtype=values.dtype)
+                np.add.at(total, terms, values[mask])
+                totals[column] = total
+            points = []
+            for term_id in np.unique(terms):
+                sketch = RatingSketch()
+                sketch.count = int(totals['count'][term_id])
+                sketch.total_average = float(totals['total_average'][term_id])
+                sketch.q_sums = totals['q_sums'][term_id].tolist()
+                sketch.q_counts = totals['q_counts'][term_id].tolist()
+                sketch.q_sumsq = totals['q_sumsq'][term_id].tolist()
+                sketch.histogram = totals['histogram'][term_id].tolist()
+                term = self._terms[term_id]
+                points.append(TrendPoint(term['name'], datetime.fromisoformat(term['archived_at']), sketch))
+        return sorted(points, key=lambda point: point.archived_at)
+
+    def staff_trend(self, staff, department=None):
+        """Trend of one staff member over every subject and class they taught."""
+        return self.trend(department=department, staff=staff)
+
+    def subject_trend(self, subject, department=None):
+        """Trend of one subject over every staff member who taught it."""
+        return self.trend(department=department, subject=subject)
+
+
+history_index = HistoryIndex()
+
+
+if __name__ == "__main__":
+    count = history_index.rebuild()
+    print(f"Indexed {count} archived terms from {HISTORY_DIR} into {HISTORY_INDEX_FILE}")
@@ -0,0 +1,347 @@
+"""
+In-memory indexes over the append-only CSV data files.
+
+Each index is built once from its file and kept in sync by comparing the
+file's signature (inode, size, mtime) on every access. When the file has only
+grown, just the appended bytes are parsed; any other change (truncation,
+rewrite, replacement) triggers a full rebuild. Files are read through an
+mmap, and indexes that need only a few columns get them from a
+ColumnScanner rather than a dict per row. The small one-column reference
+lists (departments, semesters, staff, subjects) are simply reread whole
+when their signature changes.
+"""
+import csv
+import io
+import mmap
+import os
+import threading
+from collections import namedtuple
+from regno import normalize_regno, encrypt_regno, is_encrypted
+from config import (
+    STUDENT_FILE, RATING_FILE, ADMIN_MAPPING_FILE, REQUIRED_FILES,
+    DEPARTMENTS_FILE, SEMESTERS_FILE, STAFFS_FILE, SUBJECTS_FILE
+)
+from utils import normalize_semester
+from csv_scan import ColumnScanner, parse_header
+
+
+def file_signature(path):
+    """Return (inode, size, mtime_ns) for path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class BatchSummary(namedtuple('BatchSummary', ['count', 'min_regno', 'max_regno'])):
+    """
+    Registration-number span of one (department, semester) batch. count
+    includes students stored as hashes; min_regno and max_regno cover only
+    the plain numbers and are None if there are none.
+    """
+
+    __slots__ = ()
+
+    @property
+    def span(self):
+        """max_regno - min_regno, or 0 when no plain number is known."""
+        return 0 if self.min_regno is None else self.max_regno - self.min_regno
+
+
+class TailingCsvIndex:
+    """
+    Base class for an index fed row by row from an append-only CSV file.
+
+    Subclasses implement _reset() to clear their state and _add_row(row) to
+    index a single row (a dict keyed by the CSV header). A subclass that
+    sets COLUMNS implements _add_values(values) instead, which receives
+    only those columns of each row as a tuple (None where a column is
+    missing).
+    """
+
+    # Column names passed to _add_values, or None to use _add_row
+    COLUMNS = None
+
+    # Bytes kept from just before the read offset, used to detect a file that
+    # was rewritten in place rather than appended to.
+    GUARD_BYTES = 64
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._clear()
+
+    def _clear(self):
+        self._signature = None
+        self._offset = 0
+        self._guard = b''
+        self._header = None
+        self._scanner = None
+        self._reset()
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _add_row(self, row):
+        raise NotImplementedError
+
+    def _add_values(self, values):
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Drop the index; the next access rebuilds it from the file."""
+        with self._lock:
+            self._clear()
+
+    def refresh(self):
+        """Bring the index up to date with the file on disk."""
+        signature = file_signature(self.path)
+        with self._lock:
+            if signature == self._signature:
+                return
+            if signature is None:
+                self._clear()
+                return
+            if (self._signature is None or signature[0] != self._signature[0]
+                    or signature[1] < self._offset):
+                self._clear()
+            self._tail()
+            self._signature = signature
+
+    def _tail(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                start = self._offset
+                if start and data[start - len(self._guard):start] != self._guard:
+                    # Same file, different contents: start over
+                    self._clear()
+                    start = 0
+                self._consume(data, start)
+
+    def feed(self, start_offset, data):
+        """
+        Index bytes the caller has just appended at start_offset, sparing the
+        re-read. Ignored unless the index is caught up to exactly that offset;
+        the next refresh then tails the file instead.
+        """
+        with self._lock:
+            if self._signature is not None and self._offset == start_offset:
+                self._consume(data)
+                signature = file_signature(self.path)
+                if signature is not None and signature[1] == self._offset:
+                    self._signature = signature
+
+    def _consume(self, data, start=0):
+        """Index the complete lines of data (bytes or an mmap) from start."""
+        # Only consume complete lines; a partially written row is picked up
+        # on a later refresh.
+        end = data.rfind(b'\n', start) + 1
+        if end <= start:
+            return
+        rows_start = start
+        if self._header is None:
+            rows_start = data.find(b'\n', start) + 1
+            self._header = parse_header(data[start:rows_start])
+
+        if self.COLUMNS is None:
+            text = data[rows_start:end].decode('utf-8')
+            for values in csv.reader(io.StringIO(text, newline='')):
+                if values:
+                    self._add_row(dict(zip(self._header, values)))
+        else:
+            if self._scanner is None:
+                self._scanner = ColumnScanner(self._header, self.COLUMNS)
+            for values in self._scanner.rows(data, rows_start, end):
+                self._add_values(values)
+
+        self._offset += end - start
+        guard_start = max(start, end - self.GUARD_BYTES)
+        self._guard = (self._guard + data[guard_start:end])[-self.GUARD_BYTES:]
+
+
+class StudentRegistry(TailingCsvIndex):
+    """
+    Hash index over STUDENT_FILE.
+
+    Plain-text rows are keyed by their normalized registration number and
+    already-encrypted rows by their hash, so a lookup is at most two dict
+    probes and hashes the input once. A per-(department, semester) summary
+    of the numeric registration numbers is maintained alongside, as is the
+    set of (department, semester, regno hash) memberships used to dedupe
+    imports.
+    """
+
+    def _reset(self):
+        self._by_regno = {}
+        self._batches = {}
+        self._members = set()
+
+    def _add_row(self, row):
+        stored_regno = row.get('registerno', '')
+        if is_encrypted(stored_regno):
+            hashed = stored_regno
+        else:
+            stored_regno = normalize_regno(stored_regno)
+            hashed = encrypt_regno(stored_regno)
+        # Keep the first occurrence, as the old linear scan did
+        self._by_regno.setdefault(stored_regno, row)
+        self._members.add((row.get('department'), row.get('semester'), hashed))
+
+        key = (row.get('department'), row.get('semester'))
+        count, min_regno, max_regno = self._batches.get(key) or (0, None, None)
+        try:
+            # Hashed rows are counted but cannot widen the span
+            reg_num = int(stored_regno)
+        except ValueError:
+            reg_num = None
+        if reg_num is not None:
+            min_regno = reg_num if min_regno is None else min(min_regno, reg_num)
+            max_regno = reg_num if max_regno is None else max(max_regno, reg_num)
+        self._batches[key] = BatchSummary(count + 1, min_regno, max_regno)
+
+    def lookup(self, registerno):
+        """Return the student row for registerno, or None if not registered."""
+        self.refresh()
+        reg_num = normalize_regno(registerno)
+        with self._lock:
+            row = self._by_regno.get(reg_num)
+            if row is None and self._by_regno:
+                row = self._by_regno.get(encrypt_regno(reg_num))
+        return row
+
+    def registered(self, keys):
+        """
+        Return a list of booleans telling which of keys, (department,
+        semester, regno hash) tuples, are already registered.
+        """
+        self.refresh()
+        with self._lock:
+            return [key in self._members for key in keys]
+
+    def batch_summary(self, department, semester):
+        """Return the BatchSummary for a department/semester, or None."""
+        self.refresh()
+        with self._lock:
+            return self._batches.get((department, semester))
+
+
+class SubmissionIndex(TailingCsvIndex):
+    """
+    Set of registration numbers that already have rows in RATING_FILE.
+
+    Stored values are kept in the same normalized/encrypted form as
+    StudentRegistry keys, so a membership check is two set probes.
+    """
+
+    COLUMNS = ('registerno',)
+
+    def _reset(self):
+        self._submitted = set()
+        self._last_added = None
+
+    @staticmethod
+    def _key(stored_regno):
+        if is_encrypted(stored_regno):
+            return stored_regno
+        return normalize_regno(stored_regno)
+
+    def _add_values(self, values):
+        stored_regno = values[0] or ''
+        # A submission writes its rows together, so most rows repeat the
+        # previous one's number
+        if stored_regno != self._last_added:
+            self._submitted.add(self._key(stored_regno))
+            self._last_added = stored_regno
+
+    def add(self, stored_regno):
+        """Record a registration number as written by append_ratings."""
+        with self._lock:
+            self._submitted.add(self._key(stored_regno))
+
+    def contains(self, registerno):
+        """Return True if registerno (plain or encrypted) has submitted."""
+        self.refresh()
+        reg_num = normalize_regno(registerno)
+        with self._lock:
+            if reg_num in self._submitted:
+                return True
+            return bool(self._submitted) and encrypt_regno(reg_num) in self._submitted
+
+
+class MappingIndex(TailingCsvIndex):
+    """
+    ADMIN_MAPPING_FILE grouped by normalized (department, semester).
+
+    Each class keeps its mapping rows in file order, which is the staff and
+    subject order of its feedback form, so a lookup is one dict probe
+    whatever the size of the file. replace_mappings rewrites the file, which
+    the signature check turns into a rebuild.
+    """
+
+    def _reset(self):
+        self._by_class = {}
+
+    @staticmethod
+    def _key(department, semester):
+        return (department.strip(), normalize_semester(semester))
+
+    def _add_row(self, row):
+        key = self._key(row.get('department', ''), row.get('semester', ''))
+        self._by_class.setdefault(key, []).append(row)
+
+    def lookup(self, department, semester):
+        """Return the mapping rows of a department/semester in saved order."""
+        self.refresh()
+        with self._lock:
+            return list(self._by_class.get(self._key(department, semester), ()))
+
+
+class ReferenceList:
+    """
+    Values of a one-column reference CSV, in file order, with a set for
+    membership checks. Served from memory until the file's signature
+    changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = REQUIRED_FILES[path][0]
+        self._lock = threading.Lock()
+        self._signature = None
+        self._values = ()
+        self._members = frozenset()
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        with self._lock:
+            if signature == self._signature:
+                return
+            values = []
+            if signature is not None:
+                with open(self.path, newline='', encoding='utf-8') as f:
+                    values = [row[self.header].strip() for row in csv.DictReader(f)
+                              if row.get(self.header)]
+            self._values = tuple(values)
+            self._members = frozenset(values)
+            self._signature = signature
+
+    def values(self):
+        """Return the values as a new list."""
+        self._refresh()
+        return list(self._values)
+
+    def __contains__(self, value):
+        self._refresh()
+        return value in self._members
+
+
+student_registry = StudentRegistry(STUDENT_FILE)
+submission_index = SubmissionIndex(RATING_FILE)
+mapping_index = MappingIndex(ADMIN_MAPPING_FILE)
+department_list = ReferenceList(DEPARTMENTS_FILE)
+semester_list = ReferenceList(SEMESTERS_FILE)
+staff_list = ReferenceList(STAFFS_FILE)
+subject_list = ReferenceList(SUBJECTS_FILE)
@@ -0,0 +1,253 @@
+"""
+Persistent background job queue.
+
+Jobs are rows in an SQLite database (JOB_DB_FILE), so they survive restarts
+and are shared by every uvicorn worker process. Each process runs a small
+pool of worker threads, started on first use, that claims queued jobs, runs
+the handler registered for the job's kind and stores its result for the
+client to poll and download.
+
+A running job holds a lease that its progress updates renew. If the process
+running it dies, the lease runs out and another worker picks the job up again,
+up to MAX_ATTEMPTS times. Handlers that are not safe to run twice register
+with attempts=1, and their interrupted jobs fail instead.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from config import JOB_DB_FILE, JOB_WORKERS, JOB_LEASE_SECONDS, JOB_RETENTION_SECONDS
+from logs import get_logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result BLOB,
+    result_name TEXT,
+    result_type TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    lease_until REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created);
+"""
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+MAX_ATTEMPTS = 3
+# Seconds an idle worker sleeps before checking for jobs queued elsewhere
+POLL_INTERVAL = 1.0
+
+log = get_logger('jobs')
+
+# What a handler returns: a message, optionally with a file to download
+JobResult = namedtuple('JobResult', ['message', 'data', 'filename', 'mimetype'],
+                       defaults=(None, None, None))
+
+
+class JobError(Exception):
+    """Raised by a handler to fail its job with a message for the user."""
+
+
+_handlers = {}
+# kind -> times a job of that kind may be started
+_max_attempts = {}
+
+
+def job_handler(kind, attempts=MAX_ATTEMPTS):
+    """
+    Register a function as the handler for jobs of the given kind. It is
+    called as handler(progress, **params) and returns a JobResult;
+    progress(fraction, message='') reports how far along it is. A job is
+    started at most attempts times; pass attempts=1 for a handler that must
+    not be rerun after it was interrupted partway.
+    """
+    def register(func):
+        _handlers[kind] = func
+        _max_attempts[kind] = attempts
+        return func
+    return register
+
+
+class JobQueue:
+    """SQLite-backed job queue with a per-process worker thread pool."""
+
+    def __init__(self, db_path=JOB_DB_FILE, workers=JOB_WORKERS,
+                 lease_seconds=JOB_LEASE_SECONDS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._initialized = False
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._last_prune = 0.0
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    # Client side
+
+    def enqueue(self, kind, **params):
+        """Queue a job and return its id. params must be JSON serializable."""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, ?, ?)",
+                         (job_id, kind, json.dumps(params), QUEUED, time.time()))
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def status(self, job_id):
+        """Return a job's status as a dict, or None if there is no such job."""
+        row = self.connection().execute(
+            "SELECT id, kind, status, progress, message, result_name, created, finished "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        status = dict(row)
+        status['has_result'] = status.pop('result_name') is not None
+        return status
+
+    def result(self, job_id):
+        """Return (data, filename, mimetype) for a finished job's file, or None."""
+        row = self.connection().execute(
+            "SELECT result, result_name, result_type FROM jobs WHERE id = ? AND status = ?",
+            (job_id, DONE)).fetchone()
+        if row is None or row['result_name'] is None:
+            return None
+        return bytes(row['result']), row['result_name'], row['result_type']
+
+    # Worker side
+
+    def start(self):
+        """Start this process's worker threads if they are not running."""
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'job-worker-{len(self._threads)}',
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                log.error('job_claim_failed', exc_info=True)
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(POLL_INTERVAL)
+                self._prune()
+                continue
+            self._execute(*job)
+
+    def _claim(self):
+        now = time.time()
+        with self.transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT id, kind, params, attempts FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) "
+                    "ORDER BY created LIMIT 1", (QUEUED, RUNNING, now)).fetchone()
+                if row is None:
+                    return None
+                max_attempts = _max_attempts.get(row['kind'], MAX_ATTEMPTS)
+                if row['attempts'] < max_attempts:
+                    break
+                # Crashed its worker too many times, or must not be rerun; stop
+                message = ("The job was interrupted too many times." if max_attempts > 1
+                           else "The job was interrupted and was not restarted.")
+                conn.execute("UPDATE jobs SET status = ?, message = ?, finished = ? WHERE id = ?",
+                             (FAILED, message, now, row['id']))
+            conn.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ? "
+                         "WHERE id = ?", (RUNNING, now + self.lease_seconds, row['id']))
+        return row['id'], row['kind'], json.loads(row['params'])
+
+    def _execute(self, job_id, kind, params):
+        def progress(fraction, message=''):
+            self.connection().execute(
+                "UPDATE jobs SET progress = ?, message = ?, lease_until = ? WHERE id = ? AND status = ?",
+                (fraction, message, time.time() + self.lease_seconds, job_id, RUNNING))
+
+        handler = _handlers.get(kind)
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise JobError(f"Unknown job kind: {kind}")
+            result = handler(progress, **params)
+        except JobError as e:
+            self._finish(job_id, FAILED, str(e))
+            log.info('job_failed', job=job_id, kind=kind, message=str(e))
+        except Exception as e:
+            self._finish(job_id, FAILED, f"Job failed: {e}")
+            log.error('job_crashed', exc_info=True, job=job_id, kind=kind)
+        else:
+            self._finish(job_id, DONE, result.message, result)
+            log.info('job_done', job=job_id, kind=kind,
+                     duration_ms=round((time.perf_counter() - start) * 1000, 2))
+
+    def _finish(self, job_id, status, message, result=None):
+        data = filename = mimetype = None
+        if result is not None and result.data is not None:
+            data, filename, mimetype = sqlite3.Binary(result.data), result.filename, result.mimetype
+        self.connection().execute(
+            "UPDATE jobs SET status = ?, progress = ?, message = ?, result = ?, result_name = ?, "
+            "result_type = ?, lease_until = NULL, finished = ? WHERE id = ?",
+            (status, 1.0 if status == DONE else 0.0, message, data, filename, mimetype,
+             time.time(), job_id))
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        try:
+            self.connection().execute("DELETE FROM jobs WHERE finished < ?",
+                                      (now - self.retention_seconds,))
+        except sqlite3.Error:
+            log.error('job_prune_failed', exc_info=True)
+
+
+job_queue = JobQueue()
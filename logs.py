@@ -0,0 +1,160 @@
+"""
+Structured, leveled logging.
+
+get_logger(name) returns a StructLogger. Each call logs one event name plus
+key=value fields, written as a single logfmt or JSON line to stderr:
+
+    log.info('report_generated', department=dep, duration_ms=41.3)
+    ts=2025-03-01T10:15:02 level=info logger=reports event=report_generated department=CSBS duration_ms=41.3
+
+Level checks are plain attributes (log.debug_enabled, log.info_enabled),
+refreshed by configure(). A disabled call returns after that one check, and
+hot paths can guard the call itself so even the field values are never
+built. sample=0.01 keeps about 1% of the events of a noisy kind.
+
+RequestTimingMiddleware wraps an ASGI app and logs one 'request' event per
+HTTP request with its method, path, status and duration.
+"""
+import json
+import logging
+import random
+import sys
+import time
+from config import LOG_LEVEL, LOG_FORMAT, LOG_REQUEST_SAMPLE
+
+ROOT_LOGGER = 'feedback'
+
+_loggers = []
+
+
+class StructLogger:
+    """Logger taking an event name and structured fields."""
+
+    def __init__(self, name):
+        self.name = name
+        self._logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self._refresh()
+
+    def _refresh(self):
+        level = self._logger.getEffectiveLevel()
+        self.debug_enabled = level <= logging.DEBUG
+        self.info_enabled = level <= logging.INFO
+        self.warning_enabled = level <= logging.WARNING
+
+    def _log(self, level, event, sample, fields, exc_info=False):
+        if sample < 1.0 and random.random() >= sample:
+            return
+        if sample < 1.0:
+            fields['sample'] = sample
+        self._logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, sample=1.0, **fields):
+        if self.debug_enabled:
+            self._log(logging.DEBUG, event, sample, fields)
+
+    def info(self, event, sample=1.0, **fields):
+        if self.info_enabled:
+            self._log(logging.INFO, event, sample, fields)
+
+    def warning(self, event, sample=1.0, **fields):
+        if self.warning_enabled:
+            self._log(logging.WARNING, event, sample, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        """Log an error; exc_info=True appends the current exception's traceback."""
+        self._log(logging.ERROR, event, 1.0, fields, exc_info=exc_info)
+
+
+def get_logger(name):
+    logger = StructLogger(name)
+    _loggers.append(logger)
+    return logger
+
+
+def _base_fields(formatter, record):
+    fields = {
+        'ts': formatter.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+        'level': record.levelname.lower(),
+        'logger': record.name[len(ROOT_LOGGER) + 1:],
+        'event': record.getMessage(),
+    }
+    fields.update(getattr(record, 'fields', {}))
+    return fields
+
+
+def _logfmt_value(value):
+    text = str(value)
+    if not text or any(c in text for c in ' ="\\'):
+        text = '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return text
+
+
+class LogfmtFormatter(logging.Formatter):
+    def format(self, record):
+        line = ' '.join(f"{key}={_logfmt_value(value)}"
+                        for key, value in _base_fields(self, record).items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        fields = _base_fields(self, record)
+        if record.exc_info:
+            fields['exc'] = self.formatException(record.exc_info)
+        return json.dumps(fields, default=str)
+
+
+def configure(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """(Re)configure output for every StructLogger."""
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else LogfmtFormatter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+    for logger in _loggers:
+        logger._refresh()
+
+
+configure()
+
+_request_log = get_logger('http')
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware logging a 'request' event with timing per HTTP request."""
+
+    def __init__(self, app, sample=LOG_REQUEST_SAMPLE):
+        self.app = app
+        self.sample = sample
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not _request_log.info_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        first_byte = None
+        status = 500
+
+        async def timed_send(message):
+            nonlocal first_byte, status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                first_byte = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            end = time.perf_counter()
+            _request_log.info('request', sample=self.sample,
+                              method=scope['method'],
+                              path=scope['path'],
+                              status=status,
+                              duration_ms=round((end - start) * 1000, 2),
+                              ttfb_ms=round(((first_byte or end) - start) * 1000, 2))
@@ -0,0 +1,235 @@
+"""
+Native ASGI server for the student hot paths.
+
+'/', '/validate_regno' and '/feedback' are served by async Starlette handlers.
+Storage reads may block (SQLite queries, or stats and tails of the CSV
+files), so each handler makes them in one call to a worker thread and
+never on the event loop. The feedback POST builds its rating rows in a
+second one, reusing the mapping version read with the mappings, and
+awaits the ratings sink instead of parking a thread on it. Every other
+route falls through to the Flask app via app.FlaskBridge.
+
+Pages are still rendered from the Flask templates, inside a Flask request
+context built from the ASGI request, so flash messages and the session
+cookie are shared with the Flask routes.
+
+Run with: uvicorn native_app:asgi_app (or SERVER_MODE = 'native' in config.py)
+"""
+import asyncio
+from collections import namedtuple
+from urllib.parse import parse_qsl
+from flask import flash, redirect as flask_redirect, render_template as flask_render_template, session, url_for
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MultiDict
+from app import app as flask_app, build_rating_rows, FlaskBridge
+from config import FEEDBACK_QUESTIONS
+from logs import RequestTimingMiddleware
+from utils import (
+    get_student_info,
+    get_batch_summary,
+    has_submitted_feedback,
+    load_admin_mapping,
+    get_mapping_version,
+    submit_feedback_async,
+)
+
+
+# What the login checks need to know about a registration number
+StudentStatus = namedtuple('StudentStatus', ['info', 'submitted', 'batch'])
+
+
+def student_status(registerno):
+    """Look up a registration number's student, submission and batch; blocks."""
+    info = get_student_info(registerno)
+    if not info:
+        return StudentStatus(None, False, None)
+    return StudentStatus(info, has_submitted_feedback(registerno),
+                         get_batch_summary(info.get("department"), info.get("semester")))
+
+
+def feedback_context(department, semester, registerno):
+    """Return (already submitted, mapping version, mappings) for the form; blocks."""
+    if has_submitted_feedback(registerno):
+        return True, None, None
+    # Read before the mappings so the form never carries a newer version
+    # than the rows it shows
+    mapping_version = get_mapping_version(department, semester)
+    return False, mapping_version, load_admin_mapping(department, semester)
+
+
+async def read_form(request):
+    """Parse an application/x-www-form-urlencoded body into a MultiDict."""
+    body = await request.body()
+    return MultiDict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+
+
+def flask_response(request, build, flashes=()):
+    """
+    Run build() inside a Flask request context for request, after flashing
+    flashes as (message, category) pairs, and convert what it returns
+    (anything a Flask view may return) into a Starlette Response.
+    """
+    with flask_app.test_request_context(
+            request.url.path,
+            base_url=f"{request.url.scheme}://{request.url.netloc}",
+            query_string=request.url.query,
+            headers={'Cookie': request.headers.get('cookie', '')}):
+        for message, category in flashes:
+            flash(message, category)
+        response = flask_app.make_response(build())
+        flask_app.session_interface.save_session(flask_app, session, response)
+    native = Response(response.get_data(), status_code=response.status_code)
+    native.raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                          for name, value in response.headers.items()]
+    return native
+
+
+def render(request, template, flashes=(), **context):
+    return flask_response(request, lambda: flask_render_template(template, **context), flashes)
+
+
+def redirect(request, endpoint, flashes=(), **values):
+    return flask_response(request, lambda: flask_redirect(url_for(endpoint, **values)), flashes)
+
+
+async def validate_regno(request):
+    form = await read_form(request)
+    registerno = form.get("registerno", "").strip()
+    if not registerno:
+        return JSONResponse({
+            "valid": False,
+            "message": "Please enter a registration number"
+        })
+
+    # Remove any whitespace and non-numeric characters
+    registerno = ''.join(filter(str.isdigit, registerno))
+    if not registerno:
+        return JSONResponse({
+            "valid": False,
+            "message": "Registration number must contain at least one digit"
+        })
+
+    if int(registerno) < 1:
+        return JSONResponse({
+            "valid": False,
+            "message": "Registration number must be a positive number"
+        })
+
+    status = await asyncio.to_thread(student_status, registerno)
+    if not status.info:
+        return JSONResponse({
+            "valid": False,
+            "message": "Registration number not found"
+        })
+
+    if status.submitted:
+        return JSONResponse({
+            "valid": False,
+            "message": "Feedback already submitted for this registration number"
+        })
+
+    # Check registration number range
+    batch = status.batch
+    if batch and batch.span > 120:
+        return JSONResponse({
+            "valid": False,
+            "message": "Registration number range exceeds 120 for your batch"
+        })
+
+    return JSONResponse({
+        "valid": True,
+        "message": "Registration number validated successfully!"
+    })
+
+
+async def student_login(request):
+    if request.method != "POST":
+        return render(request, "student_login.html")
+
+    form = await read_form(request)
+    registerno = form.get("registerno", "")
+    if not registerno:
+        return render(request, "student_login.html",
+                      [("Please enter your registration number.", "danger")])
+
+    # Clean registration number - remove whitespace and non-numeric characters
+    registerno = ''.join(filter(str.isdigit, registerno))
+    if not registerno:
+        return render(request, "student_login.html",
+                      [("Registration number must contain at least one digit.", "danger")])
+
+    if int(registerno) < 1:
+        return render(request, "student_login.html",
+                      [("Registration number must be a positive number.", "danger")])
+
+    status = await asyncio.to_thread(student_status, registerno)
+    if not status.info:
+        return render(request, "student_login.html",
+                      [("Registration number not found. Please try again.", "danger")])
+
+    # Registration number span of the same department and semester
+    department = status.info.get("department")
+    semester = status.info.get("semester")
+    batch = status.batch
+    if batch and batch.span > 120:
+        return render(request, "student_login.html",
+                      [("Registration number range exceeds 120 for your batch.", "danger")])
+
+    if status.submitted:
+        return render(request, "student_login.html",
+                      [("Feedback already submitted for this registration number.", "info")])
+
+    return redirect(request, "feedback", [("Registration number validated successfully!", "success")],
+                    department=department, semester=semester, registerno=registerno)
+
+
+async def feedback(request):
+    department = request.query_params.get("department")
+    semester = request.query_params.get("semester")
+    registerno = request.query_params.get("registerno")
+
+    if not department or not semester or not registerno:
+        return redirect(request, "student_login",
+                        [("Missing department, semester, or registration number.", "danger")])
+
+    already_submitted = [("Feedback already submitted. You have already registered.", "info")]
+    submitted, mapping_version, mappings = await asyncio.to_thread(
+        feedback_context, department, semester, registerno)
+    if submitted:
+        return redirect(request, "student_login", already_submitted)
+
+    if not mappings:
+        return Response(
+            f"<h2>No staff/subject mappings found for {department} - {semester}.</h2>",
+            media_type="text/html")
+
+    if request.method == "POST":
+        form = await read_form(request)
+        # Hashing the registration number is CPU work; keep it off the loop too
+        rating_rows, error = await asyncio.to_thread(
+            build_rating_rows, form, mappings, department, semester, registerno, mapping_version)
+        if error is not None:
+            return redirect(request, "feedback", [(error, "danger")],
+                            department=department, semester=semester, registerno=registerno)
+        if not await submit_feedback_async(registerno, rating_rows):
+            return redirect(request, "student_login", already_submitted)
+        return redirect(request, "student_login",
+                        [("Feedback submitted successfully. Thank you!", "success")])
+
+    return render(request, "feedback.html",
+                  department=department,
+                  semester=semester,
+                  mappings=mappings,
+                  mapping_version=mapping_version,
+                  questions=FEEDBACK_QUESTIONS)
+
+
+asgi_app = RequestTimingMiddleware(Starlette(routes=[
+    Route("/", student_login, methods=["GET", "POST"]),
+    Route("/validate_regno", validate_regno, methods=["POST"]),
+    Route("/feedback", feedback, methods=["GET", "POST"]),
+    # Everything else (admin, HOD, jobs, static files) is still Flask
+    Mount("/", app=FlaskBridge(flask_app)),
+]))
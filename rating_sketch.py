@@ -0,0 +1,168 @@
+"""
+Mergeable per-group rating sketches.
+
+A RatingSketch summarizes any number of rating rows in fixed-size state:
+the row count and the sum of row averages, plus, for each question, the
+number of valid scores, their sum, their sum of squares and a histogram
+over the score buckets 1..10. The aggregates update it row by row in the
+same pass that produces the means. Two sketches merge by adding their
+fields, so per-staff or per-class figures come from merging the group
+sketches and the ratings are never rescanned.
+
+The response count, mean, standard deviation and median of each question
+all follow from that state. The median is exact for whole-number scores,
+which is all the feedback form produces; any other score counts in its
+nearest bucket.
+"""
+import math
+from collections import namedtuple
+
+QUESTIONS = 10
+SCORE_BUCKETS = 10  # Scores 1..10
+
+# Statistics of one question, or of all questions pooled
+ScoreStats = namedtuple('ScoreStats', ['count', 'mean', 'std', 'median', 'histogram'])
+
+# Parsed (score, bucket) of score strings seen by add_scores, None when not
+# a usable number. The form only ever writes "1.00".."10.00", so this stays
+# tiny; PARSE_CACHE_SIZE bounds it against odd imported data.
+_parsed_scores = {}
+PARSE_CACHE_SIZE = 1024
+
+
+def score_bucket(score):
+    """Return the histogram bucket (0-based) a score falls in."""
+    return min(max(round(score), 1), SCORE_BUCKETS) - 1
+
+
+def histogram_median(histogram):
+    """Median of the bucket values 1..10 weighted by histogram, or None if empty."""
+    total = sum(histogram)
+    if not total:
+        return None
+    lower, upper = (total - 1) // 2, total // 2
+    values = []
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        while len(values) < 2 and seen > (lower, upper)[len(values)]:
+            values.append(bucket + 1)
+    return (values[0] + values[1]) / 2
+
+
+def _parse_score(value):
+    try:
+        score = float(value)
+        return score, score_bucket(score)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _stats(count, total, sumsq, histogram):
+    if not count:
+        return ScoreStats(0, None, None, None, list(histogram))
+    mean = total / count
+    # Population standard deviation, as ratings_analytics computes it
+    std = math.sqrt(max(sumsq / count - mean * mean, 0.0))
+    return ScoreStats(count, mean, std, histogram_median(histogram), list(histogram))
+
+
+class RatingSketch:
+    """Counts, sums, sums of squares and score histograms of a set of ratings."""
+
+    __slots__ = ('count', 'total_average', 'q_sums', 'q_counts', 'q_sumsq', 'histogram')
+
+    def __init__(self):
+        self.count = 0              # rows with a valid average
+        self.total_average = 0.0
+        self.q_sums = [0.0] * QUESTIONS
+        self.q_counts = [0] * QUESTIONS
+        self.q_sumsq = [0.0] * QUESTIONS
+        self.histogram = [[0] * SCORE_BUCKETS for _ in range(QUESTIONS)]
+
+    def add_score(self, question, score):
+        """Add one valid score (a float) for question 0..9."""
+        # Raises before touching any field if the score is NaN or infinite
+        bucket = score_bucket(score)
+        self.q_sums[question] += score
+        self.q_sumsq[question] += score * score
+        self.q_counts[question] += 1
+        self.histogram[question][bucket] += 1
+
+    def add_scores(self, values):
+        """
+        Add one row's question scores given as strings, q1 first. Values
+        that are None, empty or not a finite number are skipped.
+        """
+        q_sums, q_sumsq, q_counts, histogram = self.q_sums, self.q_sumsq, self.q_counts, self.histogram
+        for question, value in enumerate(values):
+            parsed = _parsed_scores.get(value, False)
+            if parsed is False:
+                parsed = _parse_score(value)
+                if len(_parsed_scores) < PARSE_CACHE_SIZE:
+                    _parsed_scores[value] = parsed
+            if parsed is None:
+                continue
+            score, bucket = parsed
+            q_sums[question] += score
+            q_sumsq[question] += score * score
+            q_counts[question] += 1
+            histogram[question][bucket] += 1
+
+    def add_average(self, average):
+        """Add the average of one row."""
+        self.total_average += average
+        self.count += 1
+
+    def merge(self, other):
+        """Add other's ratings to this sketch and return it."""
+        self.count += other.count
+        self.total_average += other.total_average
+        for q in range(QUESTIONS):
+            self.q_sums[q] += other.q_sums[q]
+            self.q_counts[q] += other.q_counts[q]
+            self.q_sumsq[q] += other.q_sumsq[q]
+            self.histogram[q] = [a + b for a, b in zip(self.histogram[q], other.histogram[q])]
+        return self
+
+    @classmethod
+    def merged(cls, sketches):
+        """Return a new sketch of all the ratings in sketches."""
+        result = cls()
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
+
+    def copy(self):
+        return RatingSketch().merge(self)
+
+    def to_state(self):
+        """Return the sketch as JSON-serializable lists."""
+        return [self.count, self.total_average, self.q_sums, self.q_counts,
+                self.q_sumsq, self.histogram]
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls()
+        (sketch.count, sketch.total_average, sketch.q_sums, sketch.q_counts,
+         sketch.q_sumsq, sketch.histogram) = state
+        return sketch
+
+    # Statistics
+
+    def q_avgs(self):
+        """Per-question means divided by count, as update_mainratings always did."""
+        return [q_sum / self.count for q_sum in self.q_sums]
+
+    def overall_average(self):
+        return self.total_average / self.count
+
+    def question_stats(self):
+        """Return a ScoreStats per question."""
+        return [_stats(self.q_counts[q], self.q_sums[q], self.q_sumsq[q], self.histogram[q])
+                for q in range(QUESTIONS)]
+
+    def pooled_stats(self):
+        """Return the ScoreStats of every score of every question together."""
+        histogram = [sum(column) for column in zip(*self.histogram)]
+        return _stats(sum(self.q_counts), sum(self.q_sums), sum(self.q_sumsq), histogram)
@@ -0,0 +1,221 @@
+"""
+Vectorized rating aggregation with NumPy and pandas.
+
+Ratings are loaded once into a columnar float32 score matrix plus integer
+codes for the four key columns. Group-by counts, means, standard deviations
+and per-question score distributions are then computed with np.bincount
+rather than a Python loop per row and question.
+"""
+import numpy as np
+import pandas as pd
+from config import RATING_FILE, MAINRATING_FILE
+from rating_sketch import RatingSketch
+from ratings_log import NO_AVERAGE
+from utils import write_mainratings
+
+KEY_COLUMNS = ['department', 'semester', 'staff', 'subject']
+QUESTION_COLUMNS = [f'q{i}' for i in range(1, 11)]
+SCORE_BUCKETS = 10  # Scores 1..10
+
+
+class RatingMatrix:
+    """Ratings as a (rows, 10) float32 score matrix and (rows, 4) key codes."""
+
+    def __init__(self, codes, categories, scores, averages):
+        self.codes = codes              # int32, indexes into categories
+        self.categories = categories    # one array of key values per key column
+        self.scores = scores            # float32, NaN where a cell was not a number
+        self.averages = averages        # float64, NaN where a cell was not a number
+
+    def __len__(self):
+        return len(self.averages)
+
+    @classmethod
+    def from_frame(cls, frame):
+        codes = []
+        categories = []
+        for column in KEY_COLUMNS:
+            values = pd.Categorical(frame[column])
+            # Strip once per distinct value, then merge values that became
+            # equal. Missing cells have code -1, which picks the trailing ''.
+            labels = np.append(values.categories.astype(str).str.strip().to_numpy(dtype=object), '')
+            label_codes, uniques = pd.factorize(labels)
+            codes.append(label_codes[values.codes].astype(np.int32))
+            categories.append(np.asarray(uniques, dtype=object))
+
+        def numeric(column, dtype):
+            return pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=dtype)
+
+        # Question scores are whole numbers 1..10, exact in float32. The row
+        # averages carry decimal fractions, so they stay float64 to round
+        # exactly like the per-row float() loop did.
+        scores = np.empty((len(frame), len(QUESTION_COLUMNS)), dtype=np.float32)
+        for j, column in enumerate(QUESTION_COLUMNS):
+            scores[:, j] = numeric(column, np.float32)
+        return cls(np.column_stack(codes) if len(frame) else np.empty((0, 4), dtype=np.int32),
+                   categories, scores, numeric('average', np.float64))
+
+
+class GroupStatistics:
+    """Per (department, semester, staff, subject) statistics, one row per group."""
+
+    def __init__(self, keys, count, q_sums, q_counts, q_sumsq, distribution, total_average):
+        self.keys = keys                    # list of 4-tuples, first-seen order
+        self.count = count                  # (groups,) rows with a valid average
+        self.q_sums = q_sums                # (groups, 10)
+        self.q_counts = q_counts            # (groups, 10) valid scores per question
+        self.q_sumsq = q_sumsq              # (groups, 10)
+        self.distribution = distribution    # (groups, 10 questions, 10 buckets)
+        self.total_average = total_average  # (groups,) sum of row averages
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def q_means(self):
+        """Per-question means, divided by count as update_mainratings always did."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.q_sums / self.count[:, None]
+
+    @property
+    def q_std(self):
+        """Per-question population standard deviation over the valid scores."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = self.q_sums / self.q_counts
+            variance = self.q_sumsq / self.q_counts - mean * mean
+        return np.sqrt(np.maximum(variance, 0.0))
+
+    @property
+    def overall_average(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.total_average / self.count
+
+    def sketch(self, g):
+        """Return group g as a RatingSketch, mergeable with the storage ones."""
+        sketch = RatingSketch()
+        sketch.count = int(self.count[g])
+        sketch.total_average = float(self.total_average[g])
+        sketch.q_sums = self.q_sums[g].tolist()
+        sketch.q_counts = [int(count) for count in self.q_counts[g]]
+        sketch.q_sumsq = self.q_sumsq[g].tolist()
+        sketch.histogram = self.distribution[g].tolist()
+        return sketch
+
+    def rows(self):
+        """Yield groups in the StorageBackend.aggregate_ratings format."""
+        q_means = self.q_means
+        overall = self.overall_average
+        for g, (dep, sem, staff, subject) in enumerate(self.keys):
+            count = int(self.count[g])
+            if count > 0:
+                yield {
+                    'department': dep,
+                    'semester': sem,
+                    'staff': staff,
+                    'subject': subject,
+                    'count': count,
+                    'q_avgs': q_means[g].tolist(),
+                    'overall_average': float(overall[g]),
+                }
+
+
+def load_ratings(path=RATING_FILE):
+    """
+    Load a ratings CSV file (a path or binary file object) into a
+    RatingMatrix; a missing or empty file gives an empty one.
+    """
+    columns = KEY_COLUMNS + QUESTION_COLUMNS + ['average']
+    try:
+        frame = pd.read_csv(path, usecols=columns,
+                            dtype={column: 'category' for column in KEY_COLUMNS},
+                            keep_default_na=False, na_values=[''])
+    except (FileNotFoundError, pd.errors.EmptyDataError):
+        frame = pd.DataFrame(columns=columns)
+    return RatingMatrix.from_frame(frame)
+
+
+def load_ratings_from_db(conn):
+    """Load the ratings table of an SQLite storage connection into a RatingMatrix."""
+    frame = pd.read_sql_query(
+        f"SELECT {', '.join(KEY_COLUMNS + QUESTION_COLUMNS)}, average FROM ratings ORDER BY rowid",
+        conn)
+    return RatingMatrix.from_frame(frame)
+
+
+def load_ratings_from_log(log):
+    """
+    Load a ratings_log.RatingsLog into a RatingMatrix straight from the
+    memory-mapped records, with no text to parse. The log is an offline
+    snapshot (see ratings_log.py), so this holds the ratings as of its build.
+    """
+    records = log.scan()
+    keys = log.keys()
+    codes = np.empty((len(records), len(KEY_COLUMNS)), dtype=np.int32)
+    categories = []
+    key_ids = records['keys']
+    for j in range(len(KEY_COLUMNS)):
+        ids, inverse = np.unique(key_ids[:, j], return_inverse=True)
+        # Strip and merge like from_frame does
+        labels = np.array([keys[i].strip() for i in ids] + [''], dtype=object)
+        label_codes, uniques = pd.factorize(labels)
+        codes[:, j] = label_codes[inverse.reshape(-1)]
+        categories.append(np.asarray(uniques, dtype=object))
+    averages = records['average'].astype(np.float64) / 100
+    averages[records['average'] == NO_AVERAGE] = np.nan
+    return RatingMatrix(codes, categories, records['scores'].astype(np.float32), averages)
+
+
+def group_statistics(matrix):
+    """Compute GroupStatistics for every key combination in a RatingMatrix."""
+    if not len(matrix):
+        empty = np.zeros((0, len(QUESTION_COLUMNS)))
+        return GroupStatistics([], np.zeros(0, dtype=np.int64), empty, empty, empty,
+                               np.zeros((0, len(QUESTION_COLUMNS), SCORE_BUCKETS), dtype=np.int64),
+                               np.zeros(0))
+
+    # Fold the four key codes into one int64 per row (mixed radix)
+    combined = np.zeros(len(matrix), dtype=np.int64)
+    for j, values in enumerate(matrix.categories):
+        combined = combined * len(values) + matrix.codes[:, j]
+    # factorize numbers groups in order of first appearance, like the
+    # dict-based loop did
+    inverse, uniques = pd.factorize(combined)
+    groups = len(uniques)
+    first_index = np.empty(groups, dtype=np.int64)
+    first_index[inverse[::-1]] = np.arange(len(inverse) - 1, -1, -1)
+
+    keys = [tuple(values[code] for values, code in zip(matrix.categories, matrix.codes[i]))
+            for i in first_index]
+
+    scores = matrix.scores
+    valid = ~np.isnan(scores)
+    filled = np.where(valid, scores, 0.0).astype(np.float64)
+
+    def per_group(weights):
+        return np.bincount(inverse, weights=weights, minlength=groups)
+
+    questions = range(len(QUESTION_COLUMNS))
+    q_sums = np.column_stack([per_group(filled[:, j]) for j in questions])
+    q_counts = np.column_stack([per_group(valid[:, j]) for j in questions])
+    q_sumsq = np.column_stack([per_group(filled[:, j] * filled[:, j]) for j in questions])
+
+    averages = matrix.averages
+    average_valid = ~np.isnan(averages)
+    count = per_group(average_valid).astype(np.int64)
+    total_average = per_group(np.where(average_valid, averages, 0.0))
+
+    # One flat bin per (group, question, score bucket)
+    buckets = np.clip(np.rint(filled), 1, SCORE_BUCKETS).astype(np.int64) - 1
+    flat = (inverse[:, None] * len(QUESTION_COLUMNS) + np.arange(len(QUESTION_COLUMNS))) * SCORE_BUCKETS + buckets
+    distribution = np.bincount(flat[valid], minlength=groups * len(QUESTION_COLUMNS) * SCORE_BUCKETS)
+    distribution = distribution.reshape(groups, len(QUESTION_COLUMNS), SCORE_BUCKETS)
+
+    return GroupStatistics(keys, count, q_sums, q_counts, q_sumsq, distribution, total_average)
+
+
+def update_mainratings(path=RATING_FILE, output=MAINRATING_FILE):
+    """
+    Vectorized drop-in for utils.update_mainratings: aggregate the ratings in
+    path and write per-question and overall averages to output.
+    """
+    write_mainratings(group_statistics(load_ratings(path)).rows(), output)
@@ -0,0 +1,254 @@
+"""
+Compact binary ratings log.
+
+ratings.csv spends about 200 bytes per staff rating, most of it repeated
+department/semester/staff/subject text and "%.2f" scores, and every reader
+reparses it. The log stores the same rows as fixed-width 64-byte records:
+
+    regno      32 bytes   the stored registration number hash
+    keys       4 x uint16 department, semester, staff, subject as ids into
+                          the key dictionary
+    scores     10 x float16  q1..q10 (NaN when missing); exact to two
+                          decimals for scores below 16
+    average    uint16     average in hundredths (0xFFFF when missing)
+    padding    2 bytes
+
+after a 16-byte file header. Key strings are interned in '<log>.keys', one
+JSON string per line, the line number being the id. Both files are only
+appended to, keys before the records that use them, so a reader can map
+the log with numpy.memmap and scan it as a structured array.
+
+The app does not write the log: submissions go to ratings.csv only, through
+ratings_sink. A log is an offline snapshot for exports and analysis, built
+from ratings.csv (or an archived term's copy of it) and stale as soon as a
+new rating arrives. Nothing in the app reads it either; live aggregation
+scans ratings.csv (see aggregates.py and csv_scan.py).
+
+Build a log from ratings.csv and export it back with:
+    python -m ratings_log build [--csv ratings.csv] [--log ratings.log]
+    python -m ratings_log export [--log ratings.log] [--csv out.csv]
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+import numpy as np
+from config import RATING_FILE, RATINGS_LOG_FILE, REQUIRED_FILES
+from locking import file_lock
+from regno import encrypt_regno, is_encrypted
+
+MAGIC = b'FBRATLOG'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHH4x')
+
+KEY_COLUMNS = ['department', 'semester', 'staff', 'subject']
+QUESTION_COLUMNS = [f'q{i}' for i in range(1, 11)]
+
+RECORD_DTYPE = np.dtype([
+    ('regno', 'S32'),
+    ('keys', '<u2', (len(KEY_COLUMNS),)),
+    ('scores', '<f2', (len(QUESTION_COLUMNS),)),
+    ('average', '<u2'),
+    ('padding', 'V2'),
+])
+NO_AVERAGE = 0xFFFF
+
+# Rows encoded per write when building from a CSV file
+BUILD_BATCH = 10000
+
+
+class RatingsLogError(ValueError):
+    """The file is not a ratings log this code can read."""
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _average(value):
+    try:
+        hundredths = round(float(value) * 100)
+    except (TypeError, ValueError):
+        return NO_AVERAGE
+    return hundredths if 0 <= hundredths < NO_AVERAGE else NO_AVERAGE
+
+
+class RatingsLog:
+    """Appends to and scans one ratings log and its key dictionary."""
+
+    def __init__(self, path=RATINGS_LOG_FILE):
+        self.path = path
+        self.keys_path = f"{path}.keys"
+        self._keys = []
+        self._key_ids = {}
+        self._keys_offset = 0
+
+    # Key dictionary
+
+    def _load_keys(self):
+        """Read key strings appended since the last call."""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            key = json.loads(line)
+            self._key_ids[key] = len(self._keys)
+            self._keys.append(key)
+        self._keys_offset += end
+
+    def keys(self):
+        """Return the key strings, indexed by id."""
+        self._load_keys()
+        return list(self._keys)
+
+    def _intern(self, values, new_keys):
+        ids = []
+        for value in values:
+            key_id = self._key_ids.get(value)
+            if key_id is None:
+                key_id = len(self._keys)
+                if key_id > 0xFFFF:
+                    raise RatingsLogError("Too many distinct keys for a ratings log")
+                self._key_ids[value] = key_id
+                self._keys.append(value)
+                new_keys.append(value)
+            ids.append(key_id)
+        return ids
+
+    # Writing
+
+    def _encode(self, rating_rows, new_keys):
+        regnos = []
+        for row in rating_rows:
+            regno = row.get('registerno') or ''
+            regnos.append((regno if is_encrypted(regno) else encrypt_regno(regno)).encode('ascii'))
+        records = np.zeros(len(rating_rows), dtype=RECORD_DTYPE)
+        records['regno'] = regnos
+        records['keys'] = [self._intern([row.get(column) or '' for column in KEY_COLUMNS], new_keys)
+                           for row in rating_rows]
+        records['scores'] = [[_score(row.get(column)) for column in QUESTION_COLUMNS]
+                             for row in rating_rows]
+        records['average'] = [_average(row.get('average')) for row in rating_rows]
+        return records
+
+    def append(self, rating_rows):
+        """Append rating rows, dicts in the RATING_FILE layout."""
+        if not rating_rows:
+            return
+        with file_lock(self.path):
+            # Another process may have interned keys since our last look
+            self._load_keys()
+            new_keys = []
+            records = self._encode(rating_rows, new_keys)
+            if new_keys:
+                data = ''.join(json.dumps(key) + '\n' for key in new_keys).encode('utf-8')
+                with open(self.keys_path, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._keys_offset += len(data)
+            with open(self.path, 'ab') as f:
+                size = f.tell()
+                if size == 0:
+                    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize))
+                elif (size - HEADER.size) % RECORD_DTYPE.itemsize:
+                    # Drop a record torn by a crash so the new ones stay aligned
+                    f.truncate(size - (size - HEADER.size) % RECORD_DTYPE.itemsize)
+                f.write(records.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    # Reading
+
+    def scan(self):
+        """
+        Return the records as a read-only structured array mapped from the
+        file (RECORD_DTYPE); an empty array if the log does not exist.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        if size < HEADER.size:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        with open(self.path, 'rb') as f:
+            magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise RatingsLogError(f"{self.path} is not a version {FORMAT_VERSION} ratings log")
+        # A record still being written is left out
+        count = (size - HEADER.size) // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(count,))
+
+    def iter_rows(self):
+        """Yield the records as dicts in the RATING_FILE layout."""
+        records = self.scan()
+        keys = self.keys()
+        for start in range(0, len(records), BUILD_BATCH):
+            chunk = records[start:start + BUILD_BATCH]
+            scores = chunk['scores'].astype(np.float64)
+            for record, row_scores in zip(chunk, scores):
+                row = {'registerno': record['regno'].decode('ascii')}
+                row.update(zip(KEY_COLUMNS, (keys[key_id] for key_id in record['keys'])))
+                row.update((column, '' if math.isnan(score) else f"{score:.2f}")
+                           for column, score in zip(QUESTION_COLUMNS, row_scores))
+                average = int(record['average'])
+                row['average'] = '' if average == NO_AVERAGE else f"{average / 100:.2f}"
+                yield row
+
+    def export_csv(self, csv_path):
+        """Write the log back out in the RATING_FILE CSV layout; return the row count."""
+        count = 0
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE])
+            writer.writeheader()
+            for row in self.iter_rows():
+                writer.writerow(row)
+                count += 1
+        return count
+
+
+def build_from_csv(csv_path=RATING_FILE, log_path=RATINGS_LOG_FILE):
+    """Replace log_path with a log of every row in csv_path; return the row count."""
+    for path in (log_path, f"{log_path}.keys"):
+        if os.path.exists(path):
+            os.remove(path)
+    log = RatingsLog(log_path)
+    count = 0
+    batch = []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) == BUILD_BATCH:
+                log.append(batch)
+                count += len(batch)
+                batch = []
+    log.append(batch)
+    return count + len(batch)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or export a binary ratings log.")
+    parser.add_argument('command', choices=['build', 'export'])
+    parser.add_argument('--csv', default=None, help=f"ratings CSV (default: {RATING_FILE} to build, ratings_export.csv to export)")
+    parser.add_argument('--log', default=RATINGS_LOG_FILE, help=f"ratings log (default: {RATINGS_LOG_FILE})")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        csv_path = args.csv or RATING_FILE
+        count = build_from_csv(csv_path, args.log)
+        print(f"Wrote {count} records from {csv_path} to {args.log}", file=sys.stderr)
+    else:
+        csv_path = args.csv or 'ratings_export.csv'
+        count = RatingsLog(args.log).export_csv(csv_path)
+        print(f"Exported {count} records from {args.log} to {csv_path}", file=sys.stderr)
@@ -0,0 +1,148 @@
+"""
+Single-writer sink for RATING_FILE.
+
+Request threads hand their rows to a queue and wait. One writer thread per
+process drains the queue, takes the inter-process file lock, re-checks every
+submission against the submission index and appends all accepted rows with a
+single write and fsync (group commit). Because the check and the append happen
+under the same lock, a registration number can only ever be written once, even
+across uvicorn workers.
+"""
+import asyncio
+import csv
+import io
+import os
+import queue
+import threading
+from locking import file_lock
+
+# Upper bound on submissions committed together
+MAX_BATCH = 256
+
+
+class _Submission:
+    def __init__(self, registerno, rows, check, on_done=None):
+        self.registerno = registerno
+        self.rows = rows
+        self.check = check
+        self.accepted = False
+        self.error = None
+        self.done = threading.Event()
+        # Called from the writer thread once the submission is settled
+        self.on_done = on_done
+
+
+def _settle(future, submission):
+    if future.cancelled():
+        return
+    if submission.error is not None:
+        future.set_exception(submission.error)
+    else:
+        future.set_result(submission.accepted)
+
+
+class RatingsSink:
+    """Group-committing, duplicate-checking writer for the ratings CSV."""
+
+    def __init__(self, path, fieldnames, submissions, followers=()):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.submissions = submissions
+        # Other TailingCsvIndex instances over the same file, fed each
+        # committed batch so they never have to re-read it
+        self.followers = tuple(followers)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, registerno, rows):
+        """
+        Append rows unless registerno has already submitted.
+        Return True if the rows were written, False if it was a duplicate.
+        """
+        return self._enqueue(_Submission(registerno, rows, check=True))
+
+    def append(self, rows):
+        """Append rows without a duplicate check."""
+        self._enqueue(_Submission(None, rows, check=False))
+
+    async def submit_async(self, registerno, rows):
+        """
+        Awaitable submit(): the event loop keeps running while the writer
+        thread commits the batch, instead of a thread blocking on it.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_done(submission):
+            loop.call_soon_threadsafe(_settle, future, submission)
+
+        self._ensure_writer()
+        self._queue.put(_Submission(registerno, rows, check=True, on_done=on_done))
+        return await future
+
+    def _enqueue(self, submission):
+        self._ensure_writer()
+        self._queue.put(submission)
+        submission.done.wait()
+        if submission.error is not None:
+            raise submission.error
+        return submission.accepted
+
+    def _ensure_writer(self):
+        with self._start_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, name='ratings-sink', daemon=True)
+                self._writer.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:
+                # The in-memory set may now hold rows that never reached disk
+                self.submissions.invalidate()
+                for submission in batch:
+                    submission.accepted = False
+                    submission.error = e
+            for submission in batch:
+                submission.done.set()
+                if submission.on_done is not None:
+                    try:
+                        submission.on_done(submission)
+                    except RuntimeError:
+                        # The waiting event loop has already closed
+                        pass
+
+    def _commit(self, batch):
+        with file_lock(self.path):
+            # Pick up rows other processes appended since our last look
+            self.submissions.refresh()
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=self.fieldnames)
+            start = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if start == 0:
+                writer.writeheader()
+            for submission in batch:
+                if submission.check and self.submissions.contains(submission.registerno):
+                    continue
+                writer.writerows(submission.rows)
+                for row in submission.rows:
+                    # Makes later submissions in this batch see this one
+                    self.submissions.add(row['registerno'])
+                submission.accepted = True
+
+            data = buffer.getvalue().encode('utf-8')
+            if data:
+                with open(self.path, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                for index in (self.submissions,) + self.followers:
+                    index.feed(start, data)
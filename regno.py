@@ -0,0 +1,84 @@
+"""
+Registration number hashing.
+
+Stored registration numbers are one-way hashes of the normalized number.
+All hashing goes through regno_hasher, which memoizes recent results in a
+bounded LRU. Nothing maps a hash back to its number: the plain numbers
+are never kept next to their hashes.
+"""
+import base64
+import hashlib
+import hmac
+from functools import lru_cache
+from config import REGNO_HMAC_KEY, REGNO_HASH_CACHE_SIZE
+
+# Secret key for encryption (in a real application, this should be stored securely)
+SECRET_KEY = "VSB_FEEDBACK_SYSTEM_SECRET_KEY"
+
+def normalize_regno(regno):
+    """Normalize a registration number by removing leading zeros."""
+    try:
+        return str(int(regno))
+    except (ValueError, TypeError):
+        return regno
+
+class RegnoHasher:
+    """
+    Hashes registration numbers, memoizing the last cache_size results.
+
+    Without an hmac_key the hash is the legacy salted SHA-256 (so existing
+    stored hashes keep matching); with one it is HMAC-SHA256 under that key.
+    Either way the digest is base64-encoded and cut to 32 characters.
+    """
+
+    def __init__(self, hmac_key=REGNO_HMAC_KEY, cache_size=REGNO_HASH_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.configure(hmac_key)
+
+    def configure(self, hmac_key):
+        """Switch the HMAC key (None for salted SHA-256) and drop the memo."""
+        if isinstance(hmac_key, str):
+            hmac_key = hmac_key.encode('utf-8')
+        self.hmac_key = hmac_key or None
+        self.hash = lru_cache(maxsize=self.cache_size)(self._digest)
+
+    def _digest(self, regno):
+        normalized = normalize_regno(regno).encode()
+        if self.hmac_key is None:
+            digest = hashlib.sha256(normalized + SECRET_KEY.encode()).digest()
+        else:
+            digest = hmac.new(self.hmac_key, normalized, hashlib.sha256).digest()
+        return base64.b64encode(digest).decode('utf-8')[:32]
+
+
+def encrypt_regno(regno):
+    """
+    Encrypt a registration number using a one-way hash function.
+    This ensures the registration number cannot be recovered from the stored value,
+    but the same registration number will always produce the same hash.
+    """
+    if not regno:
+        return ""
+    return regno_hasher.hash(regno)
+
+def is_encrypted(value):
+    """
+    Check if a value is already encrypted.
+    Encrypted values are base64 strings of a specific length.
+    """
+    if not value:
+        return False
+    
+    # Check if the value looks like a base64 string of the right length
+    try:
+        if len(value) == 32:
+            valid_chars = all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=" for c in value)
+            if valid_chars:
+                return True
+    except TypeError:
+        pass
+    
+    return False
+
+
+regno_hasher = RegnoHasher()
@@ -0,0 +1,99 @@
+"""
+Content-addressed cache for generated PDF reports.
+
+A report is stored under '<slice>-<content>.pdf', where <slice> hashes the
+department/semester and <content> hashes everything the PDF is built from
+(the aggregated feedback data, report arguments and template version). New
+ratings change the aggregates and so the content hash; storing the new
+report removes the stale one of the same slice. Files are evicted least
+recently used first once the directory exceeds its byte budget.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from config import REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES, CHART_ENGINE
+from report_generator import REPORT_TEMPLATE_VERSION
+
+
+def _digest(value):
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """LRU, disk-budgeted store of report PDFs keyed by content hash."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def slice_id(department, semester):
+        return _digest([department, semester])[:16]
+
+    @staticmethod
+    def content_id(report_args):
+        """Hash the generate_feedback_report arguments, template version and chart engine."""
+        return _digest([REPORT_TEMPLATE_VERSION, CHART_ENGINE, report_args])
+
+    def _path(self, slice_id, content_id):
+        return os.path.join(self.directory, f"{slice_id}-{content_id}.pdf")
+
+    def get(self, slice_id, content_id):
+        """Return the cached PDF bytes, or None on a miss."""
+        path = self._path(slice_id, content_id)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mtime doubles as the LRU timestamp
+        except OSError:
+            return None
+        return data
+
+    def put(self, slice_id, content_id, data):
+        """Store a PDF, replacing older reports of the same slice."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(slice_id, content_id))
+
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.pdf'):
+                    continue
+                if entry.name.startswith(slice_id + '-') and entry.name != f"{slice_id}-{content_id}.pdf":
+                    self._remove(entry.path)
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+report_cache = ReportCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES)
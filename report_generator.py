@@ -1,12 +1,33 @@
 import os
 import io
 import sys
-import matplotlib.pyplot as plt
+import time
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, FrameBreak, Frame, KeepInFrame
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, FrameBreak, Frame, KeepInFrame, PageBreak
+from charts import score_chart, distribution_chart, figure_renderer
+from logs import get_logger
+
+log = get_logger('reports')
+
+# Bump whenever the report layout changes so cached PDFs are not reused
+REPORT_TEMPLATE_VERSION = 3
+
+STATISTICS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ('LEFTPADDING', (0, 0), (-1, -1), 2),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 2),
+])
 
 class CustomDocTemplate(SimpleDocTemplate):
     """
@@ -32,47 +53,7 @@ def create_score_graph(feedback_data):
     """
     Create a bar graph image for the feedback data.
     """
-    # Prepare data
-    references = []
-    totals = []
-    for data in feedback_data.values():
-        ref = data.get('reference', data.get('staff_name', ''))
-        references.append(ref)
-        # Calculate total score out of 100
-        totals.append((sum(data['scores']) / 10) * 10)
-    
-    # Create the plot with optimal dimensions
-    plt.rcParams['figure.dpi'] = 300
-    fig, ax = plt.subplots(figsize=(10, 4))
-    bars = ax.bar(references, totals, color='#007bff')
-    
-    # Remove axis labels, keep only the grid and ticks
-    ax.set_xlabel('')
-    ax.set_ylabel('')
-    ax.set_title('')
-    ax.set_ylim(0, 100)
-    
-    plt.xticks(fontsize=9)
-    plt.yticks(fontsize=9)
-    
-    # Add value labels on top of each bar
-    for bar, total in zip(bars, totals):
-        height = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width()/2.0, height,
-               f'{total:.1f}',
-               ha='center', va='bottom',
-               fontsize=9)
-    
-    # Add grid for better readability
-    ax.grid(True, axis='y', linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    
-    # Save to buffer
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png', bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    buf.seek(0)
-    return buf
+    return figure_renderer.render(feedback_data)
 
 class FooterCanvas:
     def __init__(self, canvas, doc):
@@ -89,16 +70,91 @@ class FooterCanvas:
         self.canvas.drawCentredString(self.doc.pagesize[0]/2, 20, watermark)
         self.canvas.restoreState()
 
-def generate_feedback_report(academic_year, branch, semester, year, feedback_data):
-    """Generate a single-page PDF report with prominent graph."""
-    filename = f"feedback_report_{branch}_Semester {semester}.pdf"
-    filepath = os.path.abspath(filename)
-    print(f"\nGenerating feedback report...")
-    print(f"Output file will be saved as: {filepath}")
+def _stat(value, digits=2):
+    return '-' if value is None else f"{value:.{digits}f}"
+
+def statistics_section(statistics, width, heading_style, note_style):
+    """
+    Return the flowables of the statistics page: a table per staff, a table
+    per question and the score distribution chart. statistics is built by
+    batch_reports.report_statistics.
+    """
+    elements = [Paragraph("RESPONSE STATISTICS", heading_style), Spacer(1, 4)]
+
+    staff_data = [['Ref', 'Staff Name', 'Subject', 'Responses', 'Mean', 'SD', 'Median']]
+    for entry in statistics['staff']:
+        staff_data.append([entry['reference'], entry['staff_name'], entry['subject'],
+                           str(entry['responses']), _stat(entry['mean']), _stat(entry['std']),
+                           _stat(entry['median'], 1)])
+    staff_table = Table(staff_data)
+    staff_table.setStyle(STATISTICS_TABLE_STYLE)
+    staff_table.setStyle(TableStyle([('ALIGN', (1, 1), (2, -1), 'LEFT')]))
+    elements += [staff_table, Spacer(1, 8)]
+
+    questions = statistics['questions']
+    question_data = [[''] + [f'Q{i}' for i in range(1, len(questions) + 1)]]
+    question_data.append(['Responses'] + [str(q['count']) for q in questions])
+    question_data.append(['Mean'] + [_stat(q['mean']) for q in questions])
+    question_data.append(['SD'] + [_stat(q['std']) for q in questions])
+    question_data.append(['Median'] + [_stat(q['median'], 1) for q in questions])
+    question_table = Table(question_data)
+    question_table.setStyle(STATISTICS_TABLE_STYLE)
+    elements += [question_table, Spacer(1, 8)]
+
+    elements.append(Paragraph("Distribution of scores (% of all ratings)", note_style))
+    elements.append(distribution_chart(statistics['distribution'], width, 2.2 * inch))
+    elements.append(Paragraph("SD is the population standard deviation of the individual scores.", note_style))
+    return elements
+
+def trend_section(trend, heading_style, note_style):
+    """
+    Return the flowables of the trend table: each staff/subject's total in
+    the archived terms and now. trend is built by batch_reports.report_trend.
+    """
+    trend_data = [['Ref', 'Staff Name', 'Subject'] + trend['terms'] + ['Current']]
+    for entry in trend['staff']:
+        trend_data.append([entry['reference'], entry['staff_name'], entry['subject']]
+                          + [_stat(total, 1) for total in entry['totals']]
+                          + [_stat(entry['current'], 1)])
+    trend_table = Table(trend_data)
+    trend_table.setStyle(STATISTICS_TABLE_STYLE)
+    trend_table.setStyle(TableStyle([('ALIGN', (1, 1), (2, -1), 'LEFT')]))
+    return [Paragraph("TREND ACROSS TERMS", heading_style), Spacer(1, 4), trend_table,
+            Paragraph("Totals out of 100 for the same staff and subject in earlier archived terms.", note_style)]
+
+def report_filename(branch, semester):
+    """Return the file name a report for branch/semester is saved under."""
+    return f"feedback_report_{branch}_Semester {semester}.pdf"
+
+def build_feedback_report(academic_year, branch, semester, year, feedback_data, statistics=None,
+                          trend=None):
+    """Build the PDF report entirely in memory and return its bytes."""
+    buffer = io.BytesIO()
+    generate_feedback_report(academic_year, branch, semester, year, feedback_data,
+                             output=buffer, statistics=statistics, trend=trend)
+    return buffer.getvalue()
+
+def generate_feedback_report(academic_year, branch, semester, year, feedback_data, output=None,
+                             statistics=None, trend=None):
+    """
+    Generate a single-page PDF report with prominent graph.
+    
+    The report is written to output, a path or binary file object. By default
+    it is saved as report_filename(branch, semester) in the working directory
+    and the absolute path is returned; otherwise output is returned.
+
+    If statistics is given (see batch_reports.report_statistics) a second
+    page with response counts, standard deviations, medians and the score
+    distribution is added; trend (see batch_reports.report_trend) adds the
+    totals of earlier archived terms to that page.
+    """
+    if output is None:
+        output = os.path.abspath(report_filename(branch, semester))
+    start = time.perf_counter()
     
     # Create a CustomDocTemplate
     doc = CustomDocTemplate(
-        filename,
+        output,
         pagesize=A4,
         rightMargin=20,
         leftMargin=20,
@@ -202,11 +258,7 @@ def generate_feedback_report(academic_year, branch, semester, year, feedback_dat
     elements.append(Spacer(1, 5))
 
     # Add graph
-    graph_buffer = create_score_graph(feedback_data)
-    img = Image(graph_buffer)
-    img.drawWidth = A4[0] - 50
-    img.drawHeight = 2.5 * inch
-    elements.append(img)
+    elements.append(score_chart(feedback_data, A4[0] - 50, 2.5 * inch))
     elements.append(Spacer(1, 5))
 
     # Add references
@@ -255,6 +307,14 @@ def generate_feedback_report(academic_year, branch, semester, year, feedback_dat
         ])
     )
     elements.append(signature_table)
+
+    if statistics or trend:
+        elements.append(PageBreak())
+    if statistics:
+        elements += statistics_section(statistics, A4[0] - 50, subtitle_style, question_style)
+    if trend:
+        elements.append(Spacer(1, 8))
+        elements += trend_section(trend, subtitle_style, question_style)
     
     try:
         # Add the footer to each page
@@ -263,11 +323,12 @@ def generate_feedback_report(academic_year, branch, semester, year, feedback_dat
             
         # Build the document with the footer function
         doc.build(elements, onFirstPage=footer_func, onLaterPages=footer_func)
-        print("Report generation complete!")
-        print(f"Report saved at: {filepath}")
-        return filepath
+        log.info('report_generated', branch=branch, semester=semester, staff=len(feedback_data),
+                 output=output if isinstance(output, str) else 'memory',
+                 duration_ms=round((time.perf_counter() - start) * 1000, 2))
+        return output
     except Exception as e:
-        print("Error during PDF generation:", str(e))
+        log.error('report_failed', exc_info=True, branch=branch, semester=semester, error=str(e))
         raise
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+"""
+Bulk student import from an uploaded roster file.
+
+A roster is a CSV or XLSX sheet with a 'registerno' column and optional
+'department' and 'semester' columns; rows without them fall back to the
+department/semester chosen on the form. Rows are parsed as a stream (the
+XLSX reader walks the sheet XML with iterparse instead of loading a
+workbook), validated, deduplicated against the student registry and
+written in a single storage call. Every row gets an entry in the report.
+"""
+import csv
+import io
+import posixpath
+import zipfile
+from xml.etree.ElementTree import ParseError, iterparse
+from utils import get_departments, get_semesters, import_students, normalize_semester
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+DOC_RELS_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+# Accepted spellings of each column, compared lowercased without spaces/underscores
+COLUMN_ALIASES = {
+    'registerno': {'registerno', 'regno', 'registernumber', 'registrationnumber', 'registrationno'},
+    'department': {'department', 'dept', 'branch'},
+    'semester': {'semester', 'sem'},
+}
+
+ADDED = 'added'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+class RosterError(ValueError):
+    """The uploaded file cannot be read as a roster at all."""
+
+
+def iter_csv_rows(stream):
+    """Yield (line number, cells) for each row of a CSV byte stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for line, cells in enumerate(csv.reader(text), start=1):
+            yield line, cells
+    except UnicodeDecodeError:
+        raise RosterError("The CSV file must be UTF-8 encoded.")
+
+
+def _column_index(ref):
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _cell_text(cell, shared_strings):
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{XLSX_NS}t'))
+    value = cell.find(f'{XLSX_NS}v')
+    if value is None or value.text is None:
+        return ''
+    if cell_type == 's':
+        return shared_strings[int(value.text)]
+    if cell_type in (None, 'n') and ('.' in value.text or 'E' in value.text):
+        # Long registration numbers typed into a numeric cell come back as
+        # floats such as 9.22500000001E+11
+        number = float(value.text)
+        if number.is_integer():
+            return str(int(number))
+    return value.text
+
+
+def _first_sheet_path(archive):
+    try:
+        with archive.open('xl/workbook.xml') as f:
+            sheet = next(element for _, element in iterparse(f)
+                         if element.tag == f'{XLSX_NS}sheet')
+        with archive.open('xl/_rels/workbook.xml.rels') as f:
+            for _, element in iterparse(f):
+                if (element.tag == f'{RELS_NS}Relationship'
+                        and element.get('Id') == sheet.get(f'{DOC_RELS_NS}id')):
+                    target = element.get('Target')
+                    if target.startswith('/'):
+                        return target.lstrip('/')
+                    return posixpath.normpath(posixpath.join('xl', target))
+    except (KeyError, StopIteration):
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def iter_xlsx_rows(stream):
+    """Yield (row number, cells) for each row of the first sheet of an XLSX file."""
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise RosterError("The file is not a valid .xlsx workbook.")
+    try:
+        yield from _iter_sheet_rows(archive)
+    except ParseError:
+        raise RosterError("The workbook could not be read.")
+    finally:
+        archive.close()
+
+
+def _iter_sheet_rows(archive):
+    shared_strings = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        with archive.open('xl/sharedStrings.xml') as f:
+            for _, element in iterparse(f):
+                if element.tag == f'{XLSX_NS}si':
+                    shared_strings.append(''.join(t.text or '' for t in element.iter(f'{XLSX_NS}t')))
+                    element.clear()
+
+    sheet_path = _first_sheet_path(archive)
+    if sheet_path not in archive.namelist():
+        raise RosterError("The workbook has no worksheet.")
+    with archive.open(sheet_path) as f:
+        line = 0
+        for _, element in iterparse(f):
+            if element.tag != f'{XLSX_NS}row':
+                continue
+            line = int(element.get('r', line + 1))
+            cells = []
+            for cell in element.iter(f'{XLSX_NS}c'):
+                ref = cell.get('r')
+                if ref:
+                    cells.extend([''] * (_column_index(ref) - len(cells)))
+                cells.append(_cell_text(cell, shared_strings))
+            element.clear()
+            yield line, cells
+
+
+def iter_roster_rows(stream, filename):
+    """Yield (line number, cells) from a roster upload, picking the reader by extension."""
+    if filename.lower().endswith('.xlsx'):
+        return iter_xlsx_rows(stream)
+    if filename.lower().endswith('.csv'):
+        return iter_csv_rows(stream)
+    raise RosterError("Upload a .csv or .xlsx file.")
+
+
+def _header_columns(cells):
+    """Map column names to indexes if cells is a header row, else return None."""
+    columns = {}
+    for index, cell in enumerate(cells):
+        name = cell.strip().lower().replace(' ', '').replace('_', '')
+        for column, aliases in COLUMN_ALIASES.items():
+            if name in aliases and column not in columns:
+                columns[column] = index
+    return columns if 'registerno' in columns else None
+
+
+def _cell(cells, columns, column, default=''):
+    index = columns.get(column)
+    if index is None or index >= len(cells) or not cells[index].strip():
+        return default
+    return cells[index].strip()
+
+
+def import_roster(stream, filename, department='', semester=''):
+    """
+    Import the students listed in a roster upload.
+
+    department and semester are used for rows that leave those columns out
+    or empty. Return the per-row report: a list of dicts with 'line',
+    'registerno', 'department', 'semester', 'status' (added, duplicate or
+    invalid) and 'message'.
+    """
+    departments = set(get_departments())
+    semesters = {normalize_semester(name) for name in get_semesters()}
+    department = department.strip()
+    semester = normalize_semester(semester)
+
+    rows = iter_roster_rows(stream, filename)
+    # Without a header row the first column holds the registration numbers
+    columns = {'registerno': 0}
+    report = []
+    students = []
+    pending = []
+    for line, cells in rows:
+        if not any(cell.strip() for cell in cells):
+            continue
+        if not report:
+            header = _header_columns(cells)
+            if header is not None:
+                columns = header
+                continue
+
+        entry = {
+            'line': line,
+            'registerno': _cell(cells, columns, 'registerno'),
+            'department': _cell(cells, columns, 'department', department),
+            'semester': normalize_semester(_cell(cells, columns, 'semester', semester)),
+        }
+        regno = ''.join(entry['registerno'].split())
+        if not regno.isdigit() or int(regno) < 1:
+            entry.update(status=INVALID, message="Registration number must be a positive number")
+        elif entry['department'] not in departments:
+            entry.update(status=INVALID, message="Unknown department")
+        elif entry['semester'] not in semesters:
+            entry.update(status=INVALID, message="Unknown semester")
+        else:
+            entry['registerno'] = regno
+            students.append((regno, entry['department'], entry['semester']))
+            pending.append(entry)
+        report.append(entry)
+
+    for entry, was_added in zip(pending, import_students(students) if students else []):
+        if was_added:
+            entry.update(status=ADDED, message="Added")
+        else:
+            entry.update(status=DUPLICATE, message="Already registered for this department and semester")
+    return report
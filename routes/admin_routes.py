@@ -1,16 +1,19 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+import base64
 from utils import (
-    read_csv_as_list,
+    get_departments,
+    get_semesters,
+    get_staffs,
+    get_subjects,
     update_admin_mappings,
-    encrypt_regno,
-    is_encrypted,
-    normalize_regno
+    add_staff as store_staff,
+    add_subject as store_subject
 )
-from config import DEPARTMENTS_FILE, SEMESTERS_FILE, STAFFS_FILE, SUBJECTS_FILE, STUDENT_FILE
-import csv
-import json
+from jobs import job_queue
+from logs import get_logger
 
 admin_bp = Blueprint('admin', __name__)
+log = get_logger('admin')
 
 @admin_bp.route('/admin_login', methods=['GET', 'POST'])
 def admin_login():
@@ -25,10 +28,10 @@ def admin_login():
 
 @admin_bp.route('/admin', methods=['GET', 'POST'])
 def admin():
-    departments = read_csv_as_list(DEPARTMENTS_FILE)
-    semesters = read_csv_as_list(SEMESTERS_FILE)
-    staffs = read_csv_as_list(STAFFS_FILE)
-    subjects = read_csv_as_list(SUBJECTS_FILE)
+    departments = get_departments()
+    semesters = get_semesters()
+    staffs = get_staffs()
+    subjects = get_subjects()
 
     if request.method == 'POST':
         department = request.form.get('department')
@@ -47,8 +50,11 @@ def admin():
         if not new_mappings:
             flash("Please enter at least one valid staff–subject mapping.", "danger")
         else:
-            update_admin_mappings(department, semester, new_mappings)
-            flash("Mapping(s) saved successfully.", "success")
+            change = update_admin_mappings(department, semester, new_mappings)
+            if change.changed:
+                flash("Mapping(s) saved successfully.", "success")
+            else:
+                flash("No changes to save; the mappings are already up to date.", "info")
             return redirect(url_for('admin.admin'))
 
     return render_template('admin_mapping.html',
@@ -63,21 +69,21 @@ def admin_dashboard():
 
 @admin_bp.route('/admin/students', methods=['GET'])
 def admin_students():
-    departments = read_csv_as_list(DEPARTMENTS_FILE)
-    semesters = read_csv_as_list(SEMESTERS_FILE)
+    departments = get_departments()
+    semesters = get_semesters()
     return render_template('admin_students.html',
                          departments=departments,
                          semesters=semesters)
 
 @admin_bp.route('/admin/add_students', methods=['POST'])
 def add_students():
-    print("[DEBUG] add_students form data:", request.form.to_dict())
     department = request.form.get('department', '').strip()
     semester = request.form.get('semester', '').strip()
     start_reg = request.form.get('startReg', '').strip()
     end_reg = request.form.get('endReg', '').strip()
 
-    print(f"[DEBUG] Processing add_students: department={department}, semester={semester}, start_reg={start_reg}, end_reg={end_reg}")
+    log.debug('add_students_request', department=department, semester=semester,
+              start_reg=start_reg, end_reg=end_reg)
 
     # Clean up semester input - extract just the number
     semester = semester.replace('Semester ', '').replace('semester ', '').strip()
@@ -101,88 +107,58 @@ def add_students():
                 'message': 'The range between start and end numbers should not exceed 120'
             })
 
-        # Read existing students to check for duplicates
-        existing_students = {}
-        try:
-            with open(STUDENT_FILE, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    key = (row['department'], row['semester'])
-                    regno = row['registerno']
-                    if key not in existing_students:
-                        existing_students[key] = {'encrypted': set(), 'plain': set()}
-                    
-                    if is_encrypted(regno):
-                        existing_students[key]['encrypted'].add(regno)
-                        # Try to guess the original number by checking common patterns
-                        for i in range(1, 1000):
-                            if encrypt_regno(str(i)) == regno:
-                                existing_students[key]['plain'].add(str(i))
-                                break
-                    else:
-                        existing_students[key]['plain'].add(regno)
-                        existing_students[key]['encrypted'].add(encrypt_regno(regno))
-        except FileNotFoundError:
-            # Create file with headers if it doesn't exist
-            with open(STUDENT_FILE, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['registerno', 'department', 'semester'])
-                print(f"[DEBUG] Created new students.csv file with headers")
-
-        # Add new students
-        new_students = []
-        duplicates = []
-        dept_sem_key = (department, semester)
-        existing_plain = existing_students.get(dept_sem_key, {}).get('plain', set())
-        existing_encrypted = existing_students.get(dept_sem_key, {}).get('encrypted', set())
-        
-        print(f"[DEBUG] Existing students for {dept_sem_key}: plain={len(existing_plain)}, encrypted={len(existing_encrypted)}")
-
-        for reg_no in range(start_num, end_num + 1):
-            reg_str = str(reg_no)  # Don't pad with zeros to match the format in the form
-            
-            # Check if this register number already exists (either in plain or encrypted form)
-            if reg_str in existing_plain or encrypt_regno(reg_str) in existing_encrypted:
-                duplicates.append(reg_str)  # Store original for display to user
-            else:
-                # Store plain text version
-                new_students.append([reg_str, department, semester])
-
-        if new_students:
-            with open(STUDENT_FILE, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerows(new_students)
-                print(f"[DEBUG] Department/Semester: {dept_sem_key} | Added {len(new_students)} new students | Skipped {len(duplicates)} duplicates")
-            
-            msg = f"Successfully added {len(new_students)} students."
-            if duplicates:
-                msg += f" Registration numbers {', '.join(duplicates)} were skipped as they already exist."
-            return jsonify({
-                'success': True,
-                'message': msg
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': f"All the registration numbers already exist for this department and semester: {', '.join(duplicates)}"
-            })
+        # Don't pad with zeros to match the format in the form
+        candidates = [str(reg_no) for reg_no in range(start_num, end_num + 1)]
+        job_id = job_queue.enqueue('add_students', department=department,
+                                   semester=semester, regnos=candidates)
+        # The page polls status_url for the final success flag and message
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'message': 'Adding students...',
+            'status_url': url_for('jobs.job_status', job_id=job_id)
+        })
 
     except ValueError as ve:
-        print(f"[DEBUG] ValueError in add_students: {str(ve)}")
+        log.debug('add_students_invalid', error=str(ve))
         return jsonify({
             'success': False,
             'message': 'Please enter valid registration numbers'
         })
     except Exception as e:
-        import traceback
-        error_traceback = traceback.format_exc()
-        error_msg = f"Error in add_students: {str(e)}\nTraceback:\n{error_traceback}"
-        print(error_msg)
+        log.error('add_students_failed', exc_info=True, error=str(e))
         return jsonify({
             'success': False,
             'message': 'An error occurred while adding students. Please try again with different registration numbers or contact support if the issue persists.'
         })
 
+@admin_bp.route('/admin/import_students', methods=['POST'])
+def import_students():
+    roster = request.files.get('roster')
+    if roster is None or not roster.filename:
+        return jsonify({
+            'success': False,
+            'message': 'Please choose a .csv or .xlsx roster file to upload.'
+        })
+
+    # Parsed and imported by a job; the file travels in its parameters so
+    # any worker process can pick it up
+    job_id = job_queue.enqueue('import_roster', filename=roster.filename,
+                               roster=base64.b64encode(roster.read()).decode('ascii'),
+                               department=request.form.get('department', ''),
+                               semester=request.form.get('semester', ''))
+    if request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html':
+        # Plain form post: the wait page shows the outcome and downloads the report
+        return redirect(url_for('jobs.job_wait', job_id=job_id, download='1',
+                                next=url_for('admin.admin_students')))
+    # The page polls status_url, then reads the per-row report from the result
+    return jsonify({
+        'success': True,
+        'queued': True,
+        'message': 'Importing roster...',
+        'status_url': url_for('jobs.job_status', job_id=job_id)
+    })
+
 @admin_bp.route('/admin/add_staff', methods=['POST'])
 def add_staff():
     try:
@@ -193,20 +169,12 @@ def add_staff():
                 'message': 'Staff name cannot be empty'
             })
 
-        # Read existing staff
-        staffs = read_csv_as_list(STAFFS_FILE)
-        
-        if staff_name in staffs:
+        if not store_staff(staff_name):
             return jsonify({
                 'success': False,
                 'message': 'Staff name already exists'
             })
 
-        # Append new staff
-        with open(STAFFS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([staff_name])
-
         return jsonify({
             'success': True,
             'message': f'Successfully added staff: {staff_name}',
@@ -229,20 +197,12 @@ def add_subject():
                 'message': 'Subject name cannot be empty'
             })
 
-        # Read existing subjects
-        subjects = read_csv_as_list(SUBJECTS_FILE)
-        
-        if subject_name in subjects:
+        if not store_subject(subject_name):
             return jsonify({
                 'success': False,
                 'message': 'Subject already exists'
             })
 
-        # Append new subject
-        with open(SUBJECTS_FILE, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([subject_name])
-
         return jsonify({
             'success': True,
             'message': f'Successfully added subject: {subject_name}',
@@ -258,13 +218,18 @@ def add_subject():
 @admin_bp.route('/admin/get_lists', methods=['GET'])
 def get_lists():
     try:
-        staffs = read_csv_as_list(STAFFS_FILE)
-        subjects = read_csv_as_list(SUBJECTS_FILE)
-        return jsonify({
+        staffs = get_staffs()
+        subjects = get_subjects()
+        response = jsonify({
             'success': True,
             'staffs': staffs,
             'subjects': subjects
         })
+        # Clients revalidate with If-None-Match and get a 304 while the
+        # lists are unchanged
+        response.add_etag()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({
             'success': False,
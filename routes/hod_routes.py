@@ -1,33 +1,14 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, make_response, current_app
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from utils import read_csv_as_list, update_mainratings, normalize_semester
-from config import (DEPARTMENTS_FILE, SEMESTERS_FILE, MAINRATING_FILE,
-                   RATING_FILE, STUDENT_FILE, REQUIRED_FILES, ADMIN_MAPPING_FILE)
-import os
-import csv
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, Response
+from utils import get_departments, get_semesters
 import io
-import base64
-import matplotlib.pyplot as plt
 from datetime import datetime
-import textwrap
-from report_generator import generate_feedback_report
-import shutil
+from batch_reports import report_job, report_rows, collect_report_jobs, iter_reports_zip
+from report_cache import report_cache
+from jobs import job_queue
+from logs import get_logger
 
 hod_bp = Blueprint('hod', __name__)
-
-def create_empty_csv(file_path, headers):
-    """Create a new CSV file with only headers."""
-    with open(file_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-
-def safe_move_file(src, dst):
-    """Move file if it exists, create empty one if it doesn't."""
-    if os.path.exists(src):
-        shutil.copy2(src, dst)  # Copy with metadata
+log = get_logger('hod')
 
 @hod_bp.route('/hod', methods=['GET', 'POST'])
 def hod_login():
@@ -43,8 +24,8 @@ def hod_login():
 
 @hod_bp.route('/hod/select', methods=['GET', 'POST'])
 def hod_select():
-    departments = read_csv_as_list(DEPARTMENTS_FILE)
-    semesters = read_csv_as_list(SEMESTERS_FILE)
+    departments = get_departments()
+    semesters = get_semesters()
     
     if request.method == 'POST':
         action = request.form.get('action', '')
@@ -57,116 +38,41 @@ def hod_select():
         
         if action in ['view_pdf', 'download_pdf']:
             try:
-                normalized_input_semester = normalize_semester(semester)
-                update_mainratings()
-                
-                feedback_data = {}
-                staff_counter = 1
-                
-                if os.path.exists(MAINRATING_FILE):
-                    with open(MAINRATING_FILE, newline='', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            dep = row.get('department', '').strip()
-                            sem = normalize_semester(row.get('semester', ''))
-                            if dep == department.strip() and sem == normalized_input_semester:
-                                staff_name = row.get('staff', '').strip()
-                                subject_name = row.get('subject', '').strip()
-                                scores = []
-                                for i in range(1, 11):
-                                    try:
-                                        score = float(row.get(f'q{i}_avg', '0.00'))
-                                        scores.append(score)
-                                    except (ValueError, TypeError):
-                                        scores.append(0.0)
-                                
-                                key = f"{staff_name}_{subject_name}"
-                                feedback_data[key] = {
-                                    'reference': f'S{staff_counter}',
-                                    'staff_name': staff_name,
-                                    'subject': subject_name,
-                                    'scores': scores
-                                }
-                                staff_counter += 1
+                job = report_job(department, semester, report_rows(department, semester),
+                                 academic_year=str(datetime.now().year))
                 
-                if not feedback_data:
+                if job is None:
                     flash("No rating data found for the selected department and semester.", "danger")
                     return redirect(url_for('hod.hod_select'))
                 
-                # Generate PDF report
-                year = (int(normalized_input_semester) + 1) // 2
-                try:
-                    pdf_path = generate_feedback_report(
-                        academic_year=str(datetime.now().year),
-                        branch=department,
-                        semester=semester,
-                        year=str(year),
-                        feedback_data=feedback_data
+                # Serve a cached report straight away; otherwise build it in
+                # the background and let the browser poll for it
+                pdf_content = report_cache.get(job.slice_id, job.content_id)
+                if pdf_content is not None:
+                    return send_file(
+                        io.BytesIO(pdf_content),
+                        mimetype='application/pdf',
+                        as_attachment=(action == 'download_pdf'),
+                        download_name=job.filename
                     )
-                    
-                    if not pdf_path or not os.path.exists(pdf_path):
-                        raise ValueError("PDF file was not generated properly")
-                    
-                    # Read the generated PDF
-                    with open(pdf_path, 'rb') as f:
-                        pdf_content = f.read()
-                    
-                    # Create response
-                    response = make_response(pdf_content)
-                    response.headers['Content-Type'] = 'application/pdf'
-                    
-                    if action == 'download_pdf':
-                        response.headers['Content-Disposition'] = f'attachment; filename={os.path.basename(pdf_path)}'
-                    else:  # view_pdf
-                        response.headers['Content-Disposition'] = f'inline; filename={os.path.basename(pdf_path)}'
-                    
-                    # Clean up the temporary PDF file
-                    try:
-                        os.remove(pdf_path)
-                    except:
-                        pass
-                    
-                    return response
                 
-                except Exception as e:
-                    current_app.logger.error(f"PDF Generation Error: {str(e)}")
-                    flash(f"Error generating PDF report: {str(e)}", "danger")
-                    return redirect(url_for('hod.hod_select'))
+                job_id = job_queue.enqueue('feedback_report',
+                                           department=department,
+                                           semester=semester,
+                                           academic_year=job.report_args['academic_year'])
+                return redirect(url_for('jobs.job_wait', job_id=job_id,
+                                        download='1' if action == 'download_pdf' else None,
+                                        next=url_for('hod.hod_select')))
                 
             except Exception as e:
-                current_app.logger.error(f"General Error: {str(e)}")
+                log.error('report_request_failed', exc_info=True, department=department, semester=semester)
                 flash(f"Error processing request: {str(e)}", "danger")
                 return redirect(url_for('hod.hod_select'))
         
         elif action == 'archive':
             try:
-                if not os.path.exists('history'):
-                    os.makedirs('history')
-                
-                timestamp = datetime.now().strftime("%d-%b-%Y--%H-%M-%S")
-                archive_dir = os.path.join('history', timestamp)
-                if not os.path.exists(archive_dir):
-                    os.makedirs(archive_dir)
-                
-                files_to_handle = {
-                    RATING_FILE: REQUIRED_FILES[RATING_FILE],
-                    STUDENT_FILE: REQUIRED_FILES[STUDENT_FILE],
-                    ADMIN_MAPPING_FILE: ['department', 'semester', 'staff', 'subject'],
-                    MAINRATING_FILE: None
-                }
-                
-                for file, headers in files_to_handle.items():
-                    if os.path.exists(file):
-                        archive_path = os.path.join(archive_dir, os.path.basename(file))
-                        safe_move_file(file, archive_path)
-                        
-                        if headers is not None:
-                            create_empty_csv(file, headers)
-                        elif file == MAINRATING_FILE and os.path.exists(file):
-                            os.remove(file)
-                
-                flash("Data successfully archived and system reset.", "success")
-                
+                job_id = job_queue.enqueue('archive')
+                return redirect(url_for('jobs.job_wait', job_id=job_id, next=url_for('hod.hod_select')))
             except Exception as e:
                 flash(f"Error during archival process: {str(e)}", "danger")
             
@@ -175,3 +81,28 @@ def hod_select():
     return render_template('hod_select.html', 
                          departments=departments,
                          semesters=semesters)
+
+@hod_bp.route('/hod/reports/all/job', methods=['POST'])
+def queue_all_reports():
+    """Build the all-departments ZIP in the background and poll for it."""
+    job_id = job_queue.enqueue('bulk_reports', academic_year=str(datetime.now().year))
+    return redirect(url_for('jobs.job_wait', job_id=job_id, download='1', next=url_for('hod.hod_select')))
+
+@hod_bp.route('/hod/reports/all', methods=['GET'])
+def download_all_reports():
+    """Stream a ZIP of every department/semester report as it is generated."""
+    jobs = collect_report_jobs(academic_year=str(datetime.now().year))
+    if not jobs:
+        flash("No rating data found.", "danger")
+        return redirect(url_for('hod.hod_select'))
+    
+    def log_progress(done, total, job):
+        log.info('bulk_reports_progress', done=done, total=total,
+                 department=job.department, semester=job.semester)
+    
+    filename = f"feedback_reports_{datetime.now().strftime('%d-%b-%Y--%H-%M-%S')}.zip"
+    response = Response(iter_reports_zip(jobs, progress=log_progress), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # No Content-Length while streaming; lets clients show progress by file
+    response.headers['X-Report-Count'] = str(len(jobs))
+    return response
@@ -0,0 +1,47 @@
+from flask import Blueprint, render_template, request, url_for, jsonify, send_file, abort
+from jobs import job_queue, DONE
+import io
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def local_url(url):
+    """Return url if it is a path on this site, else None."""
+    # '//host' and '/\\host' are taken by browsers as another site, and
+    # browsers drop tabs and newlines before looking
+    if (url and url.startswith('/') and url.isprintable()
+            and not url.startswith(('//', '/\\'))):
+        return url
+    return None
+
+@jobs_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'success': False, 'message': 'No such job.'}), 404
+    status['success'] = status['status'] == DONE
+    if status['has_result']:
+        status['result_url'] = url_for('jobs.job_result', job_id=job_id)
+    return jsonify(status)
+
+@jobs_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    result = job_queue.result(job_id)
+    if result is None:
+        abort(404)
+    data, filename, mimetype = result
+    return send_file(
+        io.BytesIO(data),
+        mimetype=mimetype,
+        as_attachment=request.args.get('download') == '1',
+        download_name=filename
+    )
+
+@jobs_bp.route('/jobs/<job_id>/wait', methods=['GET'])
+def job_wait(job_id):
+    """Page that polls a job and opens its result when it is done."""
+    if job_queue.status(job_id) is None:
+        abort(404)
+    return render_template('job_status.html',
+                           job_id=job_id,
+                           download=request.args.get('download') == '1',
+                           back_url=local_url(request.args.get('next')) or url_for('hod.hod_select'))
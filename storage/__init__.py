@@ -0,0 +1,28 @@
+"""
+Persistence for students, mappings, ratings and reference data.
+
+The backend is chosen by config.STORAGE_BACKEND. Backend modules are imported
+on first use, so the SQLite code is never loaded by a CSV deployment.
+"""
+from config import STORAGE_BACKEND
+
+_backend = None
+
+
+def create_backend(name):
+    """Return a new storage backend instance for the given name."""
+    if name == 'csv':
+        from storage.csv_backend import CsvStorage
+        return CsvStorage()
+    if name == 'sqlite':
+        from storage.sqlite_backend import SqliteStorage
+        return SqliteStorage()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def get_storage():
+    """Return the process-wide storage backend."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(STORAGE_BACKEND)
+    return _backend
@@ -0,0 +1,159 @@
+import asyncio
+from collections import Counter, namedtuple
+
+# Outcome of replace_mappings: whether anything changed, the (staff, subject)
+# pairs added and removed, and the department/semester's version afterwards
+MappingChange = namedtuple('MappingChange', ['changed', 'added', 'removed', 'version'])
+
+
+def mapping_pairs(mappings):
+    """Return the (staff, subject) pairs of mapping rows, in order."""
+    return [(row.get('staff', '').strip(), row.get('subject', '').strip()) for row in mappings]
+
+
+def mapping_change(old_pairs, new_pairs, version):
+    """Build the MappingChange between two ordered lists of (staff, subject) pairs."""
+    old_counts = Counter(old_pairs)
+    new_counts = Counter(new_pairs)
+    return MappingChange(old_pairs != new_pairs,
+                         list((new_counts - old_counts).elements()),
+                         list((old_counts - new_counts).elements()),
+                         version)
+
+
+class StorageBackend:
+    """
+    Interface shared by the storage backends.
+
+    Rows are exchanged as plain dicts using the same field names as the CSV
+    headers in config.REQUIRED_FILES, so callers do not depend on the backend.
+    """
+
+    name = None
+
+    def initialize(self):
+        """Create whatever files or tables the backend needs."""
+        raise NotImplementedError
+
+    # Reference data
+
+    def list_departments(self):
+        raise NotImplementedError
+
+    def list_semesters(self):
+        raise NotImplementedError
+
+    def list_staffs(self):
+        raise NotImplementedError
+
+    def list_subjects(self):
+        raise NotImplementedError
+
+    def add_staff(self, staff_name):
+        """Add a staff name. Return False if it already exists."""
+        raise NotImplementedError
+
+    def add_subject(self, subject_name):
+        """Add a subject name. Return False if it already exists."""
+        raise NotImplementedError
+
+    # Students
+
+    def get_student(self, registerno):
+        """Return the student row for a registration number, or None."""
+        raise NotImplementedError
+
+    def get_batch_summary(self, department, semester):
+        """Return the BatchSummary of a department/semester, or None."""
+        raise NotImplementedError
+
+    def import_students(self, students):
+        """
+        Register (registerno, department, semester) tuples in one write,
+        skipping ones already registered in that department/semester or
+        repeated earlier in students. Return a list of booleans, True for
+        each student that was added.
+        """
+        raise NotImplementedError
+
+    def add_students(self, department, semester, regnos):
+        """
+        Add registration numbers to a department/semester batch.
+        Return (added, duplicates) as lists of the given registration numbers.
+        """
+        added = []
+        duplicates = []
+        results = self.import_students([(regno, department, semester) for regno in regnos])
+        for regno, was_added in zip(regnos, results):
+            (added if was_added else duplicates).append(regno)
+        return added, duplicates
+
+    # Staff/subject mappings
+
+    def get_mappings(self, department, semester):
+        """Return the mapping rows for a department/semester in saved order."""
+        raise NotImplementedError
+
+    def replace_mappings(self, department, semester, mappings):
+        """
+        Replace all mapping rows of a department/semester as one atomic
+        change, serialized with other writers. Saving the same rows again is
+        a no-op. Return a MappingChange.
+        """
+        raise NotImplementedError
+
+    def mapping_version(self, department=None, semester=None):
+        """
+        Return the version of one department/semester's mappings, or of all
+        mappings when none is given. It grows with every change, so caches
+        and rendered feedback forms can key on it.
+        """
+        raise NotImplementedError
+
+    # Ratings
+
+    def has_submitted(self, registerno):
+        """Return True if ratings exist for the registration number."""
+        raise NotImplementedError
+
+    def append_ratings(self, rating_rows):
+        raise NotImplementedError
+
+    def submit_ratings(self, registerno, rating_rows):
+        """
+        Append rating_rows unless registerno has already submitted, as one
+        atomic step. Return True if written, False if it was a duplicate.
+        """
+        raise NotImplementedError
+
+    async def submit_ratings_async(self, registerno, rating_rows):
+        """
+        submit_ratings for async callers. By default it runs in a worker
+        thread; backends that can wait without a thread override it.
+        """
+        return await asyncio.to_thread(self.submit_ratings, registerno, rating_rows)
+
+    def aggregate_ratings(self, department=None, semester=None):
+        """
+        Return per (department, semester, staff, subject) aggregates, optionally
+        limited to one department/semester. Each item is a dict with the four
+        key fields, 'count', 'q_avgs' (ten floats) and 'overall_average'.
+        """
+        raise NotImplementedError
+
+    def rating_statistics(self, department=None, semester=None):
+        """
+        Like aggregate_ratings, with each item also carrying 'sketch', the
+        group's rating_sketch.RatingSketch, for response counts, standard
+        deviations, medians and score distributions.
+        """
+        raise NotImplementedError
+
+    # Archival
+
+    def archive(self, archive_dir):
+        """
+        Write students, mappings and ratings as CSV files into archive_dir,
+        then clear them so a new feedback cycle can start.
+        """
+        raise NotImplementedError
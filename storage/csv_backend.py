@@ -0,0 +1,240 @@
+import copy
+import csv
+import io
+import json
+import os
+import shutil
+from config import (
+    ADMIN_MAPPING_FILE, ADMIN_MAPPING_VERSION_FILE, RATING_FILE, STUDENT_FILE, REQUIRED_FILES
+)
+from aggregates import rating_aggregates
+from indexes import (
+    student_registry, submission_index, mapping_index, file_signature,
+    department_list, semester_list, staff_list, subject_list
+)
+from locking import file_lock
+from ratings_sink import RatingsSink
+from regno import encrypt_regno
+from storage.base import StorageBackend, mapping_pairs, mapping_change
+from utils import normalize_semester
+
+
+class CsvStorage(StorageBackend):
+    """Storage backed by the flat CSV files listed in config.REQUIRED_FILES."""
+
+    name = 'csv'
+
+    def __init__(self):
+        self._ratings_sink = RatingsSink(RATING_FILE, REQUIRED_FILES[RATING_FILE],
+                                         submission_index, followers=[rating_aggregates])
+        # (file signature, contents) of ADMIN_MAPPING_VERSION_FILE
+        self._versions_cache = None
+
+    def initialize(self):
+        for file, headers in REQUIRED_FILES.items():
+            if not os.path.exists(file):
+                with open(file, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(headers)
+
+    # Reference data
+
+    def list_departments(self):
+        return department_list.values()
+
+    def list_semesters(self):
+        return semester_list.values()
+
+    def list_staffs(self):
+        return staff_list.values()
+
+    def list_subjects(self):
+        return subject_list.values()
+
+    def _add_reference_value(self, reference, value):
+        with file_lock(reference.path):
+            if value in reference:
+                return False
+            with open(reference.path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow([value])
+        return True
+
+    def add_staff(self, staff_name):
+        return self._add_reference_value(staff_list, staff_name)
+
+    def add_subject(self, subject_name):
+        return self._add_reference_value(subject_list, subject_name)
+
+    # Students
+
+    def get_student(self, registerno):
+        return student_registry.lookup(registerno)
+
+    def get_batch_summary(self, department, semester):
+        return student_registry.batch_summary(department, semester)
+
+    def import_students(self, students):
+        with file_lock(STUDENT_FILE):
+            # One registry probe per candidate against the memberships of
+            # everything already on file
+            keys = [(department, semester, encrypt_regno(regno))
+                    for regno, department, semester in students]
+            registered = student_registry.registered(keys)
+            seen = set()
+            results = []
+            for key, exists in zip(keys, registered):
+                is_new = not exists and key not in seen
+                seen.add(key)
+                results.append(is_new)
+
+            added = [student for student, is_new in zip(students, results) if is_new]
+            if added:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                start = os.path.getsize(STUDENT_FILE) if os.path.exists(STUDENT_FILE) else 0
+                if start == 0:
+                    writer.writerow(REQUIRED_FILES[STUDENT_FILE])
+                # Store plain text version
+                writer.writerows(added)
+                data = buffer.getvalue().encode('utf-8')
+                with open(STUDENT_FILE, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # Fold the new rows into the login-path index and batch summaries
+                student_registry.feed(start, data)
+        return results
+
+    # Staff/subject mappings
+
+    def get_mappings(self, department, semester):
+        return mapping_index.lookup(department, semester)
+
+    def replace_mappings(self, department, semester, mappings):
+        dep_norm = department.strip()
+        sem_norm = normalize_semester(semester)
+        mappings = list(mappings)
+        with file_lock(ADMIN_MAPPING_FILE):
+            versions = copy.deepcopy(self._mapping_versions())
+            old_pairs = mapping_pairs(mapping_index.lookup(department, semester))
+            new_pairs = mapping_pairs(mappings)
+            if old_pairs == new_pairs:
+                return mapping_change(old_pairs, new_pairs,
+                                      versions['classes'].get(dep_norm, {}).get(sem_norm, 0))
+
+            # Copy every other class's rows unchanged and put the new rows
+            # where the class used to be (at the end if it is new), then
+            # swap the finished file in so readers never see a partial one
+            temp_path = f"{ADMIN_MAPPING_FILE}.tmp"
+            placed = False
+            with open(temp_path, 'w', newline='', encoding='utf-8') as out:
+                writer = csv.DictWriter(out, fieldnames=REQUIRED_FILES[ADMIN_MAPPING_FILE],
+                                        extrasaction='ignore')
+                writer.writeheader()
+                if os.path.exists(ADMIN_MAPPING_FILE):
+                    with open(ADMIN_MAPPING_FILE, newline='', encoding='utf-8') as f:
+                        for row in csv.DictReader(f):
+                            row_dep = (row.get('department') or '').strip()
+                            row_sem = normalize_semester(row.get('semester') or '')
+                            if row_dep != dep_norm or row_sem != sem_norm:
+                                writer.writerow(row)
+                            elif not placed:
+                                writer.writerows(mappings)
+                                placed = True
+                if not placed:
+                    writer.writerows(mappings)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_path, ADMIN_MAPPING_FILE)
+            # Drop the cached classes now rather than trusting the file's
+            # mtime to have moved
+            mapping_index.invalidate()
+
+            # Published after the rows, so a version is never seen before
+            # the mappings it stands for
+            versions['version'] += 1
+            versions['classes'].setdefault(dep_norm, {})[sem_norm] = versions['version']
+            self._save_mapping_versions(versions)
+        return mapping_change(old_pairs, new_pairs, versions['version'])
+
+    def _mapping_versions(self):
+        signature = file_signature(ADMIN_MAPPING_VERSION_FILE)
+        cached = self._versions_cache
+        if cached is None or cached[0] != signature:
+            versions = {'version': 0, 'classes': {}}
+            if signature is not None:
+                try:
+                    with open(ADMIN_MAPPING_VERSION_FILE, encoding='utf-8') as f:
+                        versions = json.load(f)
+                except ValueError:
+                    pass
+            cached = self._versions_cache = (signature, versions)
+        # Shared: callers that modify it work on a copy
+        return cached[1]
+
+    def _save_mapping_versions(self, versions):
+        temp_path = f"{ADMIN_MAPPING_VERSION_FILE}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(versions, f)
+        os.replace(temp_path, ADMIN_MAPPING_VERSION_FILE)
+
+    def mapping_version(self, department=None, semester=None):
+        versions = self._mapping_versions()
+        if department is None:
+            return versions['version']
+        return versions['classes'].get(department.strip(), {}).get(normalize_semester(semester), 0)
+
+    # Ratings
+
+    def has_submitted(self, registerno):
+        return submission_index.contains(registerno)
+
+    def append_ratings(self, rating_rows):
+        self._ratings_sink.append(rating_rows)
+
+    def submit_ratings(self, registerno, rating_rows):
+        return self._ratings_sink.submit(registerno, rating_rows)
+
+    async def submit_ratings_async(self, registerno, rating_rows):
+        return await self._ratings_sink.submit_async(registerno, rating_rows)
+
+    def aggregate_ratings(self, department=None, semester=None):
+        return rating_aggregates.summary(department, semester)
+
+    def rating_statistics(self, department=None, semester=None):
+        return rating_aggregates.summary(department, semester, sketches=True)
+
+    # Archival
+
+    @staticmethod
+    def _reset_file(file):
+        """Swap in a copy of file holding just its header."""
+        temp_path = f"{file}.tmp"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(REQUIRED_FILES[file])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, file)
+
+    def archive(self, archive_dir):
+        # Hold every file's lock from copy to reset, so no submission, student
+        # import or mapping change lands in between and is lost. Always taken
+        # in this order.
+        with file_lock(RATING_FILE), file_lock(STUDENT_FILE), file_lock(ADMIN_MAPPING_FILE):
+            for file in (RATING_FILE, STUDENT_FILE, ADMIN_MAPPING_FILE):
+                if os.path.exists(file):
+                    shutil.copy2(file, os.path.join(archive_dir, os.path.basename(file)))  # Copy with metadata
+                    self._reset_file(file)
+            student_registry.invalidate()
+            submission_index.invalidate()
+            mapping_index.invalidate()
+            # Every class's mappings changed
+            versions = copy.deepcopy(self._mapping_versions())
+            versions['version'] += 1
+            for semesters in versions['classes'].values():
+                for sem in semesters:
+                    semesters[sem] = versions['version']
+            self._save_mapping_versions(versions)
+            rating_aggregates.invalidate()
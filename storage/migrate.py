@@ -0,0 +1,92 @@
+"""
+Import the CSV data files into the SQLite database.
+
+Usage: python -m storage.migrate [--db feedback.db] [--replace]
+
+Set STORAGE_BACKEND = 'sqlite' in config.py once the import has finished.
+"""
+import argparse
+import csv
+import os
+import sys
+from config import (
+    DEPARTMENTS_FILE, SEMESTERS_FILE, STAFFS_FILE, SUBJECTS_FILE,
+    ADMIN_MAPPING_FILE, RATING_FILE, STUDENT_FILE, SQLITE_DB_FILE
+)
+from storage.sqlite_backend import (
+    SqliteStorage, REFERENCE_TABLES, INSERT_STUDENT, INSERT_MAPPING, INSERT_RATING,
+    student_params, mapping_params, rating_params
+)
+from utils import read_csv_as_list
+
+REFERENCE_FILES = dict(zip(REFERENCE_TABLES,
+                           (DEPARTMENTS_FILE, SEMESTERS_FILE, STAFFS_FILE, SUBJECTS_FILE)))
+
+# Tables without a natural key: importing into them twice would duplicate rows
+APPEND_ONLY_TABLES = ('mappings', 'ratings')
+
+
+class MigrationError(RuntimeError):
+    """The database already holds data the import would duplicate."""
+
+
+def _read_rows(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, newline='', encoding='utf-8-sig') as f:
+        return list(csv.DictReader(f))
+
+
+def migrate_csv_to_sqlite(db_path=SQLITE_DB_FILE, replace=False):
+    """
+    Copy every CSV data file into the database at db_path.
+    Return a dict of table name -> number of rows imported.
+
+    Mappings and ratings are plain inserts, so a database that already has
+    any is refused unless replace is set.
+    """
+    store = SqliteStorage(db_path)
+    counts = {}
+    with store.transaction() as conn:
+        if replace:
+            for table in REFERENCE_TABLES + ('students', 'mappings', 'mapping_versions', 'ratings'):
+                conn.execute(f"DELETE FROM {table}")
+        else:
+            filled = [table for table in APPEND_ONLY_TABLES
+                      if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()]
+            if filled:
+                raise MigrationError(
+                    f"{db_path} already has {' and '.join(filled)}; "
+                    "rerun with --replace to import from scratch")
+
+        for table, filename in REFERENCE_FILES.items():
+            values = read_csv_as_list(filename)
+            conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)",
+                             [(value,) for value in values])
+            counts[table] = len(values)
+
+        for table, filename, statement, params in (
+                ('students', STUDENT_FILE, INSERT_STUDENT, student_params),
+                ('mappings', ADMIN_MAPPING_FILE, INSERT_MAPPING, mapping_params),
+                ('ratings', RATING_FILE, INSERT_RATING, rating_params)):
+            rows = _read_rows(filename)
+            conn.executemany(statement, [params(row) for row in rows])
+            counts[table] = len(rows)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import the CSV data files into SQLite.")
+    parser.add_argument('--db', default=SQLITE_DB_FILE, help="database file to create or update")
+    parser.add_argument('--replace', action='store_true',
+                        help="delete existing rows before importing")
+    args = parser.parse_args()
+
+    print(f"Importing CSV data into {args.db}...")
+    try:
+        counts = migrate_csv_to_sqlite(args.db, args.replace)
+    except MigrationError as e:
+        sys.exit(f"Migration failed: {e}")
+    for table, count in counts.items():
+        print(f"  {table}: {count} rows")
+    print("Migration complete.")
@@ -0,0 +1,365 @@
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from config import (
+    SQLITE_DB_FILE, ADMIN_MAPPING_FILE, RATING_FILE, STUDENT_FILE, REQUIRED_FILES
+)
+from indexes import BatchSummary
+from rating_sketch import RatingSketch, QUESTIONS, SCORE_BUCKETS
+from regno import normalize_regno, encrypt_regno, is_encrypted
+from storage.base import StorageBackend, mapping_pairs, mapping_change
+from utils import normalize_semester
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS departments (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS semesters (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS staffs (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS subjects (name TEXT PRIMARY KEY);
+
+CREATE TABLE IF NOT EXISTS students (
+    registerno TEXT NOT NULL,
+    regno_hash TEXT NOT NULL,
+    department TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    UNIQUE (department, semester, regno_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_students_hash ON students (regno_hash);
+
+CREATE TABLE IF NOT EXISTS mappings (
+    department TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    semester_key TEXT NOT NULL,
+    staff TEXT NOT NULL,
+    subject TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mappings_class ON mappings (department, semester_key);
+
+-- Version of each department/semester's mappings; the overall version is the maximum
+CREATE TABLE IF NOT EXISTS mapping_versions (
+    department TEXT NOT NULL,
+    semester_key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (department, semester_key)
+);
+
+CREATE TABLE IF NOT EXISTS ratings (
+    registerno TEXT NOT NULL,
+    regno_hash TEXT NOT NULL,
+    department TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    semester_key TEXT NOT NULL,
+    staff TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    q1 REAL, q2 REAL, q3 REAL, q4 REAL, q5 REAL,
+    q6 REAL, q7 REAL, q8 REAL, q9 REAL, q10 REAL,
+    average REAL
+);
+CREATE INDEX IF NOT EXISTS idx_ratings_hash ON ratings (regno_hash);
+CREATE INDEX IF NOT EXISTS idx_ratings_class ON ratings (department, semester_key);
+"""
+
+QUESTION_COLUMNS = [f'q{i}' for i in range(1, 11)]
+
+REFERENCE_TABLES = ('departments', 'semesters', 'staffs', 'subjects')
+
+# As update_mainratings always did: a row counts only if its average is a
+# number, and the question sums are divided by that count
+AGGREGATE_COLUMNS = ("department, semester, staff, subject, COUNT(average), "
+                     + ', '.join(f"TOTAL({q}) / COUNT(average)" for q in QUESTION_COLUMNS)
+                     + ", AVG(average)")
+
+
+def _sketch_columns():
+    """Aggregates filling a RatingSketch: average count and sum, then per
+    question the count, sum, sum of squares and SCORE_BUCKETS bucket counts."""
+    columns = ["COUNT(average)", "TOTAL(average)"]
+    for q in QUESTION_COLUMNS:
+        bucket = f"MIN(MAX(CAST(ROUND({q}) AS INTEGER), 1), {SCORE_BUCKETS})"
+        columns += [f"COUNT({q})", f"TOTAL({q})", f"TOTAL({q} * {q})"]
+        columns += [f"COUNT(CASE WHEN {bucket} = {b} THEN 1 END)" for b in range(1, SCORE_BUCKETS + 1)]
+    return ', '.join(columns)
+
+
+SKETCH_COLUMNS = _sketch_columns()
+
+
+def regno_hash(registerno):
+    """Return the hash a stored registration number is indexed under."""
+    if is_encrypted(registerno):
+        return registerno
+    return encrypt_regno(normalize_regno(registerno))
+
+
+def _field(row, column):
+    # csv.DictReader fills the missing fields of a short row with None
+    return (row.get(column) or '').strip()
+
+
+def student_params(row):
+    registerno = row.get('registerno') or ''
+    return (registerno, regno_hash(registerno),
+            _field(row, 'department'), _field(row, 'semester'))
+
+
+def mapping_params(row):
+    semester = _field(row, 'semester')
+    return (_field(row, 'department'), semester, normalize_semester(semester),
+            _field(row, 'staff'), _field(row, 'subject'))
+
+
+def rating_params(row):
+    def score(value):
+        try:
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+    registerno = row.get('registerno') or ''
+    semester = _field(row, 'semester')
+    return ((registerno, regno_hash(registerno),
+             _field(row, 'department'), semester, normalize_semester(semester),
+             _field(row, 'staff'), _field(row, 'subject'))
+            + tuple(score(row.get(q)) for q in QUESTION_COLUMNS)
+            + (score(row.get('average')),))
+
+
+INSERT_STUDENT = "INSERT OR IGNORE INTO students VALUES (?, ?, ?, ?)"
+INSERT_MAPPING = "INSERT INTO mappings VALUES (?, ?, ?, ?, ?)"
+INSERT_RATING = f"INSERT INTO ratings VALUES ({', '.join('?' * 18)})"
+
+
+class SqliteStorage(StorageBackend):
+    """
+    Storage in a single SQLite database running in WAL mode, so readers are
+    never blocked by the writer. Each thread gets its own connection.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=SQLITE_DB_FILE):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._initialized = False
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._initialized:
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in a write transaction, taking the write lock up front."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def initialize(self):
+        self.connection()
+
+    # Reference data
+
+    def _list(self, table):
+        rows = self.connection().execute(f"SELECT name FROM {table} ORDER BY rowid")
+        return [row['name'] for row in rows]
+
+    def _add(self, table, value):
+        with self.transaction() as conn:
+            cursor = conn.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (value,))
+            return cursor.rowcount == 1
+
+    def list_departments(self):
+        return self._list('departments')
+
+    def list_semesters(self):
+        return self._list('semesters')
+
+    def list_staffs(self):
+        return self._list('staffs')
+
+    def list_subjects(self):
+        return self._list('subjects')
+
+    def add_staff(self, staff_name):
+        return self._add('staffs', staff_name)
+
+    def add_subject(self, subject_name):
+        return self._add('subjects', subject_name)
+
+    # Students
+
+    def get_student(self, registerno):
+        row = self.connection().execute(
+            "SELECT registerno, department, semester FROM students "
+            "WHERE regno_hash = ? ORDER BY rowid LIMIT 1",
+            (regno_hash(registerno),)).fetchone()
+        return dict(row) if row else None
+
+    def get_batch_summary(self, department, semester):
+        # Every student counts; only plain numbers give the span
+        plain = ("CASE WHEN registerno != '' AND registerno NOT GLOB '*[^0-9]*' "
+                 "THEN CAST(registerno AS INTEGER) END")
+        row = self.connection().execute(
+            f"SELECT COUNT(*), MIN({plain}), MAX({plain}) "
+            "FROM students WHERE department = ? AND semester = ?",
+            (department, semester)).fetchone()
+        if not row[0]:
+            return None
+        return BatchSummary(*row)
+
+    def import_students(self, students):
+        results = []
+        with self.transaction() as conn:
+            for regno, department, semester in students:
+                cursor = conn.execute(INSERT_STUDENT, student_params(
+                    {'registerno': regno, 'department': department, 'semester': semester}))
+                results.append(cursor.rowcount == 1)
+        return results
+
+    # Staff/subject mappings
+
+    def get_mappings(self, department, semester):
+        rows = self.connection().execute(
+            "SELECT department, semester, staff, subject FROM mappings "
+            "WHERE department = ? AND semester_key = ? ORDER BY rowid",
+            (department.strip(), normalize_semester(semester)))
+        return [dict(row) for row in rows]
+
+    def replace_mappings(self, department, semester, mappings):
+        mappings = list(mappings)
+        key = (department.strip(), normalize_semester(semester))
+        with self.transaction() as conn:
+            old_pairs = mapping_pairs(dict(row) for row in conn.execute(
+                "SELECT staff, subject FROM mappings "
+                "WHERE department = ? AND semester_key = ? ORDER BY rowid", key))
+            new_pairs = mapping_pairs(mappings)
+            if old_pairs == new_pairs:
+                return mapping_change(old_pairs, new_pairs, self._mapping_version(conn, key))
+            conn.execute("DELETE FROM mappings WHERE department = ? AND semester_key = ?", key)
+            conn.executemany(INSERT_MAPPING, [mapping_params(row) for row in mappings])
+            version = self._mapping_version(conn) + 1
+            conn.execute("INSERT OR REPLACE INTO mapping_versions VALUES (?, ?, ?)", key + (version,))
+        return mapping_change(old_pairs, new_pairs, version)
+
+    @staticmethod
+    def _mapping_version(conn, key=None):
+        if key is None:
+            row = conn.execute("SELECT MAX(version) FROM mapping_versions").fetchone()
+        else:
+            row = conn.execute("SELECT version FROM mapping_versions "
+                               "WHERE department = ? AND semester_key = ?", key).fetchone()
+        return (row[0] if row else None) or 0
+
+    def mapping_version(self, department=None, semester=None):
+        key = None if department is None else (department.strip(), normalize_semester(semester))
+        return self._mapping_version(self.connection(), key)
+
+    # Ratings
+
+    def has_submitted(self, registerno):
+        row = self.connection().execute(
+            "SELECT 1 FROM ratings WHERE regno_hash = ? LIMIT 1",
+            (regno_hash(registerno),)).fetchone()
+        return row is not None
+
+    def append_ratings(self, rating_rows):
+        with self.transaction() as conn:
+            conn.executemany(INSERT_RATING, [rating_params(row) for row in rating_rows])
+
+    def submit_ratings(self, registerno, rating_rows):
+        # BEGIN IMMEDIATE takes the write lock, so check and insert are atomic
+        with self.transaction() as conn:
+            if conn.execute("SELECT 1 FROM ratings WHERE regno_hash = ? LIMIT 1",
+                            (regno_hash(registerno),)).fetchone():
+                return False
+            conn.executemany(INSERT_RATING, [rating_params(row) for row in rating_rows])
+        return True
+
+    def _grouped_ratings(self, columns, department=None, semester=None):
+        """Run a SELECT of columns over ratings grouped per staff/subject, in first-seen order."""
+        query = f"SELECT {columns} FROM ratings"
+        params = ()
+        if department is not None:
+            query += " WHERE department = ? AND semester_key = ?"
+            params = (department.strip(), normalize_semester(semester))
+        query += (" GROUP BY department, semester, staff, subject"
+                  " HAVING COUNT(average) > 0 ORDER BY MIN(rowid)")
+        return self.connection().execute(query, params)
+
+    @staticmethod
+    def _aggregate_item(row):
+        return {
+            'department': row[0],
+            'semester': row[1],
+            'staff': row[2],
+            'subject': row[3],
+            'count': row[4],
+            'q_avgs': [value or 0.0 for value in row[5:15]],
+            'overall_average': row[15] or 0.0,
+        }
+
+    def aggregate_ratings(self, department=None, semester=None):
+        return [self._aggregate_item(row)
+                for row in self._grouped_ratings(AGGREGATE_COLUMNS, department, semester)]
+
+    def rating_statistics(self, department=None, semester=None):
+        results = []
+        for row in self._grouped_ratings(f"{AGGREGATE_COLUMNS}, {SKETCH_COLUMNS}",
+                                         department, semester):
+            item = self._aggregate_item(row)
+            sketch = RatingSketch()
+            sketch.count, sketch.total_average = row[16], row[17]
+            per_question = 3 + SCORE_BUCKETS
+            for q in range(QUESTIONS):
+                start = 18 + q * per_question
+                sketch.q_counts[q], sketch.q_sums[q], sketch.q_sumsq[q] = row[start:start + 3]
+                sketch.histogram[q] = list(row[start + 3:start + per_question])
+            item['sketch'] = sketch
+            results.append(item)
+        return results
+
+    # Archival
+
+    def _export(self, conn, query, path, fieldnames, formatter=None):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            for row in conn.execute(query):
+                writer.writerow(formatter(row) if formatter else tuple(row))
+
+    def archive(self, archive_dir):
+        def format_rating(row):
+            return tuple(row[:5]) + tuple(
+                '' if value is None else f"{value:.2f}" for value in row[5:])
+
+        with self.transaction() as conn:
+            self._export(conn, "SELECT registerno, department, semester FROM students ORDER BY rowid",
+                         os.path.join(archive_dir, os.path.basename(STUDENT_FILE)),
+                         REQUIRED_FILES[STUDENT_FILE])
+            self._export(conn, "SELECT department, semester, staff, subject FROM mappings ORDER BY rowid",
+                         os.path.join(archive_dir, os.path.basename(ADMIN_MAPPING_FILE)),
+                         REQUIRED_FILES[ADMIN_MAPPING_FILE])
+            self._export(conn,
+                         "SELECT registerno, department, semester, staff, subject, "
+                         f"{', '.join(QUESTION_COLUMNS)}, average FROM ratings ORDER BY rowid",
+                         os.path.join(archive_dir, os.path.basename(RATING_FILE)),
+                         REQUIRED_FILES[RATING_FILE], format_rating)
+            conn.execute("DELETE FROM students")
+            conn.execute("DELETE FROM mappings")
+            # Every class's mappings changed
+            conn.execute("UPDATE mapping_versions SET version = ?", (self._mapping_version(conn) + 1,))
+            conn.execute("DELETE FROM ratings")
@@ -0,0 +1,104 @@
+"""
+Background job handlers for the slow HOD and admin actions.
+"""
+import base64
+import io
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from batch_reports import report_job, report_rows, collect_report_jobs, iter_reports_zip
+from config import HISTORY_DIR, ARCHIVE_NAME_FORMAT
+from history_analytics import history_index
+from jobs import job_handler, JobResult, JobError
+from report_generator import build_feedback_report
+from report_cache import report_cache
+from logs import get_logger
+from roster_import import import_roster, RosterError, ADDED, DUPLICATE, INVALID
+from utils import archive_data, add_students
+
+log = get_logger('tasks')
+
+
+@job_handler('feedback_report')
+def feedback_report_task(progress, department, semester, academic_year):
+    job = report_job(department, semester, report_rows(department, semester), academic_year)
+    if job is None:
+        raise JobError("No rating data found for the selected department and semester.")
+    pdf_content = report_cache.get(job.slice_id, job.content_id)
+    if pdf_content is None:
+        pdf_content = build_feedback_report(**job.report_args)
+        if not pdf_content:
+            raise JobError("PDF file was not generated properly")
+        report_cache.put(job.slice_id, job.content_id, pdf_content)
+    return JobResult("Report generated.", pdf_content, job.filename, 'application/pdf')
+
+
+@job_handler('bulk_reports')
+def bulk_reports_task(progress, academic_year):
+    jobs = collect_report_jobs(academic_year)
+    if not jobs:
+        raise JobError("No rating data found.")
+
+    def report_progress(done, total, job):
+        progress(done / total, f"Generated {done} of {total} reports ({job.department} - {job.semester})")
+
+    data = b''.join(iter_reports_zip(jobs, progress=report_progress))
+    filename = f"feedback_reports_{datetime.now().strftime('%d-%b-%Y--%H-%M-%S')}.zip"
+    return JobResult(f"Generated {len(jobs)} reports.", data, filename, 'application/zip')
+
+
+# Not idempotent: a rerun after the data files were reset would archive the
+# empty files as another term, so an interrupted archive is left to the HOD
+@job_handler('archive', attempts=1)
+def archive_task(progress):
+    timestamp = datetime.now().strftime(ARCHIVE_NAME_FORMAT)
+    archive_dir = os.path.join(HISTORY_DIR, timestamp)
+    os.makedirs(archive_dir, exist_ok=True)
+    progress(0.1, "Archiving data...")
+    archive_data(archive_dir)
+    progress(0.8, "Indexing archived term...")
+    history_index.refresh()
+    return JobResult("Data successfully archived and system reset.")
+
+
+@job_handler('add_students')
+def add_students_task(progress, department, semester, regnos):
+    new_students, duplicates = add_students(department, semester, regnos)
+    if not new_students:
+        raise JobError(f"All the registration numbers already exist for this department and semester: {', '.join(duplicates)}")
+    log.info('students_added', department=department, semester=semester,
+             added=len(new_students), duplicates=len(duplicates))
+    msg = f"Successfully added {len(new_students)} students."
+    if duplicates:
+        msg += f" Registration numbers {', '.join(duplicates)} were skipped as they already exist."
+    return JobResult(msg)
+
+
+@job_handler('import_roster')
+def import_roster_task(progress, filename, roster, department, semester):
+    progress(0.1, "Importing roster...")
+    try:
+        report = import_roster(io.BytesIO(base64.b64decode(roster)), filename,
+                               department=department, semester=semester)
+    except RosterError as e:
+        raise JobError(str(e))
+    except Exception as e:
+        log.error('import_students_failed', exc_info=True, filename=filename, error=str(e))
+        raise JobError("An error occurred while importing the roster. Please check the file and try again.")
+
+    counts = Counter(entry['status'] for entry in report)
+    log.info('roster_imported', filename=filename, rows=len(report),
+             added=counts[ADDED], duplicates=counts[DUPLICATE], invalid=counts[INVALID])
+    if not report:
+        raise JobError("The roster does not list any students.")
+    msg = (f"Added {counts[ADDED]} students. {counts[DUPLICATE]} were already registered "
+           f"and {counts[INVALID]} rows were invalid.")
+    data = json.dumps({
+        'success': counts[ADDED] > 0,
+        'added': counts[ADDED],
+        'duplicates': counts[DUPLICATE],
+        'invalid': counts[INVALID],
+        'rows': report
+    }).encode('utf-8')
+    return JobResult(msg, data, 'roster_import_report.json', 'application/json')
@@ -0,0 +1,43 @@
+"""
+Shared fixtures. The data files are opened by relative path (see config.py),
+so tests that touch them run inside a fresh temporary directory.
+"""
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config import RATING_FILE, REQUIRED_FILES
+
+
+def _invalidate_indexes():
+    from aggregates import rating_aggregates
+    from indexes import student_registry, submission_index, mapping_index
+    for index in (student_registry, submission_index, mapping_index, rating_aggregates):
+        index.invalidate()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """An empty data directory, made the working directory, with every CSV file created."""
+    monkeypatch.chdir(tmp_path)
+    from storage.csv_backend import CsvStorage
+    CsvStorage().initialize()
+    _invalidate_indexes()
+    yield tmp_path
+    _invalidate_indexes()
+
+
+def rating_rows(registerno, subjects=('Maths', 'Physics'), department='CSE', semester='4', score=8):
+    """Rating rows of one submission, one per subject, in the RATING_FILE layout."""
+    rows = []
+    for subject in subjects:
+        row = dict.fromkeys(REQUIRED_FILES[RATING_FILE], '')
+        row.update(registerno=registerno, department=department, semester=semester,
+                   staff=f"Staff {subject}", subject=subject, average=f"{score:.2f}")
+        row.update((f'q{i}', f"{score:.2f}") for i in range(1, 11))
+        rows.append(row)
+    return rows
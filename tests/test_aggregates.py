@@ -0,0 +1,72 @@
+import csv
+import os
+import pytest
+from config import RATING_FILE, REQUIRED_FILES
+from aggregates import RatingAggregates
+from conftest import rating_rows
+
+
+@pytest.fixture
+def paths(tmp_path):
+    ratings = tmp_path / 'ratings.csv'
+    with open(ratings, 'w', newline='', encoding='utf-8') as f:
+        csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE]).writeheader()
+    return str(ratings), str(tmp_path / 'mainrating_state.json')
+
+
+def _write(path, rows):
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE]).writerows(rows)
+
+
+def _by_subject(aggregates, *args):
+    return {row['subject']: row for row in aggregates.summary(*args)}
+
+
+def test_summary_averages_each_group(paths):
+    ratings, checkpoint = paths
+    _write(ratings, rating_rows('1001', score=6) + rating_rows('1002', score=9)
+           + rating_rows('2001', department='ECE', semester='2', subjects=('Circuits',)))
+    aggregates = RatingAggregates(ratings, checkpoint)
+
+    maths = _by_subject(aggregates, 'CSE', 'Semester 4')['Maths']
+    assert maths['count'] == 2
+    assert maths['q_avgs'] == [7.5] * 10
+    assert maths['overall_average'] == 7.5
+    assert list(_by_subject(aggregates, 'ECE', '2')) == ['Circuits']
+    assert len(aggregates.summary()) == 3
+
+
+def test_restart_resumes_from_the_checkpoint(paths):
+    ratings, checkpoint = paths
+    _write(ratings, rating_rows('1001', score=6))
+    aggregates = RatingAggregates(ratings, checkpoint)
+    aggregates.checkpoint()
+    offset = os.path.getsize(ratings)
+    _write(ratings, rating_rows('1002', score=10))
+
+    restored = RatingAggregates(ratings, checkpoint)
+    # Restored from the checkpoint, before reading anything
+    assert restored._offset == offset
+    maths = _by_subject(restored, 'CSE', '4')['Maths']
+    assert maths['count'] == 2
+    assert maths['overall_average'] == 8.0
+    assert restored.summary() == RatingAggregates(ratings, checkpoint + '.fresh').summary()
+
+
+def test_checkpoint_of_a_replaced_file_is_ignored(paths, tmp_path):
+    ratings, checkpoint = paths
+    _write(ratings, rating_rows('1001', score=6))
+    RatingAggregates(ratings, checkpoint).checkpoint()
+
+    # A new term: the archive swaps in a fresh file
+    replacement = tmp_path / 'ratings.csv.tmp'
+    with open(replacement, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE])
+        writer.writeheader()
+        writer.writerows(rating_rows('3001', subjects=('Graphs',), score=4))
+    os.replace(replacement, ratings)
+
+    restored = RatingAggregates(ratings, checkpoint)
+    assert list(_by_subject(restored, 'CSE', '4')) == ['Graphs']
+    assert _by_subject(restored, 'CSE', '4')['Graphs']['overall_average'] == 4.0
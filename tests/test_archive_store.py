@@ -0,0 +1,146 @@
+import glob
+import io
+import os
+import pytest
+import archive_store
+from archive_store import ArchiveError
+
+
+@pytest.fixture
+def history(tmp_path):
+    history_dir = tmp_path / 'history'
+    history_dir.mkdir()
+    return str(history_dir), str(history_dir / 'chunks')
+
+
+def _term(history_dir, name, files):
+    archive_dir = os.path.join(history_dir, name)
+    os.makedirs(archive_dir)
+    for filename, data in files.items():
+        with open(os.path.join(archive_dir, filename), 'wb') as f:
+            f.write(data)
+    return archive_dir
+
+
+def _csv(rows, start=0):
+    """Bytes of a ratings-like CSV; rows=60000 is about 2 MB, two chunks."""
+    lines = [b'registerno,department,semester,staff,subject,average\n']
+    lines += [f"{start + i},CSE,4,Staff {i % 7},Subject {i % 5},{i % 10}.00\n".encode()
+              for i in range(rows)]
+    return b''.join(lines)
+
+
+def _chunk_files(chunk_dir):
+    return set(glob.glob(os.path.join(chunk_dir, '*', '*.zst')))
+
+
+def test_iter_chunks_cuts_after_newlines():
+    data = b''.join(f"line {i}\n".encode() for i in range(1000))
+    chunks = list(archive_store.iter_chunks(io.BytesIO(data), chunk_bytes=100))
+    assert b''.join(chunks) == data
+    assert all(chunk.endswith(b'\n') for chunk in chunks)
+    assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+
+def test_pack_and_restore_round_trip(history, tmp_path):
+    history_dir, chunk_dir = history
+    files = {'ratings.csv': _csv(60000), 'students.csv': _csv(50), 'empty.csv': b''}
+    archive_dir = _term(history_dir, 'term1', files)
+
+    manifest = archive_store.pack(archive_dir, chunk_dir)
+
+    assert os.listdir(archive_dir) == [archive_store.MANIFEST]
+    assert len(manifest['files']['ratings.csv']['chunks']) > 1
+    assert archive_store.list_files(archive_dir) == sorted(files)
+    for name, data in files.items():
+        with archive_store.open_file(archive_dir, name, chunk_dir) as f:
+            assert f.read() == data
+
+    target = tmp_path / 'restored'
+    archive_store.restore(archive_dir, str(target), chunk_dir)
+    for name, data in files.items():
+        assert (target / name).read_bytes() == data
+    assert archive_store.verify(history_dir, chunk_dir) == []
+
+
+def test_pack_refuses_a_packed_archive(history):
+    history_dir, chunk_dir = history
+    archive_dir = _term(history_dir, 'term1', {'ratings.csv': _csv(10)})
+    archive_store.pack(archive_dir, chunk_dir)
+    with pytest.raises(ArchiveError):
+        archive_store.pack(archive_dir, chunk_dir)
+
+
+def test_terms_share_unchanged_and_appended_chunks(history):
+    history_dir, chunk_dir = history
+    ratings = _csv(60000)
+    first = _term(history_dir, 'term1', {'ratings.csv': ratings, 'students.csv': _csv(50)})
+    archive_store.pack(first, chunk_dir)
+    stored = _chunk_files(chunk_dir)
+
+    # Same roster, ratings that only grew
+    appended = _csv(100, start=60000).split(b'\n', 1)[1]
+    second = _term(history_dir, 'term2', {'ratings.csv': ratings + appended, 'students.csv': _csv(50)})
+    manifest = archive_store.pack(second, chunk_dir)
+
+    new_chunks = _chunk_files(chunk_dir) - stored
+    assert len(new_chunks) == 1
+    first_chunks = archive_store.read_manifest(first)['files']['ratings.csv']['chunks']
+    assert manifest['files']['ratings.csv']['chunks'][:-1] == first_chunks[:-1]
+
+
+def test_gc_keeps_chunks_still_in_use(history):
+    history_dir, chunk_dir = history
+    shared = _csv(50)
+    first = _term(history_dir, 'term1', {'students.csv': shared, 'ratings.csv': _csv(20)})
+    second = _term(history_dir, 'term2', {'students.csv': shared, 'ratings.csv': _csv(20, start=500)})
+    archive_store.pack(first, chunk_dir)
+    archive_store.pack(second, chunk_dir)
+    assert archive_store.gc(history_dir, chunk_dir) == 0
+
+    os.remove(os.path.join(first, archive_store.MANIFEST))
+    os.rmdir(first)
+
+    assert archive_store.gc(history_dir, chunk_dir) == 1
+    assert archive_store.verify(history_dir, chunk_dir) == []
+    with archive_store.open_file(second, 'students.csv', chunk_dir) as f:
+        assert f.read() == shared
+
+
+def test_repack_from_source_dir_replaces_the_manifest(history, tmp_path):
+    history_dir, chunk_dir = history
+    archive_dir = _term(history_dir, 'term1', {'ratings.csv': _csv(20)})
+    archive_store.pack(archive_dir, chunk_dir)
+    source = _term(str(tmp_path), 'staging', {'ratings.csv': _csv(20, start=900)})
+
+    archive_store.pack(archive_dir, chunk_dir, source_dir=source)
+
+    assert os.listdir(source) == []
+    with archive_store.open_file(archive_dir, 'ratings.csv', chunk_dir) as f:
+        assert f.read() == _csv(20, start=900)
+    assert archive_store.gc(history_dir, chunk_dir) == 1
+
+
+def test_damaged_chunk_is_reported(history):
+    history_dir, chunk_dir = history
+    archive_dir = _term(history_dir, 'term1', {'ratings.csv': _csv(20)})
+    manifest = archive_store.pack(archive_dir, chunk_dir)
+    digest = manifest['files']['ratings.csv']['chunks'][0][0]
+    other = archive_store.store_file(__file__, chunk_dir)['chunks'][0][0]
+    os.replace(archive_store._chunk_path(other, chunk_dir), archive_store._chunk_path(digest, chunk_dir))
+
+    with pytest.raises(ArchiveError):
+        with archive_store.open_file(archive_dir, 'ratings.csv', chunk_dir) as f:
+            f.read()
+    assert len(archive_store.verify(history_dir, chunk_dir)) == 1
+
+
+def test_unpacked_archives_read_the_same_way(history):
+    history_dir, chunk_dir = history
+    archive_dir = _term(history_dir, 'legacy', {'ratings.csv': _csv(20)})
+    os.makedirs(os.path.join(history_dir, '.encrypting-legacy'))
+
+    assert archive_store.archive_dirs(history_dir) == [archive_dir]
+    assert archive_store.list_files(archive_dir) == ['ratings.csv']
+    with archive_store.open_file(archive_dir, 'ratings.csv', chunk_dir) as f:
+        assert f.read() == _csv(20)
@@ -0,0 +1,46 @@
+import csv
+import io
+import pytest
+import csv_scan
+from csv_scan import ColumnScanner, parse_header
+
+HEADER = ['registerno', 'department', 'semester', 'staff', 'average']
+
+
+def _expected(data, columns):
+    picked = []
+    for fields in csv.reader(io.StringIO(data.decode('utf-8'), newline='')):
+        if fields:
+            picked.append(tuple(fields[HEADER.index(c)] if c in HEADER and HEADER.index(c) < len(fields)
+                                else None for c in columns))
+    return picked
+
+
+def test_header_is_stripped_of_bom_and_spaces():
+    assert parse_header('\ufeffregisterno, department ,semester\r\n'.encode('utf-8')) == [
+        'registerno', 'department', 'semester']
+
+
+def test_columns_missing_from_the_header_or_the_row_are_none():
+    scanner = ColumnScanner(HEADER, ['semester', 'subject', 'registerno'])
+    data = b'1001,CSE,4,A,7.50\n\n1002,ECE\n'
+    assert list(scanner.rows(data)) == [('4', None, '1001'), (None, None, '1002')]
+
+
+@pytest.mark.parametrize('window', [16, 64, 4 * 1024 * 1024])
+def test_rows_match_the_csv_module(monkeypatch, window):
+    monkeypatch.setattr(csv_scan, 'WINDOW_BYTES', window)
+    lines = []
+    for i in range(50):
+        staff = f'"Staff, {i}\nHOD"' if i % 7 == 0 else f'Staff {i}'
+        lines.append(f'{1000 + i},CSE,{i % 8},{staff},{i % 10}.50')
+    data = ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+    for columns in (['registerno'], ['registerno', 'staff', 'average']):
+        assert list(ColumnScanner(HEADER, columns).rows(data)) == _expected(data, columns)
+
+
+def test_rows_between_offsets():
+    scanner = ColumnScanner(HEADER, ['registerno'])
+    data = b'1001,CSE\n1002,CSE\n1003,CSE\n'
+    assert list(scanner.rows(data, start=9, end=18)) == [('1002',)]
@@ -0,0 +1,68 @@
+import csv
+import os
+import pytest
+import encrypt_existing_data
+from encrypt_existing_data import encrypt_csv_file, _iter_blocks
+from regno import encrypt_regno
+
+
+def _write(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['registerno', 'comment'])
+        writer.writerows(rows)
+
+
+def _read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_blocks_are_cut_between_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(encrypt_existing_data, 'BLOCK_BYTES', 8)
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'1,"a\nb\nc"\n2,"say ""hi""\n"\n3,x')
+
+    with open(path, 'rb') as f:
+        blocks = [text for text, _ in _iter_blocks(f, 0)]
+
+    assert blocks == ['1,"a\nb\nc"\n', '2,"say ""hi""\n"\n', '3,x']
+
+
+def test_interrupted_run_resumes(tmp_path, monkeypatch):
+    monkeypatch.setattr(encrypt_existing_data, 'BLOCK_BYTES', 64)
+    path = tmp_path / 'ratings.csv'
+    rows = [[str(1000 + i), f"line one\nline {i}" if i % 3 else 'plain'] for i in range(40)]
+    _write(path, rows)
+
+    encrypt_block = encrypt_existing_data._encrypt_block
+    calls = []
+
+    def failing_block(text, column):
+        calls.append(text)
+        if len(calls) == 3:
+            raise RuntimeError("interrupted")
+        return encrypt_block(text, column)
+
+    monkeypatch.setattr(encrypt_existing_data, '_encrypt_block', failing_block)
+    assert not encrypt_csv_file(str(path), workers=1)
+    assert os.path.exists(f"{path}.encrypting.json")
+    assert _read(path)[1:] == rows
+
+    monkeypatch.setattr(encrypt_existing_data, '_encrypt_block', encrypt_block)
+    assert encrypt_csv_file(str(path), workers=1)
+
+    assert _read(path)[1:] == [[encrypt_regno(regno), comment] for regno, comment in rows]
+    assert not os.path.exists(f"{path}.encrypting")
+    assert not os.path.exists(f"{path}.encrypting.json")
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_hashed_numbers_are_kept(tmp_path, workers):
+    path = tmp_path / 'students.csv'
+    hashed = encrypt_regno('1001')
+    _write(path, [[hashed, 'done'], ['1002', 'new'], ['', 'blank']])
+
+    assert encrypt_csv_file(str(path), workers=workers)
+
+    assert _read(path)[1:] == [[hashed, 'done'], [encrypt_regno('1002'), 'new'], ['', 'blank']]
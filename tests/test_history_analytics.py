@@ -0,0 +1,93 @@
+import csv
+import os
+import archive_store
+from config import HISTORY_DIR, REQUIRED_FILES, RATING_FILE
+from history_analytics import HistoryIndex
+from conftest import rating_rows
+
+
+def _term(name, rows, packed=False):
+    path = os.path.join(HISTORY_DIR, name)
+    os.makedirs(path)
+    with open(os.path.join(path, RATING_FILE), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE])
+        writer.writeheader()
+        writer.writerows(rows)
+    if packed:
+        archive_store.pack(path)
+    return path
+
+
+def _ratings(regnos, score, **kwargs):
+    return [row for regno in regnos for row in rating_rows(regno, score=score, **kwargs)]
+
+
+def test_trend_sums_each_term(data_dir):
+    _term('01-Jan-2025--10-00-00', _ratings(['1001', '1002'], 6) + _ratings(['1003'], 9, department='ECE'))
+    _term('01-Jul-2025--10-00-00', _ratings(['1004'], 8), packed=True)
+    index = HistoryIndex()
+
+    assert index.refresh() == 2
+    assert [name for name, _ in index.terms()] == ['01-Jan-2025--10-00-00', '01-Jul-2025--10-00-00']
+    points = index.trend(department=' CSE ', staff='Staff Maths')
+    assert [(point.term, point.sketch.count) for point in points] == [
+        ('01-Jan-2025--10-00-00', 2), ('01-Jul-2025--10-00-00', 1)]
+    assert [point.sketch.q_avgs() for point in points] == [[6.0] * 10, [8.0] * 10]
+    assert [point.sketch.count for point in index.subject_trend('Physics')] == [3, 1]
+    assert index.trend(staff='Nobody') == []
+
+
+def test_queries_do_not_rescan_the_archives(data_dir, monkeypatch):
+    _term('01-Jan-2025--10-00-00', _ratings(['1001'], 6))
+    index = HistoryIndex()
+    index.refresh()
+    _term('01-Jul-2025--10-00-00', _ratings(['1002'], 8))
+
+    def rescan(*args, **kwargs):
+        raise AssertionError("archives listed by a query")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(archive_store, 'archive_dirs', rescan)
+        assert len(index.terms()) == 1
+        assert len(index.trend(department='CSE')) == 1
+
+    assert index.refresh() == 1
+    assert len(index.trend(department='CSE')) == 2
+
+
+def test_a_changed_archive_is_indexed_again(data_dir):
+    path = _term('01-Jan-2025--10-00-00', _ratings(['1001'], 6))
+    index = HistoryIndex()
+    index.refresh()
+
+    with open(os.path.join(path, RATING_FILE), 'a', newline='', encoding='utf-8') as f:
+        csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE]).writerows(_ratings(['1002'], 8))
+
+    assert index.refresh() == 1
+    assert index.trend(staff='Staff Maths')[0].sketch.count == 2
+    assert index.refresh() == 0
+
+
+def test_terms_indexed_by_another_process_are_loaded_not_redone(data_dir, monkeypatch):
+    _term('01-Jan-2025--10-00-00', _ratings(['1001'], 6))
+    first, second = HistoryIndex(), HistoryIndex()
+    first.refresh()
+    second.refresh()
+    _term('01-Jul-2025--10-00-00', _ratings(['1002'], 8))
+
+    assert first.refresh() == 1
+
+    def index_term(name, signature):
+        raise AssertionError(f"{name} indexed twice")
+
+    monkeypatch.setattr(second, '_index_term', index_term)
+    assert second.refresh() == 0
+    assert [point.sketch.count for point in second.trend(staff='Staff Maths')] == [1, 1]
+
+
+def test_rebuild_ignores_the_saved_index(data_dir):
+    _term('01-Jan-2025--10-00-00', _ratings(['1001'], 6))
+    HistoryIndex().refresh()
+
+    assert HistoryIndex().rebuild() == 1
+    assert HistoryIndex().refresh() == 0
@@ -0,0 +1,151 @@
+import os
+from config import RATING_FILE, STUDENT_FILE
+from indexes import SubmissionIndex, StudentRegistry
+from regno import encrypt_regno
+from conftest import rating_rows
+
+STUDENT_HEADER = 'registerno,department,semester\n'
+RATING_HEADER = 'registerno,department,semester,staff,subject,q1,q2,q3,q4,q5,q6,q7,q8,q9,q10,average\n'
+
+
+def _append(path, text):
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_student_lookup_normalizes_and_matches_hashes(tmp_path):
+    path = tmp_path / 'students.csv'
+    path.write_text(STUDENT_HEADER + '00101,CSE,4\n'
+                    f"{encrypt_regno('202')},ECE,2\n", newline='')
+    registry = StudentRegistry(str(path))
+
+    assert registry.lookup('101')['department'] == 'CSE'
+    assert registry.lookup('0202')['department'] == 'ECE'
+    assert registry.lookup('303') is None
+
+    _append(path, '303,MECH,6\n')
+    assert registry.lookup('303')['semester'] == '6'
+
+
+def test_first_registration_wins(tmp_path):
+    path = tmp_path / 'students.csv'
+    path.write_text(STUDENT_HEADER + '101,CSE,4\n101,ECE,2\n', newline='')
+    assert StudentRegistry(str(path)).lookup('101')['department'] == 'CSE'
+
+
+def _line(registerno):
+    return f"{registerno},CSE,4,Staff,Maths,8,8,8,8,8,8,8,8,8,8,8.00\n"
+
+
+def test_appended_rows_are_tailed(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER + _line('1001'), newline='')
+    index = SubmissionIndex(str(path))
+    assert index.contains('1001')
+    offset = index._offset
+
+    _append(path, _line('1002'))
+    assert index.contains('1002')
+    # Only the new line was read
+    assert index._offset == offset + len(_line('1002'))
+
+
+def test_partial_line_waits_for_its_newline(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER, newline='')
+    index = SubmissionIndex(str(path))
+
+    _append(path, _line('1003').rstrip('\n'))
+    assert not index.contains('1003')
+    _append(path, '\n')
+    assert index.contains('1003')
+
+
+def test_replaced_file_is_reindexed(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER + _line('1001') + _line('1002'), newline='')
+    index = SubmissionIndex(str(path))
+    assert index.contains('1001')
+
+    # Reset the way an archive does: a header-only file swapped in
+    temp = tmp_path / 'ratings.csv.tmp'
+    temp.write_text(RATING_HEADER, newline='')
+    os.replace(temp, path)
+    assert not index.contains('1001')
+
+    _append(path, _line('1004'))
+    assert index.contains('1004')
+    assert not index.contains('1002')
+
+
+def test_file_rewritten_in_place_is_reindexed(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER + _line('1001'), newline='')
+    index = SubmissionIndex(str(path))
+    assert index.contains('1001')
+    inode = os.stat(path).st_ino
+
+    # Same inode and at least as long, so only the guard bytes can tell
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(RATING_HEADER + _line('2001') + _line('2002'))
+    assert os.stat(path).st_ino == inode
+    assert not index.contains('1001')
+    assert index.contains('2001') and index.contains('2002')
+
+
+def test_truncated_file_is_reindexed(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER + _line('1001') + _line('1002'), newline='')
+    index = SubmissionIndex(str(path))
+    assert index.contains('1002')
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write(RATING_HEADER)
+    assert not index.contains('1001')
+    assert not index.contains('1002')
+
+
+def test_encrypted_rows_match_plain_lookups(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    path.write_text(RATING_HEADER + _line(encrypt_regno('1005')), newline='')
+    index = SubmissionIndex(str(path))
+    assert index.contains('1005')
+    assert index.contains('01005')
+
+
+def test_indexes_follow_an_archive_reset(data_dir):
+    from storage.csv_backend import CsvStorage
+    storage = CsvStorage()
+    storage.import_students([('5001', 'CSE', '4')])
+    assert storage.submit_ratings('5001', rating_rows('5001'))
+    assert storage.get_student('5001') is not None
+    assert storage.has_submitted('5001')
+
+    archive_dir = data_dir / 'archive'
+    archive_dir.mkdir()
+    storage.archive(str(archive_dir))
+
+    assert storage.get_student('5001') is None
+    assert not storage.has_submitted('5001')
+    assert (archive_dir / os.path.basename(RATING_FILE)).read_text().count('5001') == 2
+    assert '5001' in (archive_dir / os.path.basename(STUDENT_FILE)).read_text()
+
+    # The next term starts from the header-only files
+    storage.import_students([('5001', 'CSE', '5')])
+    assert storage.submit_ratings('5001', rating_rows('5001', semester='5'))
+    assert storage.get_student('5001')['semester'] == '5'
+    assert storage.has_submitted('5001')
+
+
+def test_batch_summary_counts_hashed_rows(tmp_path):
+    path = tmp_path / 'students.csv'
+    path.write_text(STUDENT_HEADER + '100,CSE,4\n150,CSE,4\n'
+                    f"{encrypt_regno('400')},CSE,4\n"
+                    f"{encrypt_regno('7')},ECE,2\n", newline='')
+    registry = StudentRegistry(str(path))
+
+    batch = registry.batch_summary('CSE', '4')
+    assert (batch.count, batch.min_regno, batch.max_regno, batch.span) == (3, 100, 150, 50)
+    batch = registry.batch_summary('ECE', '2')
+    assert (batch.count, batch.min_regno, batch.span) == (1, None, 0)
+    assert registry.lookup('7')['department'] == 'ECE'
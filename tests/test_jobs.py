@@ -0,0 +1,116 @@
+import pytest
+from jobs import JobQueue, JobResult, JobError, job_handler, MAX_ATTEMPTS, QUEUED, RUNNING, DONE, FAILED
+
+# Set by test_progress_renews_the_lease for lease_task
+running = {}
+
+
+@job_handler('test_echo')
+def echo_task(progress, text):
+    progress(0.5, "Halfway")
+    return JobResult("Echoed.", text.encode(), 'echo.txt', 'text/plain')
+
+
+@job_handler('test_refuse')
+def refuse_task(progress):
+    raise JobError("Nothing to do.")
+
+
+@job_handler('test_crash')
+def crash_task(progress):
+    raise KeyError('boom')
+
+
+@job_handler('test_lease')
+def lease_task(progress):
+    queue = running['queue']
+    # Let the lease run out, then report progress
+    queue.connection().execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (running['job_id'],))
+    progress(0.5, "Still working")
+    running['claimed_by_another'] = queue._claim() is not None
+    return JobResult("Done.")
+
+
+@job_handler('test_once', attempts=1)
+def once_task(progress):
+    return JobResult("Done.")
+
+
+def _queue(tmp_path, lease_seconds=60):
+    # No worker threads: the tests claim and run jobs themselves
+    return JobQueue(str(tmp_path / 'jobs.db'), workers=0, lease_seconds=lease_seconds)
+
+
+def _run_next(queue):
+    job = queue._claim()
+    if job is not None:
+        queue._execute(*job)
+    return job
+
+
+def test_job_runs_and_keeps_its_result(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue('test_echo', text='hello')
+    assert queue.status(job_id)['status'] == QUEUED
+    assert queue.result(job_id) is None
+
+    assert _run_next(queue)[0] == job_id
+
+    status = queue.status(job_id)
+    assert (status['status'], status['progress'], status['message']) == (DONE, 1.0, "Echoed.")
+    assert status['has_result']
+    assert queue.result(job_id) == (b'hello', 'echo.txt', 'text/plain')
+    assert _run_next(queue) is None
+
+
+def test_failures_keep_a_message_for_the_user(tmp_path):
+    queue = _queue(tmp_path)
+    refused = queue.enqueue('test_refuse')
+    crashed = queue.enqueue('test_crash')
+    _run_next(queue)
+    _run_next(queue)
+
+    assert (queue.status(refused)['status'], queue.status(refused)['message']) == (FAILED, "Nothing to do.")
+    assert queue.status(crashed)['status'] == FAILED
+    assert queue.status(crashed)['message'].startswith("Job failed:")
+    assert queue.result(refused) is None
+
+
+def test_unknown_kinds_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        _queue(tmp_path).enqueue('no_such_job')
+
+
+def test_expired_lease_is_retried_up_to_the_limit(tmp_path):
+    # Every lease has already run out, as if each worker died mid-job
+    queue = _queue(tmp_path, lease_seconds=-1)
+    job_id = queue.enqueue('test_echo', text='again')
+
+    for _ in range(MAX_ATTEMPTS):
+        assert queue._claim()[0] == job_id
+        assert queue.status(job_id)['status'] == RUNNING
+
+    assert queue._claim() is None
+    status = queue.status(job_id)
+    assert status['status'] == FAILED
+    assert "interrupted" in status['message']
+
+
+def test_progress_renews_the_lease(tmp_path):
+    queue = _queue(tmp_path)
+    running.update(queue=queue, job_id=queue.enqueue('test_lease'))
+
+    _run_next(queue)
+
+    assert running['claimed_by_another'] is False
+    assert queue.status(running['job_id'])['status'] == DONE
+
+
+def test_single_attempt_jobs_are_not_restarted(tmp_path):
+    queue = _queue(tmp_path, lease_seconds=-1)
+    job_id = queue.enqueue('test_once')
+    assert queue._claim()[0] == job_id
+
+    assert queue._claim() is None
+    status = queue.status(job_id)
+    assert (status['status'], status['message']) == (FAILED, "The job was interrupted and was not restarted.")
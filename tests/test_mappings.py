@@ -0,0 +1,82 @@
+import pytest
+
+
+def _mappings(department, semester, pairs):
+    return [{'department': department, 'semester': semester, 'staff': staff, 'subject': subject}
+            for staff, subject in pairs]
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def storage(request, data_dir):
+    if request.param == 'csv':
+        from storage.csv_backend import CsvStorage
+        backend = CsvStorage()
+    else:
+        from storage.sqlite_backend import SqliteStorage
+        backend = SqliteStorage(str(data_dir / 'feedback.db'))
+    backend.initialize()
+    return backend
+
+
+def test_replace_reports_the_diff_and_bumps_the_version(storage):
+    first = storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('A', 'Maths'), ('B', 'Physics')]))
+    assert first.changed
+    assert first.added == [('A', 'Maths'), ('B', 'Physics')] and first.removed == []
+    assert first.version == 1
+
+    second = storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('A', 'Maths'), ('C', 'Chemistry')]))
+    assert second.changed
+    assert second.added == [('C', 'Chemistry')] and second.removed == [('B', 'Physics')]
+    assert second.version == 2
+    assert storage.mapping_version('CSE', '4') == 2
+    assert storage.mapping_version() == 2
+
+
+def test_unchanged_replace_keeps_the_version(storage):
+    mappings = _mappings('CSE', '4', [('A', 'Maths'), ('B', 'Physics')])
+    storage.replace_mappings('CSE', '4', mappings)
+
+    again = storage.replace_mappings('CSE', '4', mappings)
+    assert not again.changed
+    assert again.added == [] and again.removed == []
+    assert again.version == 1
+    assert storage.mapping_version() == 1
+
+
+def test_reordering_is_a_change(storage):
+    storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('A', 'Maths'), ('B', 'Physics')]))
+
+    change = storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('B', 'Physics'), ('A', 'Maths')]))
+    assert change.changed
+    assert change.added == [] and change.removed == []
+    assert [row['subject'] for row in storage.get_mappings('CSE', '4')] == ['Physics', 'Maths']
+
+
+def test_other_classes_are_kept(storage):
+    storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('A', 'Maths')]))
+    storage.replace_mappings('ECE', '2', _mappings('ECE', '2', [('D', 'Circuits')]))
+    storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('E', 'Graphs')]))
+
+    assert [row['staff'] for row in storage.get_mappings('CSE', '4')] == ['E']
+    assert [row['staff'] for row in storage.get_mappings('ECE', '2')] == ['D']
+    assert storage.mapping_version('ECE', '2') == 2
+    assert storage.mapping_version('CSE', '4') == 3
+
+
+def test_semester_prefix_is_the_same_class(storage):
+    storage.replace_mappings('CSE', 'Semester 4', _mappings('CSE', '4', [('A', 'Maths')]))
+
+    assert [row['staff'] for row in storage.get_mappings(' CSE ', '4')] == ['A']
+    assert storage.mapping_version('CSE', 'semester 4') == 1
+
+
+def test_archive_bumps_every_class_version(storage, data_dir):
+    storage.replace_mappings('CSE', '4', _mappings('CSE', '4', [('A', 'Maths')]))
+    storage.replace_mappings('ECE', '2', _mappings('ECE', '2', [('D', 'Circuits')]))
+    archive_dir = data_dir / 'archive'
+    archive_dir.mkdir()
+
+    storage.archive(str(archive_dir))
+
+    assert storage.get_mappings('CSE', '4') == []
+    assert storage.mapping_version('CSE', '4') == storage.mapping_version('ECE', '2') == 3
@@ -0,0 +1,56 @@
+import csv
+import pytest
+from config import ADMIN_MAPPING_FILE, RATING_FILE, REQUIRED_FILES
+from storage.migrate import migrate_csv_to_sqlite, MigrationError
+from storage.sqlite_backend import SqliteStorage
+from conftest import rating_rows
+
+
+def _write_ratings(rows):
+    with open(RATING_FILE, 'a', newline='', encoding='utf-8') as f:
+        csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE]).writerows(rows)
+
+
+def _count(store, table):
+    return store.connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_second_import_is_refused_without_replace(data_dir):
+    _write_ratings(rating_rows('1001'))
+    db_path = str(data_dir / 'feedback.db')
+    assert migrate_csv_to_sqlite(db_path)['ratings'] == 2
+
+    with pytest.raises(MigrationError):
+        migrate_csv_to_sqlite(db_path)
+    store = SqliteStorage(db_path)
+    assert _count(store, 'ratings') == 2
+
+    migrate_csv_to_sqlite(db_path, replace=True)
+    assert _count(store, 'ratings') == 2
+    assert store.has_submitted('1001')
+
+
+def test_ragged_rows_do_not_abort_the_import(data_dir):
+    _write_ratings(rating_rows('1001', subjects=('Maths',)))
+    with open(RATING_FILE, 'a', encoding='utf-8') as f:
+        f.write('1002,CSE\n')
+    with open(ADMIN_MAPPING_FILE, 'a', encoding='utf-8') as f:
+        f.write('CSE,4,Staff A\n')
+
+    counts = migrate_csv_to_sqlite(str(data_dir / 'feedback.db'))
+
+    assert (counts['ratings'], counts['mappings']) == (2, 1)
+
+
+def test_replace_clears_version_history(data_dir):
+    db_path = str(data_dir / 'feedback.db')
+    store = SqliteStorage(db_path)
+    store.initialize()
+    store.replace_mappings('CSE', '4', [{'department': 'CSE', 'semester': '4',
+                                         'staff': 'A', 'subject': 'Maths'}])
+    assert store.mapping_version('CSE', '4') == 1
+
+    migrate_csv_to_sqlite(db_path, replace=True)
+
+    assert store.mapping_version('CSE', '4') == 0
+    assert store.get_mappings('CSE', '4') == []
@@ -0,0 +1,71 @@
+import json
+import random
+import statistics
+import pytest
+from rating_sketch import RatingSketch, histogram_median, QUESTIONS
+
+
+def _rows(count, seed):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        scores = [str(rng.randint(1, 10)) if rng.random() > 0.1 else '' for _ in range(QUESTIONS)]
+        rows.append((scores, rng.uniform(1, 10)))
+    return rows
+
+
+def _sketch(rows):
+    sketch = RatingSketch()
+    for scores, average in rows:
+        sketch.add_scores(scores)
+        sketch.add_average(average)
+    return sketch
+
+
+def test_merged_sketches_equal_one_sketch_over_all_rows():
+    rows = _rows(300, seed=1)
+    parts = [_sketch(rows[:40]), _sketch(rows[40:41]), _sketch([]), _sketch(rows[41:])]
+
+    merged = RatingSketch.merged(parts)
+    whole = _sketch(rows)
+
+    assert (merged.count, merged.q_counts, merged.histogram) == (whole.count, whole.q_counts, whole.histogram)
+    assert merged.overall_average() == pytest.approx(whole.overall_average())
+    assert merged.q_avgs() == pytest.approx(whole.q_avgs())
+    for got, want in zip(merged.question_stats() + [merged.pooled_stats()],
+                         whole.question_stats() + [whole.pooled_stats()]):
+        assert (got.count, got.median, got.histogram) == (want.count, want.median, want.histogram)
+        assert (got.mean, got.std) == (pytest.approx(want.mean), pytest.approx(want.std))
+    # merged() builds a new sketch and leaves the parts alone
+    assert parts[0].count == 40
+
+
+def test_stats_match_the_statistics_module():
+    rows = _rows(101, seed=2)
+    stats = _sketch(rows).question_stats()
+
+    for question, got in enumerate(stats):
+        scores = [float(r[0][question]) for r in rows if r[0][question]]
+        assert got.count == len(scores)
+        assert got.mean == pytest.approx(statistics.fmean(scores))
+        assert got.std == pytest.approx(statistics.pstdev(scores))
+        assert got.median == statistics.median(scores)
+
+
+def test_invalid_scores_are_skipped_and_state_round_trips():
+    sketch = RatingSketch()
+    sketch.add_scores(['7.00', None, 'abc', 'nan', 'inf', '', '10.00', '0.4', '12', '5'])
+    sketch.add_average(6.5)
+
+    restored = RatingSketch.from_state(json.loads(json.dumps(sketch.to_state())))
+
+    assert restored.q_counts == [1, 0, 0, 0, 0, 0, 1, 1, 1, 1]
+    assert [restored.histogram[q].index(1) + 1 for q in (0, 6, 7, 8)] == [7, 10, 1, 10]
+    assert restored.question_stats()[1].mean is None
+    assert restored.overall_average() == 6.5
+
+
+def test_histogram_median():
+    assert histogram_median([0] * 10) is None
+    assert histogram_median([1, 0, 0, 1, 0, 0, 0, 0, 0, 0]) == 2.5
+    assert histogram_median([0, 0, 3, 0, 0, 0, 0, 0, 0, 1]) == 3
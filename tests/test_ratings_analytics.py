@@ -0,0 +1,80 @@
+import csv
+import os
+import pytest
+import ratings_analytics
+import utils
+from config import RATING_FILE, REQUIRED_FILES, MAINRATING_FILE
+from storage.csv_backend import CsvStorage
+from storage.sqlite_backend import SqliteStorage, INSERT_RATING, rating_params
+from conftest import rating_rows
+
+
+def _rows():
+    """Ratings with the irregularities real files have."""
+    rows = []
+    for i in range(40):
+        subjects = ('Maths', 'Physics', ' Maths ') if i % 4 else ('Chemistry',)
+        rows += rating_rows(str(1000 + i), subjects=subjects, score=i % 10 + 1,
+                            semester='4' if i % 3 else ' 4')
+    rows[3]['q2'] = ''
+    rows[5]['q7'] = 'n/a'
+    rows[8]['average'] = ''
+    rows[13]['q1'] = '7.25'
+    rows += rating_rows('2001', department='ECE', semester='Semester 2', subjects=('Circuits',))
+    return rows
+
+
+def _by_key(aggregated):
+    return {(row['department'], row['semester'], row['staff'], row['subject']): row
+            for row in aggregated}
+
+
+def _assert_same(vectorized, storage):
+    vectorized, storage = _by_key(vectorized), _by_key(storage)
+    assert list(vectorized) == list(storage)
+    for key, row in storage.items():
+        assert vectorized[key]['count'] == row['count']
+        assert vectorized[key]['q_avgs'] == pytest.approx(row['q_avgs'])
+        assert vectorized[key]['overall_average'] == pytest.approx(row['overall_average'])
+
+
+@pytest.fixture
+def ratings(data_dir):
+    rows = _rows()
+    with open(RATING_FILE, 'a', newline='', encoding='utf-8') as f:
+        csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE]).writerows(rows)
+    return rows
+
+
+def test_vectorized_engine_matches_the_csv_aggregates(ratings):
+    statistics = ratings_analytics.group_statistics(ratings_analytics.load_ratings(RATING_FILE))
+
+    _assert_same(statistics.rows(), CsvStorage().aggregate_ratings())
+    storage_sketches = _by_key(CsvStorage().rating_statistics())
+    for g, key in enumerate(statistics.keys):
+        expected = storage_sketches[key]['sketch']
+        sketch = statistics.sketch(g)
+        assert sketch.histogram == expected.histogram
+        assert sketch.q_counts == expected.q_counts
+        assert sketch.q_sumsq == pytest.approx(expected.q_sumsq)
+
+
+def test_vectorized_engine_matches_the_sqlite_aggregates(ratings, data_dir):
+    store = SqliteStorage(str(data_dir / 'feedback.db'))
+    store.initialize()
+    with store.transaction() as conn:
+        conn.executemany(INSERT_RATING, [rating_params(row) for row in ratings])
+
+    matrix = ratings_analytics.load_ratings_from_db(store.connection())
+
+    _assert_same(ratings_analytics.group_statistics(matrix).rows(), store.aggregate_ratings())
+
+
+def test_missing_ratings_file_writes_an_empty_mainrating(data_dir, monkeypatch):
+    monkeypatch.setattr(utils, 'AGGREGATION_ENGINE', 'vectorized')
+    os.remove(RATING_FILE)
+
+    utils.update_mainratings()
+
+    with open(MAINRATING_FILE, newline='', encoding='utf-8') as f:
+        assert list(csv.DictReader(f)) == []
@@ -0,0 +1,67 @@
+import csv
+import pytest
+from config import REQUIRED_FILES, RATING_FILE
+from ratings_log import RatingsLog, RatingsLogError, build_from_csv, HEADER, RECORD_DTYPE
+from regno import encrypt_regno
+from conftest import rating_rows
+
+
+def _row(registerno, subject='Maths', score='7.5', average='7.50'):
+    row = rating_rows(registerno, subjects=(subject,))[0]
+    row.update({f'q{i}': score for i in range(1, 11)}, average=average)
+    return row
+
+
+def test_rows_round_trip_through_the_log(tmp_path):
+    log = RatingsLog(str(tmp_path / 'ratings.log'))
+    log.append([_row('1001'), _row('1002', subject='Physics', score='10', average='10.00')])
+    log.append([_row('1003', score='', average='')])
+
+    rows = list(log.iter_rows())
+
+    assert [row['registerno'] for row in rows] == [encrypt_regno(r) for r in ('1001', '1002', '1003')]
+    assert [row['subject'] for row in rows] == ['Maths', 'Physics', 'Maths']
+    assert (rows[0]['q1'], rows[0]['average']) == ('7.50', '7.50')
+    assert (rows[1]['q10'], rows[1]['average']) == ('10.00', '10.00')
+    assert (rows[2]['q5'], rows[2]['average']) == ('', '')
+    assert log.keys().count('Maths') == 1
+
+
+def test_a_torn_record_is_ignored_and_then_replaced(tmp_path):
+    path = tmp_path / 'ratings.log'
+    log = RatingsLog(str(path))
+    log.append([_row('1001')])
+    with open(path, 'ab') as f:
+        f.write(b'\0' * 10)
+    assert len(log.scan()) == 1
+
+    log.append([_row('1002')])
+    assert path.stat().st_size == HEADER.size + 2 * RECORD_DTYPE.itemsize
+    assert [row['registerno'] for row in log.iter_rows()] == [encrypt_regno('1001'), encrypt_regno('1002')]
+
+
+def test_other_files_are_refused(tmp_path):
+    path = tmp_path / 'ratings.log'
+    path.write_bytes(b'not a ratings log at all')
+    with pytest.raises(RatingsLogError):
+        RatingsLog(str(path)).scan()
+
+
+def test_build_and_export_match_the_csv(tmp_path):
+    csv_path = tmp_path / 'ratings.csv'
+    rows = [_row(str(1000 + i), subject=f'Subject {i % 3}', score=str(i % 10 + 1),
+                 average=f'{i % 10 + 1:.2f}') for i in range(25)]
+    for row in rows:
+        row['registerno'] = encrypt_regno(row['registerno'])
+        row.update((f'q{i}', f"{float(row[f'q{i}']):.2f}") for i in range(1, 11))
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REQUIRED_FILES[RATING_FILE])
+        writer.writeheader()
+        writer.writerows(rows)
+
+    log_path = str(tmp_path / 'ratings.log')
+    assert build_from_csv(str(csv_path), log_path) == 25
+    export_path = tmp_path / 'export.csv'
+    assert RatingsLog(log_path).export_csv(str(export_path)) == 25
+
+    assert export_path.read_text(encoding='utf-8') == csv_path.read_text(encoding='utf-8')
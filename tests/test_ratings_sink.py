@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import threading
+from config import RATING_FILE, REQUIRED_FILES
+from indexes import SubmissionIndex
+from ratings_sink import RatingsSink
+from conftest import rating_rows
+
+
+def _sink(path):
+    index = SubmissionIndex(str(path))
+    return RatingsSink(str(path), REQUIRED_FILES[RATING_FILE], index), index
+
+
+def _rows_on_disk(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _run_together(count, target):
+    """Run target(i) on count threads released at the same moment; return the results."""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_racing_duplicate_submissions_are_written_once(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    sink, _ = _sink(path)
+
+    results = _run_together(20, lambda i: sink.submit('1001', rating_rows('1001', score=i % 10 + 1)))
+
+    assert results.count(True) == 1
+    rows = _rows_on_disk(path)
+    assert len(rows) == 2
+    assert {row['registerno'] for row in rows} == {'1001'}
+
+
+def test_concurrent_submissions_are_all_committed(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    sink, index = _sink(path)
+
+    results = _run_together(50, lambda i: sink.submit(str(2000 + i), rating_rows(str(2000 + i))))
+
+    assert all(results)
+    rows = _rows_on_disk(path)
+    assert len(rows) == 100
+    assert {row['registerno'] for row in rows} == {str(2000 + i) for i in range(50)}
+    assert all(index.contains(str(2000 + i)) for i in range(50))
+
+
+def test_rows_appended_by_another_process_block_a_resubmission(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    # Written by another process: this sink's index has never seen it
+    other, _ = _sink(path)
+    assert other.submit('0042', rating_rows('0042'))
+
+    sink, _ = _sink(path)
+    assert not sink.submit('42', rating_rows('42'))
+    assert len(_rows_on_disk(path)) == 2
+
+
+def test_submit_async_accepts_only_the_first(tmp_path):
+    path = tmp_path / 'ratings.csv'
+    sink, _ = _sink(path)
+
+    async def submit_all():
+        return await asyncio.gather(*(sink.submit_async('3003', rating_rows('3003'))
+                                      for _ in range(10)))
+
+    results = asyncio.run(submit_all())
+    assert results.count(True) == 1
+    assert len(_rows_on_disk(path)) == 2
+
+
+def test_storage_submit_ratings_checks_and_appends_atomically(data_dir):
+    from storage.csv_backend import CsvStorage
+    storage = CsvStorage()
+
+    results = _run_together(10, lambda i: storage.submit_ratings('4004', rating_rows('4004')))
+
+    assert results.count(True) == 1
+    assert storage.has_submitted('4004')
+    assert len(_rows_on_disk(data_dir / RATING_FILE)) == 2
@@ -0,0 +1,63 @@
+import os
+import pytest
+from batch_reports import report_job, report_rows
+from report_cache import ReportCache
+from storage.csv_backend import CsvStorage
+from conftest import rating_rows
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReportCache(str(tmp_path / 'report_cache'), max_bytes=250)
+
+
+def _age(cache, slice_id, content_id, mtime):
+    os.utime(cache._path(slice_id, content_id), (mtime, mtime))
+
+
+def test_content_id_hashes_the_report_data():
+    args = {'branch': 'CSE', 'semester': '4', 'feedback_data': {'A_Maths': {'scores': [8.0] * 10}}}
+    reordered = {'feedback_data': {'A_Maths': {'scores': [8.0] * 10}}, 'semester': '4', 'branch': 'CSE'}
+    changed = {'branch': 'CSE', 'semester': '4', 'feedback_data': {'A_Maths': {'scores': [8.0] * 9 + [7.5]}}}
+
+    assert ReportCache.content_id(args) == ReportCache.content_id(reordered)
+    assert ReportCache.content_id(args) != ReportCache.content_id(changed)
+    assert ReportCache.slice_id('CSE', '4') != ReportCache.slice_id('CSE', '5')
+
+
+def test_a_new_rating_changes_the_report_key(data_dir):
+    storage = CsvStorage()
+    storage.submit_ratings('1001', rating_rows('1001', score=8))
+    before = report_job('CSE', '4', report_rows('CSE', '4'))
+
+    storage.submit_ratings('1002', rating_rows('1002', score=5))
+    after = report_job('CSE', '4', report_rows('CSE', '4'))
+
+    assert after.slice_id == before.slice_id
+    assert after.content_id != before.content_id
+    assert report_job('CSE', '4', report_rows('CSE', '4')).content_id == after.content_id
+
+
+def test_new_content_replaces_the_slice_report(cache):
+    cache.put('cse4', 'old', b'old pdf')
+    assert cache.get('cse4', 'old') == b'old pdf'
+
+    cache.put('cse4', 'new', b'new pdf')
+
+    assert cache.get('cse4', 'old') is None
+    assert cache.get('cse4', 'new') == b'new pdf'
+
+
+def test_least_recently_used_reports_are_evicted(cache):
+    for i, name in enumerate(['a', 'b', 'c']):
+        cache.put(name, 'x', bytes(100))
+        _age(cache, name, 'x', 1000 + i)
+    # c pushed the directory over 250 bytes and a was the oldest
+    assert cache.get('a', 'x') is None
+
+    # Reading b makes c the least recently used
+    assert cache.get('b', 'x') is not None
+    cache.put('d', 'x', bytes(100))
+
+    assert cache.get('c', 'x') is None
+    assert cache.get('b', 'x') is not None and cache.get('d', 'x') is not None
@@ -0,0 +1,113 @@
+import io
+import zipfile
+import pytest
+from config import DEPARTMENTS_FILE, SEMESTERS_FILE
+from roster_import import (
+    import_roster, iter_csv_rows, iter_xlsx_rows, iter_roster_rows, RosterError,
+    ADDED, DUPLICATE, INVALID
+)
+
+NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def _xlsx(rows):
+    """
+    A minimal workbook. rows holds lists of cells: str cells become shared
+    strings, int and float cells numbers, None is left out.
+    """
+    shared = []
+    sheet_rows = []
+    for r, row in enumerate(rows, start=1):
+        cells = []
+        for c, value in enumerate(row):
+            ref = f"{chr(ord('A') + c)}{r}"
+            if value is None:
+                continue
+            if isinstance(value, str):
+                shared.append(value)
+                cells.append(f'<c r="{ref}" t="s"><v>{len(shared) - 1}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        sheet_rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('xl/workbook.xml',
+                         f'<workbook xmlns="{NS}" xmlns:r="{REL_NS}"><sheets>'
+                         '<sheet name="Roster" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        archive.writestr('xl/_rels/workbook.xml.rels',
+                         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Target="worksheets/roster.xml"/></Relationships>')
+        archive.writestr('xl/sharedStrings.xml',
+                         f'<sst xmlns="{NS}">' + ''.join(f'<si><t>{s}</t></si>' for s in shared) + '</sst>')
+        archive.writestr('xl/worksheets/roster.xml',
+                         f'<worksheet xmlns="{NS}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+    buffer.seek(0)
+    return buffer
+
+
+def _reference_lists(departments, semesters):
+    for path, values in ((DEPARTMENTS_FILE, departments), (SEMESTERS_FILE, semesters)):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(''.join(f"{value}\n" for value in values))
+
+
+def test_csv_rows_keep_line_numbers_and_quoting():
+    data = '\ufeffregisterno,department\r\n1001,"CSE, Day"\r\n\r\n1002,ECE\r\n'.encode('utf-8')
+    rows = list(iter_csv_rows(io.BytesIO(data)))
+    assert rows == [(1, ['registerno', 'department']), (2, ['1001', 'CSE, Day']),
+                    (3, []), (4, ['1002', 'ECE'])]
+
+
+def test_csv_must_be_utf8():
+    with pytest.raises(RosterError):
+        list(iter_csv_rows(io.BytesIO(b'registerno\n\xff\xfe\n')))
+
+
+def test_xlsx_rows_follow_the_workbook_relationship():
+    stream = _xlsx([['Reg No', 'Dept'], [9.22523244001e11, 'CSE'], [None, 'ECE'], [1003, None]])
+    assert list(iter_xlsx_rows(stream)) == [
+        (1, ['Reg No', 'Dept']),
+        (2, ['922523244001', 'CSE']),
+        (3, ['', 'ECE']),
+        (4, ['1003']),
+    ]
+
+
+def test_unreadable_uploads_are_roster_errors():
+    with pytest.raises(RosterError):
+        list(iter_xlsx_rows(io.BytesIO(b'not a zip')))
+    with pytest.raises(RosterError):
+        iter_roster_rows(io.BytesIO(b''), 'roster.pdf')
+
+
+def test_import_reports_every_row(data_dir):
+    _reference_lists(['CSE', 'ECE'], ['Semester 2', 'Semester 4'])
+    data = ('Register Number,Dept,Sem\n'
+            '1001,CSE,semester 4\n'
+            '1002,,\n'
+            '1001,CSE,4\n'
+            'abc,CSE,4\n'
+            '1003,Civil,4\n'
+            '1004,ECE,Semester x\n'
+            '1005,ECE,9\n').encode('utf-8')
+
+    report = import_roster(io.BytesIO(data), 'roster.csv', department='ECE', semester='Semester 2')
+
+    assert [(entry['line'], entry['status']) for entry in report] == [
+        (2, ADDED), (3, ADDED), (4, DUPLICATE), (5, INVALID), (6, INVALID), (7, INVALID), (8, INVALID)]
+    assert [entry['message'] for entry in report[4:]] == [
+        "Unknown department", "Unknown semester", "Unknown semester"]
+    assert (report[1]['department'], report[1]['semester']) == ('ECE', '2')
+
+    again = import_roster(io.BytesIO(data), 'roster.csv', department='ECE', semester='2')
+    assert [entry['status'] for entry in again[:2]] == [DUPLICATE, DUPLICATE]
+
+
+def test_headerless_roster_uses_the_first_column(data_dir):
+    _reference_lists(['CSE'], ['Semester 3'])
+
+    report = import_roster(_xlsx([[2001], [2002]]), 'roster.xlsx', department='CSE', semester='3')
+
+    assert [entry['status'] for entry in report] == [ADDED, ADDED]
+    assert [entry['registerno'] for entry in report] == ['2001', '2002']